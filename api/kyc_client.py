@@ -0,0 +1,354 @@
+"""
+KYC API Python Client
+
+Client library for integration services submitting verifications in bulk.
+
+- One pooled HTTP session per client: connections are kept alive and reused
+  instead of opened per call
+- Requests rejected with 429 or 503 (the service's admission control) are
+  retried with exponential backoff, honouring the Retry-After header
+- verify_many() submits many verifications with at most `concurrency` in
+  flight, yielding each result as it completes
+- verify_stream() follows a verification's stages over Server-Sent Events, and
+  upload()/verify_upload() use the two-phase (upload first, form later) endpoints
+- AsyncKYCClient offers the same calls to asyncio code
+
+Usage:
+
+    with KYCClient("http://localhost:5000", concurrency=16) as client:
+        for item in client.verify_many(submissions):
+            print(item["index"], item["result"] or item["error"])
+"""
+import asyncio
+import functools
+import json
+import mimetypes
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Any, AsyncIterator, Iterable, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Base URL used when none is given
+DEFAULT_URL = os.getenv("KYC_API_URL", "http://localhost:5000")
+
+# Verifications a client keeps in flight at once (and pooled connections it keeps open)
+DEFAULT_CONCURRENCY = 8
+
+# Responses retried with backoff: rate limited and overloaded (the request was not processed)
+RETRY_STATUSES = (429, 503)
+
+# Retries of one request before its error is returned
+MAX_RETRIES = 5
+
+# Backoff between retries is BACKOFF_FACTOR * 2 ** (retry - 1) seconds, capped at MAX_BACKOFF
+BACKOFF_FACTOR = 0.5
+MAX_BACKOFF = 30.0
+
+# Seconds to connect, and to wait for a response (a verification calls the model several times)
+TIMEOUT = (5.0, 300.0)
+
+
+class KYCAPIError(Exception):
+    """Raised for an error response from the KYC API, after any retries."""
+
+    def __init__(self, status_code: int, payload: Dict[str, Any]):
+        self.status_code = status_code
+        self.payload = payload
+        super().__init__(f"{status_code}: {payload.get('message') or payload.get('error') or payload}")
+
+
+def _image_file(image_path: str) -> Tuple[str, bytes, str]:
+    """Read an image for a multipart upload; the bytes are kept so a retry can resend them."""
+    with open(image_path, "rb") as file:
+        data = file.read()
+    return os.path.basename(image_path), data, mimetypes.guess_type(image_path)[0] or "application/octet-stream"
+
+
+class KYCClient:
+    """
+    Synchronous KYC API client with a pooled, retrying session.
+
+    Safe to share between threads; verify_many() does so itself.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_URL, concurrency: int = DEFAULT_CONCURRENCY,
+                 max_retries: int = MAX_RETRIES, backoff_factor: float = BACKOFF_FACTOR,
+                 timeout: Tuple[float, float] = TIMEOUT, headers: Optional[Dict[str, str]] = None):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            # A verification whose response was lost may have run; it is not sent twice
+            read=0,
+            status=max_retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,
+            backoff_factor=backoff_factor,
+            backoff_max=MAX_BACKOFF,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(headers or {})
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.session.close()
+
+    def __enter__(self) -> "KYCClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _request(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        """
+        Send a request and decode its JSON response.
+
+        Raises:
+            KYCAPIError: If the response status is not 2xx
+        """
+        response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {"message": response.text[:200]}
+        if not response.ok:
+            raise KYCAPIError(response.status_code, payload)
+        return payload
+
+    def health(self) -> Dict[str, Any]:
+        """Return the /api/v1/health report."""
+        return self._request("GET", "/api/v1/health")
+
+    def verify(self, image_path: str, form_data: Dict[str, str],
+               headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Verify an identity with /api/v1/verify.
+
+        Args:
+            image_path: Path to the ID card image
+            form_data: Dictionary with full_name, dob, nationality and id_number
+            headers: Optional extra headers, e.g. X-Request-ID
+
+        Returns:
+            The verification response
+
+        Raises:
+            KYCAPIError: If the verification was rejected or failed
+        """
+        return self._request("POST", "/api/v1/verify", data=form_data,
+                             files={"id_image": _image_file(image_path)}, headers=headers)
+
+    def verify_many(self, submissions: Iterable[Tuple[str, Dict[str, str]]],
+                    concurrency: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Verify many identities with at most `concurrency` requests in flight.
+
+        Submissions are read lazily, so a long iterable is never held in memory
+        at once. A failed verification is reported in its item rather than
+        stopping the others.
+
+        Args:
+            submissions: Iterable of (image path, form data) tuples
+            concurrency: Requests in flight at once (default: the client's concurrency)
+
+        Yields:
+            Dictionaries with the submission's index and image_path, and either
+            its result or its error, in completion order
+        """
+        limit = max(1, concurrency or self.concurrency)
+        with ThreadPoolExecutor(max_workers=limit, thread_name_prefix="kyc-client") as executor:
+            pending = {}
+            for index, (image_path, form_data) in enumerate(submissions):
+                if len(pending) >= limit:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self._batch_item(future, *pending.pop(future))
+                pending[executor.submit(self.verify, image_path, form_data)] = (index, image_path)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield self._batch_item(future, *pending.pop(future))
+
+    @staticmethod
+    def _batch_item(future, index: int, image_path: str) -> Dict[str, Any]:
+        """Build the verify_many() item of a finished verification."""
+        try:
+            return {"index": index, "image_path": image_path, "result": future.result(), "error": None}
+        except Exception as e:
+            return {"index": index, "image_path": image_path, "result": None, "error": e}
+
+    def verify_stream(self, form_data: Dict[str, str], image_path: Optional[str] = None,
+                      upload_token: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Verify an identity with /verify_kyc/stream, following each stage as it completes.
+
+        Args:
+            form_data: Dictionary with full_name, dob, nationality and id_number
+            image_path: Path to the ID card image
+            upload_token: Token from upload(), instead of image_path
+
+        Yields:
+            Tuples of (event, payload): one "stage" per step, then "decision" or "error"
+
+        Raises:
+            KYCAPIError: If the verification was rejected before the stream started
+        """
+        data = dict(form_data)
+        files = None
+        if upload_token:
+            data["upload_token"] = upload_token
+        else:
+            files = {"id_image": _image_file(image_path)}
+
+        with self.session.post(self.base_url + "/verify_kyc/stream", data=data, files=files,
+                               timeout=self.timeout, stream=True) as response:
+            if not response.ok:
+                try:
+                    payload = response.json()
+                except ValueError:
+                    payload = {"message": response.text[:200]}
+                raise KYCAPIError(response.status_code, payload)
+
+            event, lines = "message", []
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    lines.append(line[5:].strip())
+                elif not line and lines:
+                    yield event, json.loads("\n".join(lines))
+                    event, lines = "message", []
+
+    def upload(self, image_path: str) -> Dict[str, Any]:
+        """
+        Upload an ID image ahead of its form, starting its image-only analysis.
+
+        Returns:
+            Response with the upload_token and the analysis progress
+        """
+        return self._request("POST", "/api/v1/uploads", files={"id_image": _image_file(image_path)})
+
+    def upload_status(self, upload_token: str) -> Dict[str, Any]:
+        """Return the analysis progress of an upload."""
+        return self._request("GET", f"/api/v1/uploads/{upload_token}")
+
+    def verify_upload(self, upload_token: str, form_data: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Complete a two-phase submission with its form data.
+
+        Returns:
+            The verification response, as verify()
+        """
+        return self._request("POST", f"/api/v1/uploads/{upload_token}/verify", data=form_data)
+
+    def get_verification(self, verification_id: str) -> Dict[str, Any]:
+        """Return a stored verification (the client needs the X-KYC-Admin header in its headers)."""
+        return self._request("GET", f"/api/v1/verifications/{verification_id}")["verification"]
+
+
+class AsyncKYCClient:
+    """
+    Asyncio KYC API client.
+
+    Calls run the synchronous client on a pool of `concurrency` threads, so
+    the event loop is never blocked and the connection pool is shared.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_URL, concurrency: int = DEFAULT_CONCURRENCY, **kwargs):
+        self.client = KYCClient(base_url, concurrency, **kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=self.client.concurrency, thread_name_prefix="kyc-client")
+
+    async def close(self) -> None:
+        """Close the pooled connections and the thread pool."""
+        self._executor.shutdown(wait=False)
+        self.client.close()
+
+    async def __aenter__(self) -> "AsyncKYCClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _call(self, func, *args, **kwargs) -> Any:
+        """Run a blocking client call on the thread pool."""
+        call = functools.partial(func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def health(self) -> Dict[str, Any]:
+        """Async version of KYCClient.health()."""
+        return await self._call(self.client.health)
+
+    async def verify(self, image_path: str, form_data: Dict[str, str],
+                     headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Async version of KYCClient.verify()."""
+        return await self._call(self.client.verify, image_path, form_data, headers)
+
+    async def verify_many(self, submissions: Iterable[Tuple[str, Dict[str, str]]],
+                          concurrency: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async version of KYCClient.verify_many().
+
+        Yields:
+            Dictionaries with index, image_path and result or error, in completion order
+        """
+        limit = max(1, min(concurrency or self.client.concurrency, self.client.concurrency))
+
+        async def run(index: int, image_path: str, form_data: Dict[str, str]) -> Dict[str, Any]:
+            try:
+                result = await self.verify(image_path, form_data)
+                return {"index": index, "image_path": image_path, "result": result, "error": None}
+            except Exception as e:
+                return {"index": index, "image_path": image_path, "result": None, "error": e}
+
+        pending = set()
+        for index, (image_path, form_data) in enumerate(submissions):
+            if len(pending) >= limit:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            pending.add(asyncio.ensure_future(run(index, image_path, form_data)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+    async def verify_stream(self, form_data: Dict[str, str], image_path: Optional[str] = None,
+                            upload_token: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Async version of KYCClient.verify_stream()."""
+        events = self.client.verify_stream(form_data, image_path, upload_token)
+        try:
+            while True:
+                event = await self._call(next, events, None)
+                if event is None:
+                    return
+                yield event
+        finally:
+            # Closes the response; the generator is finished in a pool thread, not the event loop
+            await self._call(events.close)
+
+    async def upload(self, image_path: str) -> Dict[str, Any]:
+        """Async version of KYCClient.upload()."""
+        return await self._call(self.client.upload, image_path)
+
+    async def upload_status(self, upload_token: str) -> Dict[str, Any]:
+        """Async version of KYCClient.upload_status()."""
+        return await self._call(self.client.upload_status, upload_token)
+
+    async def verify_upload(self, upload_token: str, form_data: Dict[str, str]) -> Dict[str, Any]:
+        """Async version of KYCClient.verify_upload()."""
+        return await self._call(self.client.verify_upload, upload_token, form_data)
+
+    async def get_verification(self, verification_id: str) -> Dict[str, Any]:
+        """Async version of KYCClient.get_verification()."""
+        return await self._call(self.client.get_verification, verification_id)
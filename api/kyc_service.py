@@ -3,16 +3,36 @@ KYC Verification API - Service Module
 
 Provides REST API endpoints for KYC identity verification services.
 """
+import hmac
+import io
 import os
 import json
+import uuid
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Union
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file
 from werkzeug.utils import secure_filename
 
-from kyc_engine.decision_making import run_pipeline, kyc_decision
+from kyc_engine.admission import Overloaded, get_controller
+from kyc_engine.log_config import bind_request_id, configure_logging, request_id_var
+from kyc_engine.profiling import PROFILE_HEADER, RequestProfiler, has_profile_token, load_profile, should_profile
+from kyc_engine.upload_sessions import UnknownUpload, get_upload_sessions
+from kyc_engine.verification import verify_identity
 from kyc_engine.shared import ensure_output_dir
+from kyc_engine.warmup import warm_up_in_background
+
+# Route log records through the non-blocking queue
+configure_logging()
+
+# Header carrying the request id between clients, proxies and the logs
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Header carrying the reviewer token required by the stored-verification endpoints
+ADMIN_HEADER = 'X-KYC-Admin'
+
+# Reviewer token; stored verifications hold identity data, so unset disables those endpoints
+ADMIN_TOKEN = os.getenv('KYC_ADMIN_TOKEN')
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
@@ -24,13 +44,37 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # Initialize output directories
 ensure_output_dir()
-ensure_output_dir('temp')
-ensure_output_dir('analysis')
 
 # Initialize Blueprint
 kyc_api = Blueprint('kyc_api', __name__)
 
 
+@kyc_api.before_app_request
+def assign_request_id():
+    """Tag the request's log records with the caller's X-Request-ID or a new id."""
+    bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+
+
+@kyc_api.after_app_request
+def echo_request_id(response):
+    """Return the request id so clients can quote it when reporting a problem."""
+    request_id = request_id_var.get()
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+def has_admin_token() -> bool:
+    """Return whether the request's ADMIN_HEADER matches the configured reviewer token."""
+    header_value = request.headers.get(ADMIN_HEADER)
+    return bool(header_value and ADMIN_TOKEN and hmac.compare_digest(header_value, ADMIN_TOKEN))
+
+
+def admin_required():
+    """Return the 403 response for a request without the reviewer token."""
+    return jsonify({'status': 'error', 'message': 'Admin token required'}), 403
+
+
 def allowed_file(filename: str) -> bool:
     """
     Check if the uploaded file has an allowed extension.
@@ -44,14 +88,84 @@ def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def overloaded_response(error: Overloaded):
+    """
+    Build the fast rejection returned when a verification cannot be admitted.
+    
+    Args:
+        error: Overloaded exception raised by the admission controller
+        
+    Returns:
+        503 JSON response with a Retry-After header
+    """
+    response = jsonify({
+        'status': 'error',
+        'message': f'{error} - retry after {error.retry_after} seconds',
+        'retry_after': error.retry_after
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+
+def verification_response(verification: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the external API response for a finished verification.
+    
+    Args:
+        verification: Dictionary returned by verify_identity()
+        
+    Returns:
+        Simplified response with the decision and per-check statuses
+    """
+    pipeline_results = verification['pipeline_results']
+    decision_result = verification['decision']
+
+    # Format response for external API
+    try:
+        decision_obj = json.loads(decision_result)
+    except json.JSONDecodeError:
+        decision_obj = {
+            "decision": "unknown",
+            "reason": decision_result
+        }
+
+    return {
+        'status': 'success',
+        'verification_id': verification['verification_id'],
+        'verification_result': {
+            'decision': decision_obj.get('decision', 'unknown'),
+            'reason': decision_obj.get('reason', ''),
+            'recapture': decision_obj.get('recapture', False),
+            'provisional': decision_obj.get('provisional', False),
+            'checks': {
+                'ocr': pipeline_results.get('OCR', {}).get('status', 'unknown'),
+                'metadata': pipeline_results.get('Metadata', {}).get('status', 'unknown'),
+                'image_integrity': pipeline_results.get('ELA', {}).get('status', 'unknown'),
+                'jpeg_structure': pipeline_results.get('JPEG', {}).get('status', 'unknown'),
+                'tamper_localization': pipeline_results.get('Localization', {}).get('status', 'unknown')
+            },
+            'degraded_stages': verification['shed']
+        }
+    }
+
+
 @kyc_api.route('/api/v1/verify', methods=['POST'])
 def verify_kyc():
     """
     Process KYC verification API request.
     
+    Requests beyond the worker's in-flight limit and queue are rejected with
+    503 and a Retry-After header before the upload is read. Requests carrying
+    the admin profiling header (or picked by the profiling sample) are profiled.
+    
     Returns:
         JSON response with verification results or error message
     """
+    try:
+        admission = get_controller().admit()
+    except Overloaded as e:
+        return overloaded_response(e)
+
     try:
         # Check if image file is present
         if 'id_image' not in request.files:
@@ -89,44 +203,293 @@ def verify_kyc():
                     'message': f'Missing required fields: {", ".join(missing_fields)}'
                 }), 400
 
-            # Run KYC pipeline
-            pipeline_results = run_pipeline(form_data, filepath)
-
-            # Get final decision
-            decision_result = kyc_decision(pipeline_results)
+            # Run KYC pipeline and get final decision
+            profiler = RequestProfiler() if should_profile(request.headers.get(PROFILE_HEADER)) else None
+            verification = verify_identity(form_data, filepath, shed=admission.shed, profiler=profiler)
 
             # Clean up uploaded file
             os.remove(filepath)
 
-            # Format response for external API
-            try:
-                decision_obj = json.loads(decision_result)
-            except json.JSONDecodeError:
-                decision_obj = {
-                    "decision": "unknown",
-                    "reason": decision_result
-                }
-                
-            # Construct simplified response
-            response = {
-                'status': 'success',
-                'verification_result': {
-                    'decision': decision_obj.get('decision', 'unknown'),
-                    'reason': decision_obj.get('reason', ''),
-                    'checks': {
-                        'ocr': pipeline_results.get('OCR', {}).get('status', 'unknown'),
-                        'metadata': pipeline_results.get('Metadata', {}).get('status', 'unknown'),
-                        'image_integrity': pipeline_results.get('ELA', {}).get('status', 'unknown')
-                    }
-                }
-            }
+            return jsonify(verification_response(verification))
 
-            return jsonify(response)
+        return jsonify({'status': 'error', 'message': 'Invalid file type'}), 400
 
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        admission.release()
+
+
+@kyc_api.route('/api/v1/uploads', methods=['POST'])
+def create_upload():
+    """
+    Accept an ID image ahead of the form and start its image-only stages.
+    
+    Returns:
+        202 JSON response with the upload token, or error message
+    """
+    if 'id_image' not in request.files:
+        return jsonify({'status': 'error', 'message': 'No image file provided'}), 400
+
+    file = request.files['id_image']
+    if file.filename == '':
+        return jsonify({'status': 'error', 'message': 'No selected file'}), 400
+    if not allowed_file(file.filename):
         return jsonify({'status': 'error', 'message': 'Invalid file type'}), 400
 
+    # The image waits for its form, so the name must not collide with other uploads
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filepath = os.path.join(UPLOAD_FOLDER, f"{timestamp}_{uuid.uuid4().hex[:8]}_{secure_filename(file.filename)}")
+    file.save(filepath)
+
+    try:
+        upload = get_upload_sessions().start(filepath)
+    except Overloaded as e:
+        os.remove(filepath)
+        return overloaded_response(e)
+
+    return jsonify({
+        'status': 'accepted',
+        'upload_token': upload.token,
+        **upload.status()
+    }), 202
+
+
+@kyc_api.route('/api/v1/uploads/<token>', methods=['GET'])
+def get_upload(token: str):
+    """
+    Report the progress of an upload's image-only stages.
+    
+    Args:
+        token: Upload token returned by /api/v1/uploads
+        
+    Returns:
+        JSON response with the stage statuses, or 404 for an unknown token
+    """
+    try:
+        upload = get_upload_sessions().get(token)
+    except UnknownUpload:
+        return jsonify({'status': 'error', 'message': 'Unknown or expired upload token'}), 404
+    return jsonify({'status': 'success', **upload.status()})
+
+
+@kyc_api.route('/api/v1/uploads/<token>/verify', methods=['POST'])
+def verify_upload(token: str):
+    """
+    Complete a two-phase submission with its form data.
+    
+    The image-only results computed since the upload are reused and the
+    extracted fields are compared with the form locally, so only the
+    remaining steps and the decision run now.
+    
+    Args:
+        token: Upload token returned by /api/v1/uploads (usable once)
+        
+    Returns:
+        JSON response shaped like /api/v1/verify, or error message
+    """
+    form_data = {field: request.form.get(field, '') for field in ('full_name', 'dob', 'nationality', 'id_number')}
+    missing_fields = [field for field, value in form_data.items() if not value]
+    if missing_fields:
+        return jsonify({
+            'status': 'error',
+            'message': f'Missing required fields: {", ".join(missing_fields)}'
+        }), 400
+
+    try:
+        admission = get_controller().admit()
+    except Overloaded as e:
+        return overloaded_response(e)
+
+    upload = None
+    try:
+        upload = get_upload_sessions().take(token)
+        precomputed = get_upload_sessions().precomputed(upload, form_data)
+        profiler = RequestProfiler() if should_profile(request.headers.get(PROFILE_HEADER)) else None
+        verification = verify_identity(form_data, upload.image_path, upload.verification_id,
+                                       shed=admission.shed, profiler=profiler, precomputed=precomputed)
+        return jsonify(verification_response(verification))
+
+    except UnknownUpload:
+        return jsonify({'status': 'error', 'message': 'Unknown or expired upload token'}), 404
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        admission.release()
+        # Clean up uploaded file
+        if upload is not None and os.path.exists(upload.image_path):
+            os.remove(upload.image_path)
+
+
+@kyc_api.route('/api/v1/verifications', methods=['GET'])
+def list_verifications():
+    """
+    Query stored verifications by decision, image hash or time range (admin only).
+    
+    Query Parameters:
+        decision: Filter by decision (accept/deny/flag for review)
+        provisional: Set to 1 for local-only decisions awaiting a re-check
+        image_hash: Filter by SHA-256 of the image file
+        since / until: UNIX time range (defaults to all time)
+        limit: Maximum number of records (default 100)
+        
+    Returns:
+        JSON response with matching verification records
+    """
+    if not has_admin_token():
+        return admin_required()
+
+    from kyc_engine.result_store import get_store
+
+    store = get_store()
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    since = request.args.get('since', 0.0, type=float)
+    until = request.args.get('until', type=float)
+
+    if request.args.get('provisional', '').lower() in ('1', 'true', 'yes'):
+        records = store.find_provisional(since=since, limit=limit)
+    elif request.args.get('image_hash'):
+        records = store.find_by_hash(request.args['image_hash'], limit=limit)
+    elif request.args.get('decision'):
+        records = store.find_by_decision(request.args['decision'], since=since, limit=limit)
+    else:
+        records = store.find_between(since, until if until is not None else float('inf'), limit=limit)
+
+    return jsonify({'status': 'success', 'verifications': records})
+
+
+@kyc_api.route('/api/v1/verifications/<verification_id>', methods=['GET'])
+def get_verification(verification_id: str):
+    """
+    Fetch a stored verification by id (admin only).
+    
+    Args:
+        verification_id: Identifier returned by the verify endpoint
+        
+    Returns:
+        JSON response with the verification record or error message
+    """
+    if not has_admin_token():
+        return admin_required()
+
+    from kyc_engine.result_store import get_store
+
+    record = get_store().get(verification_id)
+    if record is None:
+        return jsonify({'status': 'error', 'message': 'Verification not found'}), 404
+    return jsonify({'status': 'success', 'verification': record})
+
+
+@kyc_api.route('/api/v1/verifications/<verification_id>/visualizations/<kind>', methods=['GET'])
+def get_visualization(verification_id: str, kind: str):
+    """
+    Render a composite visualization for a past verification on demand (admin only).
+    
+    Args:
+        verification_id: Identifier returned by the verify endpoint
+        kind: Composite kind ('ela', 'forensics' or 'localization')
+        
+    Returns:
+        PNG image or JSON error message
+    """
+    # The composites show the ID card itself
+    if not has_admin_token():
+        return admin_required()
+
+    # Rendering pulls in NumPy/OpenCV, so only load it when a reviewer asks
+    from kyc_engine.visualization import render_composite
+
+    try:
+        png = render_composite(verification_id, kind)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    if png is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'No analysis data available for this verification'
+        }), 404
+
+    return send_file(io.BytesIO(png), mimetype='image/png')
+
+
+@kyc_api.route('/api/v1/profiles/<verification_id>', methods=['GET'])
+def get_profile(verification_id: str):
+    """
+    Fetch the profile of a profiled verification (admin only).
+    
+    Args:
+        verification_id: Identifier returned by the verify endpoint
+        
+    Query Parameters:
+        format: 'json' (default) for per-step timings and allocations, or
+            'collapsed' for flamegraph-ready collapsed stacks
+        
+    Returns:
+        JSON report, collapsed stacks as text, or JSON error message
+    """
+    if not has_profile_token(request.headers.get(PROFILE_HEADER)):
+        return jsonify({'status': 'error', 'message': 'Profiling token required'}), 403
+
+    collapsed = request.args.get('format') == 'collapsed'
+    profile = load_profile(verification_id, collapsed=collapsed)
+    if profile is None:
+        return jsonify({'status': 'error', 'message': 'No profile stored for this verification'}), 404
+    if collapsed:
+        return profile, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    return jsonify({'status': 'success', 'profile': profile})
+
+
+@kyc_api.route('/api/v1/warmup', methods=['POST'])
+def warmup():
+    """
+    Start preloading the heavy analysis dependencies in this worker (admin only).
+    
+    The imports and model loads run in a background thread, so the request
+    returns at once and the worker keeps serving traffic meanwhile.
+    
+    Returns:
+        202 JSON response, or 403 without the admin token
+    """
+    if not has_admin_token():
+        return admin_required()
+
+    warm_up_in_background()
+    return jsonify({
+        'status': 'accepted',
+        'message': 'Warm-up started in the background'
+    }), 202
+
+
+def health_status() -> Dict[str, Any]:
+    """
+    Report the service status.
+    
+    Returns:
+        Dictionary with service status, this worker's admission load, the
+        number of identical concurrent verifications coalesced, the state of
+        the model circuit breaker, the uploads waiting for their form and the
+        forensic workers' queue and heartbeats
+    """
+    from kyc_engine.circuit_breaker import get_breaker
+    from kyc_engine.forensic_broker import broker_status
+    from kyc_engine.single_flight import get_flights
+
+    admission = get_controller().stats()
+    breaker = get_breaker().stats()
+    forensics = broker_status()
+    # With a broker but no live worker, the forensic checks fall back to this host
+    no_workers = forensics['broker'] != 'inline' and not forensics['workers']
+    return {
+        'status': 'degraded' if admission['degraded_level'] or breaker['state'] != 'closed' or no_workers
+        else 'operational',
+        'version': '1.0',
+        'admission': admission,
+        'coalescing': get_flights().stats(),
+        'model_breaker': breaker,
+        'uploads': get_upload_sessions().stats(),
+        'forensic_workers': forensics
+    }
 
 
 @kyc_api.route('/api/v1/health', methods=['GET'])
@@ -135,9 +498,6 @@ def health_check():
     Health check endpoint to verify API service status.
     
     Returns:
-        JSON response with service status
+        JSON response with the health_status() report
     """
-    return jsonify({
-        'status': 'operational',
-        'version': '1.0'
-    }) 
\ No newline at end of file
+    return jsonify(health_status()) 
\ No newline at end of file
@@ -6,62 +6,63 @@ Command-line utility for testing the KYC verification API endpoints.
 import os
 import sys
 import argparse
-from typing import Dict, Any, Optional, Union, Tuple
+from typing import Dict, List
 
-import requests
+from kyc_client import KYCAPIError, KYCClient
 
 
-def test_health_check(base_url: str) -> bool:
+def test_health_check(client: KYCClient) -> bool:
     """
     Test the health check endpoint.
     
     Args:
-        base_url: Base URL of the KYC API
+        client: KYC API client
         
     Returns:
         True if test passed, False otherwise
     """
-    url = f"{base_url}/api/v1/health"
     try:
-        response = requests.get(url)
-        print(f"Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
-        return response.status_code == 200
+        print(f"Response: {client.health()}")
+        return True
+    except KYCAPIError as e:
+        print(f"Status Code: {e.status_code}")
+        print(f"Response: {e.payload}")
+        return False
     except Exception as e:
         print(f"Error: {str(e)}")
         return False
 
 
-def test_verify_kyc(base_url: str, image_path: str, form_data: Dict[str, str]) -> bool:
+def test_verify_kyc(client: KYCClient, image_paths: List[str], form_data: Dict[str, str]) -> bool:
     """
-    Test the KYC verification endpoint.
+    Test the KYC verification endpoint, submitting several images concurrently.
     
     Args:
-        base_url: Base URL of the KYC API
-        image_path: Path to ID card image
+        client: KYC API client
+        image_paths: Paths to ID card images
         form_data: Dictionary containing form fields
         
     Returns:
-        True if test passed, False otherwise
+        True if every verification succeeded, False otherwise
     """
-    url = f"{base_url}/api/v1/verify"
-    
-    if not os.path.exists(image_path):
-        print(f"Error: Image file not found at {image_path}")
+    missing = [path for path in image_paths if not os.path.exists(path)]
+    if missing:
+        print(f"Error: Image file not found at {', '.join(missing)}")
         return False
-    
-    try:
-        files = {'id_image': open(image_path, 'rb')}
-        response = requests.post(url, data=form_data, files=files)
-        print(f"Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
-        return response.status_code == 200
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        return False
-    finally:
-        if 'files' in locals() and 'id_image' in files:
-            files['id_image'].close()
+
+    success = True
+    for item in client.verify_many((path, form_data) for path in image_paths):
+        print(f"Image: {item['image_path']}")
+        if item["error"] is None:
+            print(f"Response: {item['result']}")
+        elif isinstance(item["error"], KYCAPIError):
+            print(f"Status Code: {item['error'].status_code}")
+            print(f"Response: {item['error'].payload}")
+            success = False
+        else:
+            print(f"Error: {str(item['error'])}")
+            success = False
+    return success
 
 
 def main() -> int:
@@ -74,7 +75,8 @@ def main() -> int:
     parser = argparse.ArgumentParser(description="Test the KYC API")
     parser.add_argument("--url", help="Base URL for the API", default="http://localhost:5000")
     parser.add_argument("--test", help="Test to run (health, verify)", default="health")
-    parser.add_argument("--image", help="Path to ID image for verification")
+    parser.add_argument("--image", nargs="+", help="Path(s) to ID images for verification")
+    parser.add_argument("--concurrency", type=int, default=4, help="Verifications submitted at once")
     parser.add_argument("--name", help="Full name for verification")
     parser.add_argument("--dob", help="Date of birth for verification")
     parser.add_argument("--nationality", help="Nationality for verification")
@@ -82,24 +84,24 @@ def main() -> int:
     
     args = parser.parse_args()
     
-    if args.test == "health":
-        success = test_health_check(args.url)
-    elif args.test == "verify":
-        if not args.image:
-            print("Error: --image is required for verify test")
-            return 1
-        
-        form_data = {
-            'full_name': args.name or "Test User",
-            'dob': args.dob or "01-01-1990",
-            'nationality': args.nationality or "Test Country",
-            'id_number': args.id_number or "1234567890"
-        }
-        
-        success = test_verify_kyc(args.url, args.image, form_data)
-    else:
+    if args.test not in ("health", "verify"):
         print(f"Unknown test: {args.test}")
         return 1
+    if args.test == "verify" and not args.image:
+        print("Error: --image is required for verify test")
+        return 1
+
+    with KYCClient(args.url, concurrency=args.concurrency) as client:
+        if args.test == "health":
+            success = test_health_check(client)
+        else:
+            form_data = {
+                'full_name': args.name or "Test User",
+                'dob': args.dob or "01-01-1990",
+                'nationality': args.nationality or "Test Country",
+                'id_number': args.id_number or "1234567890"
+            }
+            success = test_verify_kyc(client, args.image, form_data)
     
     return 0 if success else 1
 
@@ -6,14 +6,18 @@ A Flask-based web application for verifying user identities through document ana
 import os
 import json
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from werkzeug.utils import secure_filename
 
-from kyc_engine.decision_making import run_pipeline, kyc_decision
-from api.kyc_service import kyc_api
+from kyc_engine.verification import verify_identity, iter_verification
+from api.kyc_service import kyc_api, overloaded_response
+from kyc_engine.admission import Overloaded, get_controller
+from kyc_engine.profiling import PROFILE_HEADER, RequestProfiler, should_profile
 from kyc_engine.shared import ensure_output_dir
+from kyc_engine.upload_sessions import UnknownUpload, get_upload_sessions
+from kyc_engine.warmup import warm_up_in_background
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -31,11 +35,13 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # Initialize the output directories
 ensure_output_dir()
-ensure_output_dir('temp')
-ensure_output_dir('analysis')
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Optionally preload heavy analysis dependencies without delaying startup
+if os.getenv('KYC_WARMUP', '').lower() in ('1', 'true', 'yes'):
+    warm_up_in_background()
+
 
 def allowed_file(filename: str) -> bool:
     """
@@ -50,6 +56,96 @@ def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def format_decision(decision: str) -> str:
+    """
+    Normalize the raw decision string returned by the decision step.
+    
+    Args:
+        decision: Raw decision string
+        
+    Returns:
+        Decision serialized as a JSON string
+    """
+    try:
+        decision_json = json.loads(decision)
+    except json.JSONDecodeError:
+        # If it's not valid JSON, create a structured response
+        decision_json = {
+            "status": "KYC Worked peacefully",
+            "message": decision
+        }
+    return json.dumps(decision_json)
+
+
+def verification_response(verification: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the web form response for a finished verification.
+    
+    Args:
+        verification: Dictionary returned by verify_identity()
+        
+    Returns:
+        Response with every step's result and the formatted decision
+    """
+    return {
+        'status': 'success',
+        'verification_id': verification['verification_id'],
+        'pipeline_results': verification['pipeline_results'],
+        'decision': format_decision(verification['decision']),
+        'degraded_stages': verification['shed']
+    }
+
+
+def save_upload() -> Tuple[Optional[str], Optional[Tuple[Response, int]]]:
+    """
+    Validate and save the ID image uploaded with the web form.
+    
+    Returns:
+        Tuple of (saved file path, None) or (None, error response)
+    """
+    # Check if image file is present
+    if 'id_image' not in request.files:
+        return None, (jsonify({'error': 'No image file provided'}), 400)
+
+    file = request.files['id_image']
+    if file.filename == '':
+        return None, (jsonify({'error': 'No selected file'}), 400)
+
+    if not allowed_file(file.filename):
+        return None, (jsonify({'error': 'Invalid file type'}), 400)
+
+    # Create unique filename with timestamp
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"{timestamp}_{secure_filename(file.filename)}"
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    file.save(filepath)
+    return filepath, None
+
+
+def get_form_data() -> Dict[str, Any]:
+    """Collect the identity fields submitted with the web form."""
+    return {
+        'full_name': request.form.get('full_name'),
+        'dob': request.form.get('dob'),
+        'nationality': request.form.get('nationality'),
+        'id_number': request.form.get('id_number')
+    }
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """
+    Format a Server-Sent Events message.
+    
+    Args:
+        event: Event name
+        data: JSON-serializable event payload
+        
+    Returns:
+        SSE message text
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
 @app.route('/')
 def home():
     """Render the home page with the verification form."""
@@ -65,59 +161,110 @@ def verify_kyc():
         JSON response with verification results or error message
     """
     try:
-        # Check if image file is present
-        if 'id_image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
-
-        file = request.files['id_image']
-        if file.filename == '':
-            return jsonify({'error': 'No selected file'}), 400
-
-        if file and allowed_file(file.filename):
-            # Create unique filename with timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{timestamp}_{secure_filename(file.filename)}"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-
-            # Prepare form data
-            form_data = {
-                'full_name': request.form.get('full_name'),
-                'dob': request.form.get('dob'),
-                'nationality': request.form.get('nationality'),
-                'id_number': request.form.get('id_number')
-            }
-
-            # Run KYC pipeline
-            pipeline_results = run_pipeline(form_data, filepath)
-
-            # Get final decision
-            decision = kyc_decision(pipeline_results)
+        admission = get_controller().admit()
+    except Overloaded as e:
+        return overloaded_response(e)
 
+    try:
+        filepath, error = save_upload()
+        if error:
+            return error
+
+        try:
+            # Run KYC pipeline and get final decision
+            profiler = RequestProfiler() if should_profile(request.headers.get(PROFILE_HEADER)) else None
+            verification = verify_identity(get_form_data(), filepath, shed=admission.shed, profiler=profiler)
+        finally:
             # Clean up uploaded file
             os.remove(filepath)
 
-            # Parse the decision as JSON
-            try:
-                decision_json = json.loads(decision)
-            except json.JSONDecodeError:
-                # If it's not valid JSON, create a structured response
-                decision_json = {
-                    "status": "KYC Worked peacefully",
-                    "message": decision
-                }
+        return jsonify(verification_response(verification))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        admission.release()
 
-            return jsonify({
-                'status': 'success',
-                'pipeline_results': pipeline_results,
-                'decision': json.dumps(decision_json)
-            })
 
-        return jsonify({'error': 'Invalid file type'}), 400
+@app.route('/verify_kyc/stream', methods=['POST'])
+def verify_kyc_stream():
+    """
+    Process KYC verification request from the web form, streaming progress.
+    
+    Emits a Server-Sent Events stream with one 'stage' event per verification
+    step as soon as it completes, then a 'decision' event in the same shape as
+    the /verify_kyc response (or an 'error' event). The form may carry an
+    'upload_token' from /api/v1/uploads instead of the image, in which case
+    the results computed since the upload are reused.
+    
+    Returns:
+        text/event-stream response or JSON error message
+    """
+    try:
+        admission = get_controller().admit()
+    except Overloaded as e:
+        return overloaded_response(e)
 
+    upload = None
+    try:
+        if request.form.get('upload_token'):
+            upload = get_upload_sessions().take(request.form['upload_token'])
+            filepath = upload.image_path
+        else:
+            filepath, error = save_upload()
+            if error:
+                admission.release()
+                return error
+        form_data = get_form_data()
+        profiler = RequestProfiler() if should_profile(request.headers.get(PROFILE_HEADER)) else None
+    except UnknownUpload:
+        admission.release()
+        return jsonify({'error': 'Unknown or expired upload token'}), 404
     except Exception as e:
+        admission.release()
         return jsonify({'error': str(e)}), 500
 
+    def cleanup():
+        # The slot is held until the stream ends, not just until the response starts
+        admission.release()
+        # Clean up uploaded file
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+    def generate():
+        pipeline_results = {}
+        try:
+            verification_id = precomputed = None
+            if upload is not None:
+                verification_id = upload.verification_id
+                precomputed = get_upload_sessions().precomputed(upload, form_data)
+            for event, payload in iter_verification(form_data, filepath, verification_id, shed=admission.shed,
+                                                    profiler=profiler, precomputed=precomputed):
+                if event == 'stage':
+                    pipeline_results[payload['stage']] = payload['result']
+                    yield format_sse('stage', payload)
+                else:
+                    yield format_sse('decision', {
+                        'status': 'success',
+                        'verification_id': payload['verification_id'],
+                        'pipeline_results': pipeline_results,
+                        'decision': format_decision(payload['decision']),
+                        'degraded_stages': payload['shed']
+                    })
+        except Exception as e:
+            yield format_sse('error', {'error': str(e)})
+        finally:
+            cleanup()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # A generator that never started (client gone before the first event) runs no finally
+    response.call_on_close(cleanup)
+    return response
+
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+KYC Verification System - ASGI Application
+
+Serves the verification endpoints with async handlers under an ASGI server
+(`uvicorn asgi:app`), so one worker process handles many verifications at once:
+handlers await the model calls on a pool of I/O threads and hand the CPU-bound
+checks to a pool sized to the machine's cores. Routes and responses are the
+same as the Flask application's; every other route is served by the Flask
+application itself, mounted underneath.
+"""
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from werkzeug.utils import secure_filename
+
+from app import app as flask_app, verification_response as web_verification_response
+from api.kyc_service import (
+    REQUEST_ID_HEADER,
+    UPLOAD_FOLDER,
+    allowed_file,
+    health_status,
+    verification_response
+)
+from kyc_engine.admission import Overloaded, get_controller
+from kyc_engine.async_verification import averify_identity, run_blocking
+from kyc_engine.log_config import bind_request_id
+from kyc_engine.profiling import PROFILE_HEADER, RequestProfiler, should_profile
+
+# Identity fields read from the submitted form
+FORM_FIELDS = ('full_name', 'dob', 'nationality', 'id_number')
+
+
+def json_response(request: Request, content: Dict[str, Any], status_code: int = 200,
+                  headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    """
+    Build a JSON response carrying the request id.
+
+    Args:
+        request: Incoming request
+        content: JSON-serializable response body
+        status_code: HTTP status code
+        headers: Optional extra response headers
+
+    Returns:
+        JSON response with the X-Request-ID header set
+    """
+    response = JSONResponse(content, status_code=status_code, headers=headers)
+    response.headers[REQUEST_ID_HEADER] = request.state.request_id
+    return response
+
+
+def overloaded_response(request: Request, error: Overloaded) -> JSONResponse:
+    """
+    Build the fast rejection returned when a verification cannot be admitted.
+
+    Args:
+        request: Incoming request
+        error: Overloaded exception raised by the admission controller
+
+    Returns:
+        503 JSON response with a Retry-After header
+    """
+    return json_response(request, {
+        'status': 'error',
+        'message': f'{error} - retry after {error.retry_after} seconds',
+        'retry_after': error.retry_after
+    }, 503, {'Retry-After': str(error.retry_after)})
+
+
+def write_upload(upload: UploadFile, filepath: str) -> None:
+    """Copy an uploaded file to disk (blocking; run it on the I/O pool)."""
+    upload.file.seek(0)
+    with open(filepath, 'wb') as out:
+        shutil.copyfileobj(upload.file, out)
+
+
+async def save_upload(request: Request) -> Tuple[Optional[str], Dict[str, str], Optional[str]]:
+    """
+    Read the multipart form and save the uploaded ID image.
+
+    Args:
+        request: Incoming request
+
+    Returns:
+        Tuple of (saved file path, form data, None) or (None, form data, error message)
+    """
+    async with request.form() as form:
+        form_data = {field: form.get(field) for field in FORM_FIELDS}
+
+        # Check if image file is present
+        upload = form.get('id_image')
+        if not isinstance(upload, UploadFile):
+            return None, form_data, 'No image file provided'
+        if not upload.filename:
+            return None, form_data, 'No selected file'
+        if not allowed_file(upload.filename):
+            return None, form_data, 'Invalid file type'
+
+        # Create unique filename with timestamp
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filepath = os.path.join(UPLOAD_FOLDER, f"{timestamp}_{secure_filename(upload.filename)}")
+        await run_blocking(write_upload, upload, filepath)
+        return filepath, form_data, None
+
+
+async def verify_api(request: Request) -> JSONResponse:
+    """
+    Async version of the /api/v1/verify endpoint.
+
+    Returns:
+        JSON response with verification results or error message
+    """
+    request.state.request_id = bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+    try:
+        admission = await run_blocking(get_controller().admit)
+    except Overloaded as e:
+        return overloaded_response(request, e)
+
+    filepath = None
+    try:
+        filepath, form_data, error = await save_upload(request)
+        if error:
+            return json_response(request, {'status': 'error', 'message': error}, 400)
+
+        # Validate required fields
+        missing_fields = [field for field, value in form_data.items() if not value]
+        if missing_fields:
+            return json_response(request, {
+                'status': 'error',
+                'message': f'Missing required fields: {", ".join(missing_fields)}'
+            }, 400)
+
+        # Run KYC pipeline and get final decision
+        profiler = RequestProfiler() if should_profile(request.headers.get(PROFILE_HEADER)) else None
+        verification = await averify_identity(form_data, filepath, shed=admission.shed, profiler=profiler)
+        return json_response(request, verification_response(verification))
+
+    except Exception as e:
+        return json_response(request, {'status': 'error', 'message': str(e)}, 500)
+    finally:
+        admission.release()
+        # Clean up uploaded file
+        if filepath and os.path.exists(filepath):
+            os.remove(filepath)
+
+
+async def verify_web(request: Request) -> JSONResponse:
+    """
+    Async version of the /verify_kyc web form endpoint.
+
+    Returns:
+        JSON response with verification results or error message
+    """
+    request.state.request_id = bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+    try:
+        admission = await run_blocking(get_controller().admit)
+    except Overloaded as e:
+        return overloaded_response(request, e)
+
+    filepath = None
+    try:
+        filepath, form_data, error = await save_upload(request)
+        if error:
+            return json_response(request, {'error': error}, 400)
+
+        # Run KYC pipeline and get final decision
+        profiler = RequestProfiler() if should_profile(request.headers.get(PROFILE_HEADER)) else None
+        verification = await averify_identity(form_data, filepath, shed=admission.shed, profiler=profiler)
+        return json_response(request, web_verification_response(verification))
+
+    except Exception as e:
+        return json_response(request, {'error': str(e)}, 500)
+    finally:
+        admission.release()
+        # Clean up uploaded file
+        if filepath and os.path.exists(filepath):
+            os.remove(filepath)
+
+
+async def health(request: Request) -> JSONResponse:
+    """
+    Async version of the /api/v1/health endpoint.
+
+    Returns:
+        JSON response with the service status
+    """
+    request.state.request_id = bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+    # The breaker state is read from SQLite
+    return json_response(request, await run_blocking(health_status))
+
+
+app = Starlette(routes=[
+    Route('/api/v1/verify', verify_api, methods=['POST']),
+    Route('/api/v1/health', health, methods=['GET']),
+    Route('/verify_kyc', verify_web, methods=['POST']),
+    # Everything else (web UI, SSE stream, stored verifications, profiles) stays on Flask
+    Mount('/', app=WSGIMiddleware(flask_app))
+])
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:app', port=5000)
@@ -0,0 +1,210 @@
+"""
+Admission control and degraded mode for verification requests.
+
+A worker runs at most MAX_IN_FLIGHT verifications at once and lets at most
+MAX_QUEUE more wait for a slot; anything beyond that is rejected immediately so
+the client can retry later instead of every request slowing down together.
+While requests keep queueing, the controller steps into degraded levels that
+shed the lowest-priority work (by default the metadata stage, then the
+composite intermediates) so the verifications that are admitted finish faster.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Verifications running at once in this worker
+MAX_IN_FLIGHT = int(os.getenv("KYC_MAX_IN_FLIGHT", "4"))
+
+# Requests allowed to wait for a free slot
+MAX_QUEUE = int(os.getenv("KYC_MAX_QUEUE", "8"))
+
+# Maximum seconds a request waits in the queue before it is rejected
+QUEUE_TIMEOUT = float(os.getenv("KYC_QUEUE_TIMEOUT", "30"))
+
+# Work shed at each degraded level, lowest priority first: pipeline stage names,
+# or "Composites" for the intermediates kept for reviewer composites
+SHED_ORDER = tuple(
+    item.strip() for item in os.getenv("KYC_DEGRADED_SHED", "Metadata,Composites").split(",") if item.strip()
+)
+
+# Seconds of continuous queueing before each further degraded level (0 disables degraded mode)
+DEGRADE_AFTER = float(os.getenv("KYC_DEGRADE_AFTER", "10"))
+
+# Initial estimate of one verification's duration, refined as requests finish
+INITIAL_DURATION_ESTIMATE = 10.0
+
+# Smoothing factor of the moving average of verification durations
+DURATION_SMOOTHING = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; retry_after is a suggested delay in seconds."""
+
+    def __init__(self, retry_after: int, message: str = "Verification service is overloaded"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Admission:
+    """
+    A granted verification slot.
+
+    Use as a context manager or call release() exactly once when the
+    verification has finished.
+    """
+
+    def __init__(self, controller: "AdmissionController", level: int, shed: Tuple[str, ...]):
+        self.level = level
+        self.shed = shed
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        """Free the slot (later calls do nothing)."""
+        if not self._released:
+            self._released = True
+            self._controller._release(time.monotonic() - self._started)
+
+    def __enter__(self) -> "Admission":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class AdmissionController:
+    """
+    Bounded in-flight limit with a bounded wait queue and load-driven degraded levels.
+
+    Level n sheds the first n entries of the shed order. The level rises by one
+    for every DEGRADE_AFTER seconds that requests have been queueing without a
+    break, and falls by one for every DEGRADE_AFTER seconds without queueing.
+    Levels are re-evaluated whenever a request arrives, waits or finishes.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT, shed_order: Tuple[str, ...] = SHED_ORDER,
+                 degrade_after: float = DEGRADE_AFTER):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.shed_order = tuple(shed_order)
+        self.degrade_after = degrade_after
+        self.rejected = 0
+
+        self._in_flight = 0
+        self._waiting = 0
+        self._level = 0
+        self._level_changed = time.monotonic()
+        self._average_duration = INITIAL_DURATION_ESTIMATE
+        self._condition = threading.Condition()
+
+    def _retry_after(self) -> int:
+        """Estimate seconds until a slot frees up for a new request (called with the lock held)."""
+        backlog = self._waiting + 1
+        return max(1, min(120, math.ceil(self._average_duration * backlog / self.max_in_flight)))
+
+    def _update_level(self) -> None:
+        """Step the degraded level up or down based on queueing (called with the lock held)."""
+        if not self.degrade_after or not self.shed_order:
+            return
+        now = time.monotonic()
+        if now - self._level_changed < self.degrade_after:
+            return
+        if self._waiting and self._level < len(self.shed_order):
+            self._level += 1
+            logger.warning("Sustained queueing, degraded level %d (shedding %s)",
+                           self._level, ", ".join(self.shed_order[:self._level]))
+        elif not self._waiting and self._level:
+            self._level -= 1
+            logger.info("Load eased, degraded level %d", self._level)
+        else:
+            return
+        self._level_changed = now
+
+    def admit(self) -> Admission:
+        """
+        Wait for a verification slot.
+
+        Returns:
+            Admission holding the slot and the work to shed at the current level
+
+        Raises:
+            Overloaded: If the queue is full or no slot freed up within the queue timeout
+        """
+        with self._condition:
+            self._update_level()
+            if self._in_flight >= self.max_in_flight:
+                if self._waiting >= self.max_queue:
+                    self.rejected += 1
+                    raise Overloaded(self._retry_after())
+
+                if not self._waiting:
+                    # Queueing starts now; a stretch without queueing has ended
+                    self._level_changed = time.monotonic()
+                self._waiting += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self._in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            raise Overloaded(self._retry_after())
+                        self._condition.wait(remaining)
+                        self._update_level()
+                finally:
+                    self._waiting -= 1
+                    if not self._waiting:
+                        self._level_changed = time.monotonic()
+
+            self._in_flight += 1
+            self._update_level()
+            return Admission(self, self._level, self.shed_order[:self._level])
+
+    def _release(self, duration: float) -> None:
+        """Free a slot and fold the verification's duration into the estimate."""
+        with self._condition:
+            self._in_flight -= 1
+            self._average_duration += DURATION_SMOOTHING * (duration - self._average_duration)
+            self._update_level()
+            self._condition.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report the controller's current load.
+
+        Returns:
+            Dictionary with in-flight and queued counts, limits, the degraded
+            level, the work currently shed and the number of rejected requests
+        """
+        with self._condition:
+            self._update_level()
+            return {
+                "in_flight": self._in_flight,
+                "queued": self._waiting,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "degraded_level": self._level,
+                "shed": list(self.shed_order[:self._level]),
+                "rejected": self.rejected,
+                "average_duration_seconds": round(self._average_duration, 2)
+            }
+
+
+_default_controller: Optional[AdmissionController] = None
+_default_controller_lock = threading.Lock()
+
+
+def get_controller() -> AdmissionController:
+    """Return the process-wide admission controller."""
+    global _default_controller
+    with _default_controller_lock:
+        if _default_controller is None:
+            _default_controller = AdmissionController()
+        return _default_controller
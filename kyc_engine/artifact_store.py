@@ -0,0 +1,274 @@
+"""
+Content-addressed store for analysis artifacts.
+
+Artifacts (ELA images, rendered composites) are stored once per content hash
+under output/artifacts/objects and referenced by verification id and name, so
+concurrent verifications never overwrite each other's files and identical
+artifacts take the disk space of one. Files are written to a temporary name
+and renamed into place, so a reader never sees a partial file. An SQLite index
+records each artifact's size and last access; a background collection removes
+artifacts not read within TTL seconds, then the least recently used ones until
+the store fits its disk budget.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Disk budget of the store in megabytes
+MAX_MEGABYTES = float(os.getenv("KYC_ARTIFACT_BUDGET_MB", "1024"))
+
+# Seconds an artifact is kept after it was last written or read
+TTL = float(os.getenv("KYC_ARTIFACT_TTL", str(7 * 24 * 3600)))
+
+# Minimum seconds between two collections triggered by writes
+COLLECT_INTERVAL = 60.0
+
+# Fraction of the budget a collection frees down to, so it does not run on every write
+LOW_WATER = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    extension TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blobs_accessed_at ON blobs (accessed_at);
+CREATE TABLE IF NOT EXISTS refs (
+    verification_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (verification_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_refs_digest ON refs (digest);
+"""
+
+
+class ArtifactStore:
+    """
+    Deduplicating artifact store with atomic writes and TTL/LRU collection.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None, ttl: float = TTL):
+        if root is None:
+            from kyc_engine.shared import ensure_output_dir
+            root = os.getenv("KYC_ARTIFACT_DIR") or ensure_output_dir("artifacts")
+        self.root = root
+        self.max_bytes = int(MAX_MEGABYTES * 1024 * 1024) if max_bytes is None else max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        self._collect_lock = threading.Lock()
+        self._last_collect = 0.0
+        self._written_since_collect = 0
+
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, "index.db"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _blob_path(self, digest: str, extension: str) -> str:
+        """Return the file path of a blob, fanned out by the first two hex digits."""
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.{extension}")
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        """Write a file under a temporary name and rename it into place."""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def put(self, data: bytes, name: str, verification_id: Optional[str] = None,
+            extension: str = "bin") -> str:
+        """
+        Store an artifact.
+
+        Args:
+            data: Artifact contents
+            name: Artifact name within the verification, e.g. "ela" or "ela_composite"
+            verification_id: Verification the artifact belongs to, if any
+            extension: File extension of the stored file
+
+        Returns:
+            Path of the stored file (shared by every identical artifact)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest, extension)
+        now = time.time()
+
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO blobs (digest, extension, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(digest) DO UPDATE SET accessed_at = excluded.accessed_at",
+                (digest, extension, len(data), now, now)
+            )
+            if verification_id:
+                conn.execute("INSERT OR REPLACE INTO refs (verification_id, name, digest) VALUES (?, ?, ?)",
+                             (verification_id, name, digest))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        # Indexed first, so a concurrent collection sees the fresh access and keeps the file
+        if not os.path.exists(path):
+            self._write_atomic(path, data)
+            self._written_since_collect += len(data)
+        self._maybe_collect(now)
+        return path
+
+    def get(self, verification_id: str, name: str) -> Optional[str]:
+        """
+        Look up an artifact of a verification.
+
+        Args:
+            verification_id: Identifier of the verification
+            name: Artifact name given to put()
+
+        Returns:
+            Path of the stored file, or None if it was never stored or was collected
+        """
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT b.digest, b.extension FROM refs r JOIN blobs b ON b.digest = r.digest "
+            "WHERE r.verification_id = ? AND r.name = ?",
+            (verification_id, name)
+        ).fetchone()
+        if row is None:
+            return None
+        path = self._blob_path(*row)
+        if not os.path.exists(path):
+            return None
+        conn.execute("UPDATE blobs SET accessed_at = ? WHERE digest = ?", (time.time(), row[0]))
+        return path
+
+    def read(self, verification_id: str, name: str) -> Optional[bytes]:
+        """
+        Read an artifact of a verification.
+
+        Args:
+            verification_id: Identifier of the verification
+            name: Artifact name given to put()
+
+        Returns:
+            Artifact contents, or None if it was never stored or was collected
+        """
+        path = self.get(verification_id, name)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _maybe_collect(self, now: float) -> None:
+        """Start a background collection if enough time or data has passed since the last one."""
+        if now - self._last_collect < COLLECT_INTERVAL and \
+                self._written_since_collect < self.max_bytes * (1 - LOW_WATER):
+            return
+        if not self._collect_lock.acquire(blocking=False):
+            return
+        self._last_collect = now
+        self._written_since_collect = 0
+
+        def run():
+            try:
+                self.collect()
+            except Exception as e:
+                logger.error("Error collecting artifacts: %s", e)
+            finally:
+                self._collect_lock.release()
+
+        threading.Thread(target=run, name="kyc-artifact-gc", daemon=True).start()
+
+    def collect(self) -> Dict[str, int]:
+        """
+        Remove expired artifacts, then the least recently used ones over the budget.
+
+        Returns:
+            Dictionary with the number of files removed and the bytes freed
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            victims = conn.execute("SELECT digest, extension, size FROM blobs WHERE accessed_at < ?",
+                                   (now - self.ttl,)).fetchall()
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            total -= sum(size for _, _, size in victims)
+            if total > self.max_bytes:
+                target = self.max_bytes * LOW_WATER
+                for row in conn.execute("SELECT digest, extension, size FROM blobs WHERE accessed_at >= ? "
+                                        "ORDER BY accessed_at", (now - self.ttl,)):
+                    if total <= target:
+                        break
+                    victims.append(row)
+                    total -= row[2]
+            digests = [(digest,) for digest, _, _ in victims]
+            conn.executemany("DELETE FROM blobs WHERE digest = ?", digests)
+            conn.executemany("DELETE FROM refs WHERE digest = ?", digests)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        removed = freed = 0
+        for digest, extension, size in victims:
+            try:
+                os.remove(self._blob_path(digest, extension))
+                removed += 1
+                freed += size
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info("Collected %d artifacts (%d KiB)", removed, freed // 1024)
+        return {"removed": removed, "freed_bytes": freed}
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report the store's disk use.
+
+        Returns:
+            Dictionary with the number of artifacts, their total size and the budget
+        """
+        count, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {"artifacts": count, "bytes": size, "budget_bytes": self.max_bytes}
+
+
+_default_store: Optional[ArtifactStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Return the process-wide artifact store, creating it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ArtifactStore()
+        return _default_store
@@ -0,0 +1,205 @@
+"""
+Async verification for the ASGI server.
+
+The pipeline is synchronous code that spends most of its time waiting on the
+model endpoint. Under an event loop each verification is driven from a pool of
+I/O threads, where a blocked model call costs one idle thread instead of the
+whole worker, and the CPU-bound image checks are handed from there to a pool
+sized to the machine's cores, so concurrent verifications share the CPU
+instead of oversubscribing it.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, AsyncIterator, Callable, Iterator, Optional, Sequence, Tuple
+
+from kyc_engine.admission import MAX_IN_FLIGHT, MAX_QUEUE
+from kyc_engine.verification import iter_verification
+
+# Threads that wait on model calls, coalesced verifications and admission slots; every
+# admitted or queued request may hold one, so there are never fewer than that
+IO_THREADS = max(int(os.getenv("KYC_IO_THREADS", "64")), MAX_IN_FLIGHT + MAX_QUEUE + 1)
+
+# Threads that run the CPU-bound image checks (0 uses one per core)
+CPU_WORKERS = int(os.getenv("KYC_CPU_WORKERS", "0")) or os.cpu_count() or 1
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(name: str, workers: int) -> ThreadPoolExecutor:
+    """Return a process-wide thread pool, creating it on first use."""
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"kyc-{name}")
+        return _pools[name]
+
+
+def get_io_pool() -> ThreadPoolExecutor:
+    """Return the pool of threads that block on I/O for the event loop."""
+    return _get_pool("io", IO_THREADS)
+
+
+def get_cpu_pool() -> ThreadPoolExecutor:
+    """Return the pool that runs the CPU-bound pipeline steps."""
+    return _get_pool("cpu", CPU_WORKERS)
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking call on the I/O pool without blocking the event loop.
+
+    The caller's context (e.g. the logging request id) is carried into the thread.
+
+    Args:
+        func: Blocking callable
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The callable's return value
+    """
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_io_pool(), call)
+
+
+def _close(events) -> None:
+    """Close an abandoned event iterator so its cleanup (single-flight, profiler) runs."""
+    close = getattr(events, "close", None)
+    if close:
+        close()
+
+
+async def _drain_in_thread(start: Callable[[], Iterator], pool: ThreadPoolExecutor) -> AsyncIterator:
+    """
+    Run an iterator to the end in a single pool thread, handing its items over through a queue.
+
+    If the consumer stops early, the iterator is closed in that thread once its
+    current item is done.
+
+    Args:
+        start: Creates the iterator; called in the pool thread
+        pool: Pool providing the thread
+
+    Yields:
+        The iterator's items; an exception it raises is raised here
+    """
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue()
+    abandoned = threading.Event()
+
+    def hand_over(kind: str, value: Any = None) -> None:
+        try:
+            loop.call_soon_threadsafe(items.put_nowait, (kind, value))
+        except RuntimeError:
+            # The event loop has closed; nobody is left to read the item
+            abandoned.set()
+
+    def drain() -> None:
+        events = None
+        try:
+            events = start()
+            for item in events:
+                hand_over("item", item)
+                if abandoned.is_set():
+                    break
+            hand_over("end")
+        except BaseException as e:
+            hand_over("error", e)
+        finally:
+            if events is not None:
+                _close(events)
+
+    loop.run_in_executor(pool, contextvars.copy_context().run, drain)
+    try:
+        while True:
+            kind, value = await items.get()
+            if kind == "end":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        abandoned.set()
+
+
+async def aiter_verification(form_data: Dict[str, str], image_path: str,
+                             verification_id: Optional[str] = None,
+                             shed: Sequence[str] = (),
+                             profiler=None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Async counterpart of verification.iter_verification().
+
+    Profiled verifications run every step in one thread, since the profiler
+    samples the thread that runs the pipeline; their events are handed over
+    through a queue instead of one pool call per step.
+
+    Args:
+        form_data: Dictionary containing user submitted identity information
+        image_path: Path to the uploaded ID card image
+        verification_id: Optional identifier, generated when omitted
+        shed: Work to drop under load, from the admission controller
+        profiler: Optional profiling.RequestProfiler for this verification
+
+    Yields:
+        Tuples of (event type, event payload), as iter_verification()
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_io_pool()
+    if profiler is not None:
+        start = functools.partial(iter_verification, form_data, image_path, verification_id, shed, profiler)
+        async for event in _drain_in_thread(start, pool):
+            yield event
+        return
+
+    context = contextvars.copy_context()
+    events = await loop.run_in_executor(pool, functools.partial(
+        context.run, iter_verification, form_data, image_path, verification_id, shed, None, get_cpu_pool()
+    ))
+    pending = None
+    try:
+        while True:
+            pending = loop.run_in_executor(pool, context.run, next, events, None)
+            event = await pending
+            if event is None:
+                return
+            yield event
+    finally:
+        if pending is not None and not pending.done():
+            # Cancelled mid-step: the step finishes in its thread, then the iterator is closed
+            pending.add_done_callback(lambda _: pool.submit(_close, events))
+        else:
+            pool.submit(_close, events)
+
+
+async def averify_identity(form_data: Dict[str, str], image_path: str,
+                           verification_id: Optional[str] = None,
+                           shed: Sequence[str] = (), profiler=None) -> Dict[str, Any]:
+    """
+    Async counterpart of verification.verify_identity().
+
+    Args:
+        form_data: Dictionary containing user submitted identity information
+        image_path: Path to the uploaded ID card image
+        verification_id: Optional identifier, generated when omitted
+        shed: Work to drop under load, from the admission controller
+        profiler: Optional profiling.RequestProfiler for this verification
+
+    Returns:
+        Dictionary with verification_id, pipeline_results, the raw decision
+        string and the work that was shed
+    """
+    verification = {"verification_id": verification_id, "pipeline_results": {}, "decision": None,
+                    "shed": list(shed)}
+    async for event, payload in aiter_verification(form_data, image_path, verification_id, shed, profiler):
+        verification["verification_id"] = payload["verification_id"]
+        if event == "stage":
+            verification["pipeline_results"][payload["stage"]] = payload["result"]
+        else:
+            verification["decision"] = payload["decision"]
+            verification["shed"] = payload["shed"]
+    return verification
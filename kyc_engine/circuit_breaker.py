@@ -0,0 +1,182 @@
+"""
+Circuit breaker for the model endpoint.
+
+When the provider is down every model call would otherwise spend its full retry
+budget before failing. The breaker counts consecutive provider failures
+(connection errors, timeouts, 429 and 5xx responses) and opens after
+FAILURE_THRESHOLD of them; while open, calls fail immediately with
+ModelUnavailable. After RESET_TIMEOUT seconds one call is let through as a
+probe: success closes the breaker, failure opens it again.
+
+The state lives in a small SQLite database, so all workers on a host share it
+and a provider outage detected by one worker is not re-discovered by the others.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Consecutive provider failures that open the breaker
+FAILURE_THRESHOLD = int(os.getenv("KYC_BREAKER_FAILURES", "5"))
+
+# Seconds the breaker stays open before a probe call is allowed
+RESET_TIMEOUT = float(os.getenv("KYC_BREAKER_RESET", "30"))
+
+# Seconds after which an unanswered probe (e.g. from a crashed worker) is replaced
+PROBE_TIMEOUT = 120.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS breakers (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    changed_at REAL NOT NULL
+);
+"""
+
+
+class ModelUnavailable(Exception):
+    """Raised when the model endpoint cannot be used: the breaker is open or the provider keeps failing."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with state shared through SQLite.
+
+    The common case (closed breaker, successful call) only reads the state;
+    transitions are made in an immediate transaction so concurrent workers
+    agree on which one sends the probe.
+    """
+
+    def __init__(self, name: str = "gemini", path: Optional[str] = None,
+                 failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT,
+                 probe_timeout: float = PROBE_TIMEOUT):
+        if path is None:
+            from kyc_engine.shared import get_output_path
+            path = os.getenv("KYC_BREAKER_DB") or get_output_path("breaker.db", "store")
+        self.name = name
+        self.path = path
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _read(self, conn: sqlite3.Connection):
+        """Return (state, failures, changed_at) for this breaker."""
+        row = conn.execute("SELECT state, failures, changed_at FROM breakers WHERE name = ?",
+                           (self.name,)).fetchone()
+        return row or (CLOSED, 0, 0.0)
+
+    def _write(self, conn: sqlite3.Connection, state: str, failures: int, changed_at: float) -> None:
+        """Store the breaker's state."""
+        conn.execute("INSERT OR REPLACE INTO breakers (name, state, failures, changed_at) VALUES (?, ?, ?, ?)",
+                     (self.name, state, failures, changed_at))
+
+    def allow(self) -> bool:
+        """
+        Decide whether a call may be sent now.
+
+        Returns:
+            True if the breaker is closed or this caller was chosen as the probe
+        """
+        conn = self._connection()
+        state, _, _ = self._read(conn)
+        if state == CLOSED:
+            return True
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state, failures, changed_at = self._read(conn)
+            now = time.time()
+            if state == CLOSED:
+                allowed = True
+            elif (state == OPEN and now - changed_at >= self.reset_timeout) or \
+                    (state == HALF_OPEN and now - changed_at >= self.probe_timeout):
+                self._write(conn, HALF_OPEN, failures, now)
+                logger.info("Circuit breaker '%s': sending a probe call", self.name)
+                allowed = True
+            else:
+                allowed = False
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def is_open(self) -> bool:
+        """Return whether calls are currently being refused (open or probing)."""
+        return self._read(self._connection())[0] != CLOSED
+
+    def record_success(self) -> None:
+        """Close the breaker and reset the failure count."""
+        conn = self._connection()
+        state, failures, _ = self._read(conn)
+        if state == CLOSED and failures == 0:
+            return
+        self._write(conn, CLOSED, 0, time.time())
+        if state != CLOSED:
+            logger.warning("Circuit breaker '%s': closed, the model endpoint is reachable again", self.name)
+
+    def record_failure(self) -> None:
+        """Count a provider failure, opening the breaker at the threshold or after a failed probe."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state, failures, changed_at = self._read(conn)
+            failures += 1
+            now = time.time()
+            if state == HALF_OPEN or (state == CLOSED and failures >= self.failure_threshold):
+                self._write(conn, OPEN, failures, now)
+                logger.error("Circuit breaker '%s': opened after %d consecutive failures", self.name, failures)
+            else:
+                self._write(conn, state, failures, changed_at)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report the breaker's shared state.
+
+        Returns:
+            Dictionary with state, consecutive failures and seconds since the last transition
+        """
+        state, failures, changed_at = self._read(self._connection())
+        return {
+            "state": state,
+            "consecutive_failures": failures,
+            "seconds_in_state": round(time.time() - changed_at, 1) if changed_at else None
+        }
+
+
+_default_breaker: Optional[CircuitBreaker] = None
+_default_breaker_lock = threading.Lock()
+
+
+def get_breaker() -> CircuitBreaker:
+    """Return the process-wide breaker for the Gemini endpoint."""
+    global _default_breaker
+    with _default_breaker_lock:
+        if _default_breaker is None:
+            _default_breaker = CircuitBreaker()
+        return _default_breaker
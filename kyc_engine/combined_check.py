@@ -0,0 +1,114 @@
+"""
+Consolidated OCR and metadata check using a single multimodal model request.
+"""
+from typing import Dict, Any
+
+from kyc_engine.image_loading import RESOLUTION_POLICY
+from kyc_engine.metadata_check import extract_metadata, compact_metadata, TAMPERING_PROMPT_PREFIX
+from kyc_engine.ocr_check import build_ocr_prompt, build_ocr_prompt_parts
+from kyc_engine.shared import (
+    GLOBAL_COMBINED_PROMPT,
+    GLOBAL_TAMPERING_PROMPT,
+    api_call,
+    GEMINI_ENDPOINT,
+    parse_json
+)
+
+_FIELD_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "form_value": {"type": "STRING"},
+        "founded_value": {"type": "STRING"},
+        "match": {"type": "BOOLEAN"}
+    },
+    "required": ["form_value", "founded_value", "match"]
+}
+
+# Response schema shared by both parts, matching the separate OCR and metadata prompts
+COMBINED_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "OCR": {
+            "type": "OBJECT",
+            "properties": {
+                "status": {"type": "STRING", "enum": ["success", "fail", "flag for review"]},
+                "Similarity Score": {"type": "NUMBER"},
+                "detailed_result": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "full_name": _FIELD_SCHEMA,
+                        "dob": _FIELD_SCHEMA,
+                        "nationality": _FIELD_SCHEMA,
+                        "id_number": _FIELD_SCHEMA
+                    },
+                    "required": ["full_name", "dob", "nationality", "id_number"]
+                },
+                "message": {"type": "STRING"}
+            },
+            "required": ["status", "Similarity Score", "detailed_result", "message"]
+        },
+        "Metadata": {
+            "type": "OBJECT",
+            "properties": {
+                "status": {"type": "STRING", "enum": ["success", "fail", "flag for review"]},
+                "message": {"type": "STRING"}
+            },
+            "required": ["status", "message"]
+        }
+    },
+    "required": ["OCR", "Metadata"]
+}
+
+
+def combined_check(form_data: Dict[str, str], image_path: str) -> Dict[str, Any]:
+    """
+    Run OCR extraction and metadata tampering analysis in one Gemini request.
+    
+    The image, form values and compact EXIF metadata are sent together, and the
+    response schema makes the model return both results at once.
+    
+    Args:
+        form_data: Dictionary containing user submitted identity information
+        image_path: Path to the uploaded ID card image
+        
+    Returns:
+        Dictionary with "OCR" and "Metadata" results, shaped like the separate checks
+    """
+    metadata_json, prompt_bytes = compact_metadata(extract_metadata(image_path))
+    prompt = GLOBAL_COMBINED_PROMPT.format(
+        ocr_instructions=build_ocr_prompt(form_data),
+        tampering_instructions=GLOBAL_TAMPERING_PROMPT.format(metadata=metadata_json)
+    )
+
+    ocr_prefix, ocr_suffix = build_ocr_prompt_parts(form_data)
+    prefix = GLOBAL_COMBINED_PROMPT.format(
+        ocr_instructions=ocr_prefix,
+        tampering_instructions=TAMPERING_PROMPT_PREFIX
+    )
+    suffix = f"Part A {ocr_suffix}\nPart B complete metadata:\n{metadata_json}\n"
+
+    result = parse_json(api_call(
+        GEMINI_ENDPOINT,
+        prompt,
+        image_path,
+        generation_config={
+            "responseMimeType": "application/json",
+            "responseSchema": COMBINED_RESPONSE_SCHEMA
+        },
+        cached_prefix=prefix,
+        suffix_text=suffix,
+        image_min_side=RESOLUTION_POLICY["ocr"]
+    ))
+
+    if not result:
+        error = {"error": "Consolidated model response could not be parsed"}
+        return {"OCR": error, "Metadata": error}
+
+    # A failed request comes back as a single status/message object; report it for both checks
+    if "OCR" not in result and "Metadata" not in result:
+        return {"OCR": result, "Metadata": result}
+
+    metadata = result.get("Metadata")
+    if isinstance(metadata, dict):
+        metadata["prompt_bytes"] = prompt_bytes
+    return {"OCR": result.get("OCR"), "Metadata": metadata}
@@ -1,88 +1,294 @@
 """
 KYC verification pipeline and decision making module.
 """
+import contextvars
 import json
-from typing import Dict, Any
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Dict, Any, Callable, Iterator, Optional, Sequence, Tuple
 
+from kyc_engine.circuit_breaker import ModelUnavailable
+from kyc_engine.forensic_broker import dispatch, is_dispatched
 from kyc_engine.ocr_check import gemini
 from kyc_engine.metadata_check import detect_tampering
-from kyc_engine.ela_check import ela_analysis
-from kyc_engine.image_forensics import pixel_level_check
-from kyc_engine.shared import GLOBAL_DECISION_PROMPT, api_call, GEMINI_ENDPOINT
+from kyc_engine.shared import (
+    GLOBAL_DECISION_PROMPT,
+    api_call,
+    GEMINI_ENDPOINT,
+    GEMINI_STREAM_ENDPOINT,
+    CONSOLIDATED_MODEL_CALL,
+    STREAMING_DECISION
+)
 
+logger = logging.getLogger(__name__)
 
-def run_pipeline(form_data: Dict[str, str], image_path: str) -> Dict[str, Any]:
+# Steps that spend their time waiting on the model endpoint rather than on the CPU
+MODEL_STEPS = ("OCR", "Metadata")
+
+# Checks that need no model and cap a provisional local decision when they fail or flag
+LOCAL_CHECKS = ("Quality", "Duplicate", "Face", "JPEG", "Localization")
+
+# Steps that only need the image, so they can run before the form is submitted
+IMAGE_STEPS = ("Quality", "Metadata", "JPEG", "ELA", "Forensics", "Localization")
+
+
+def iter_pipeline(form_data: Dict[str, str], image_path: str,
+                  verification_id: Optional[str] = None,
+                  timings: Optional[Dict[str, float]] = None,
+                  shed: Sequence[str] = (),
+                  on_step: Optional[Callable[[str], None]] = None,
+                  cpu_executor: Optional[Executor] = None,
+                  precomputed: Optional[Dict[str, Any]] = None,
+                  only: Optional[Sequence[str]] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Run the KYC verification pipeline, yielding each step's result as soon as it completes.
+    
+    Args:
+        form_data: Dictionary containing user submitted identity information
+        image_path: Path to the uploaded ID card image
+        verification_id: Optional identifier under which visualization
+            intermediates are cached for on-demand rendering
+        timings: Optional dict that receives each step's duration in milliseconds
+        shed: Work dropped under load (see admission.py): step names whose
+            steps are skipped, or "Composites" to not cache the intermediates
+        on_step: Optional callback called with each step's name as it starts
+            (used by the request profiler)
+        cpu_executor: Optional executor that runs the CPU-bound steps (all
+            but MODEL_STEPS and the checks sent to forensic workers) while the
+            calling thread waits, so concurrent verifications share a bounded
+            pool of CPU workers
+        precomputed: Optional results of steps that already ran, e.g. before
+            the form was submitted; these steps are not run again
+        only: Optional names of the steps to run; the others are left out
+            of the results entirely
+        
+    Yields:
+        Tuples of (step name, step result)
+    """
+    results = {}
+    intermediates = {}
+    # Results produced ahead of their own step (given, reused or from a combined call)
+    precomputed = dict(precomputed or {})
+    timings = timings if timings is not None else {}
+
+    def quality_step():
+        from kyc_engine.quality_gate import quality_check
+        return quality_check(image_path)
+
+    def duplicate_step():
+        from kyc_engine.phash_index import check_duplicates
+        from kyc_engine.verification import hash_image
+        # Needs the form: a resubmission by the same person is not a recycled image
+        duplicate_output, reusable = check_duplicates(image_path, hash_image(image_path), form_data)
+        precomputed.update(reusable)
+        return duplicate_output
+
+    def face_step():
+        from kyc_engine.face_index import check_face
+        return check_face(form_data, image_path, verification_id)
+
+    def ocr_step():
+        if not CONSOLIDATED_MODEL_CALL:
+            return gemini(form_data, image_path)
+        from kyc_engine.combined_check import combined_check
+        combined = combined_check(form_data, image_path)
+        precomputed["Metadata"] = combined["Metadata"]
+        return combined["OCR"]
+
+    def jpeg_step():
+        from kyc_engine.jpeg_structure import jpeg_structure_check
+        return jpeg_structure_check(image_path)
+
+    def ela_step():
+        # Runs on a forensic worker when a broker is configured (see forensic_broker.py)
+        return dispatch("ELA", image_path, verification_id, intermediates)
+
+    def forensics_step():
+        return dispatch("Forensics", image_path, verification_id, intermediates)
+
+    def localization_step():
+        # Fuses the maps ELA and Forensics left in intermediates; nothing is recomputed
+        from kyc_engine.tamper_fusion import localize_tampering
+        return localize_tampering(intermediates, results)
+
+    # Steps run in order; the step number is its position in this list
+    steps = [
+        ("Quality", "Image Quality Gate (blur, exposure, glare, resolution, card presence)", quality_step),
+        ("Duplicate", "Near-duplicate Lookup in the perceptual-hash index", duplicate_step),
+        ("Face", "Face Embedding Lookup across previous identities", face_step),
+        ("OCR", "OCR Extraction using Gemini", ocr_step),
+        ("Metadata", "Metadata Extraction and Tampering Detection", lambda: detect_tampering(image_path)),
+        ("JPEG", "JPEG Structure Analysis (quantization tables and DCT histograms)", jpeg_step),
+        ("ELA", "Error Level Analysis (ELA)", ela_step),
+        ("Forensics", "Pixel-level Forensic Analysis", forensics_step),
+        ("Localization", "Tamper Localization Heatmap fused from the forensic maps", localization_step),
+    ]
+
+    for number, (name, description, step) in enumerate(steps):
+        if only is not None and name not in only:
+            continue
+        if on_step:
+            on_step(name)
+        started = time.perf_counter()
+        # Shed first: a result the combined call or an upload produced anyway is not used either
+        if name in shed:
+            logger.info("Step %d skipped: %s is shed under load", number, name)
+            output = {
+                "status": "skipped",
+                "shed": True,
+                "message": "Skipped under load (degraded mode); not evidence either way."
+            }
+        elif name in precomputed:
+            logger.debug("Step %d skipped: %s result already obtained by an earlier step", number, name)
+            output = precomputed.pop(name)
+        else:
+            try:
+                logger.debug("Step %d - starting %s", number, description)
+                # Model calls and dispatched checks only wait, so they keep the calling thread
+                if cpu_executor is not None and name not in MODEL_STEPS and not is_dispatched(name):
+                    output = cpu_executor.submit(contextvars.copy_context().run, step).result()
+                else:
+                    output = step()
+                logger.debug("Step %d complete: %s result obtained", number, name)
+            except ModelUnavailable as e:
+                logger.warning("Step %d (%s) unavailable: %s", number, name, e)
+                output = {
+                    "status": "unavailable",
+                    "model_unavailable": True,
+                    "message": f"Model endpoint unavailable; check not performed ({e})."
+                }
+            except Exception as e:
+                logger.error("Step %d (%s) failed: %s", number, name, e, exc_info=True)
+                output = {"error": str(e)}
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+        results[name] = output
+        yield name, output
+
+        if name == "Quality" and output.get("status") == "fail":
+            # Unusable photo: ask for a recapture instead of spending model requests on it
+            logger.info("Image quality gate failed; skipping remaining steps")
+            break
+
+    # Keep the intermediates so composites can be rendered if a reviewer asks
+    if verification_id and intermediates and "Composites" not in shed:
+        from kyc_engine.visualization import cache_intermediates
+        cache_intermediates(verification_id, intermediates)
+
+    logger.info("Pipeline complete", extra={"fields": {
+        "verification_id": verification_id,
+        "statuses": {name: (output or {}).get("status") for name, output in results.items()},
+        "timings_ms": timings
+    }})
+    # Serializing every result is only worth it when someone reads it
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Aggregated results: %s", json.dumps(results, indent=4))
+
+
+def run_pipeline(form_data: Dict[str, str], image_path: str,
+                 verification_id: Optional[str] = None,
+                 timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
     """
     Run the complete KYC verification pipeline on the given form data and image.
     
     Args:
         form_data: Dictionary containing user submitted identity information
         image_path: Path to the uploaded ID card image
+        verification_id: Optional identifier under which visualization
+            intermediates are cached for on-demand rendering
+        timings: Optional dict that receives each step's duration in milliseconds
         
     Returns:
         Dictionary containing results from all verification steps
     """
-    results = {}
+    return dict(iter_pipeline(form_data, image_path, verification_id, timings))
 
-    # Step 1: OCR Extraction using Gemini
-    try:
-        print("DEBUG: Step 1 - Starting OCR Extraction using Gemini...")
-        ocr_output = gemini(form_data, image_path)
-        results["OCR"] = ocr_output
-        print("DEBUG: Step 1 complete. OCR result obtained.")
-    except Exception as e:
-        print(f"DEBUG: Step 1 failed: {e}")
-        results["OCR"] = {"error": str(e)}
-
-    # Step 2: Metadata Extraction & Tampering Detection
-    try:
-        print("DEBUG: Step 2 - Starting Metadata Extraction and Tampering Detection...")
-        metadata_output = detect_tampering(image_path)
-        results["Metadata"] = metadata_output
-        print("DEBUG: Step 2 complete. Metadata result obtained.")
-    except Exception as e:
-        print(f"DEBUG: Step 2 failed: {e}")
-        results["Metadata"] = {"error": str(e)}
-
-    # Step 3: Error Level Analysis (ELA)
-    try:
-        print("DEBUG: Step 3 - Starting Error Level Analysis (ELA)...")
-        ela_output = ela_analysis(image_path)
-        results["ELA"] = ela_output
-        print("DEBUG: Step 3 complete. ELA result obtained.")
-    except Exception as e:
-        print(f"DEBUG: Step 3 failed: {e}")
-        results["ELA"] = {"error": str(e)}
-
-    # Step 4: Pixel-level Forensic Analysis
-    try:
-        print("DEBUG: Step 4 - Starting Pixel-level Forensic Analysis...")
-        forensics_output = pixel_level_check(image_path)
-        results["Forensics"] = forensics_output
-        print("DEBUG: Step 4 complete. Forensics result obtained.")
-    except Exception as e:
-        print(f"DEBUG: Step 4 failed: {e}")
-        results["Forensics"] = {"error": str(e)}
 
-    aggregated_results = json.dumps(results, indent=4)
-    print("DEBUG: Pipeline execution complete. Aggregated results:")
-    print(aggregated_results)
+def local_decision(pipeline_result: Dict[str, Any], reason: str) -> str:
+    """
+    Build a provisional decision from the local image checks while the model is unavailable.
+    
+    ELA and the pixel-level forensics decide: both failing denies, any failure
+    or flag (or a missing result) flags for review, and two clean results
+    accept. A failure or flag from any other local check (LOCAL_CHECKS) caps
+    the verdict at flag for review. The identity fields were not read, so the
+    decision is marked provisional and must be re-checked once the model is back.
+    
+    Args:
+        pipeline_result: Dictionary containing results from all verification steps
+        reason: Why the model could not be used
+        
+    Returns:
+        Decision as a JSON string with decision, reason and provisional fields
+    """
+    ela = (pipeline_result.get("ELA") or {}).get("status", "missing")
+    forensics = (pipeline_result.get("Forensics") or {}).get("status", "missing")
+    concerns = [
+        f"{name} ({status})" for name in LOCAL_CHECKS
+        for status in [(pipeline_result.get(name) or {}).get("status")]
+        if status in ("fail", "flag for review")
+    ]
+
+    if ela == "fail" and forensics == "fail":
+        decision = "deny"
+    elif ela == "success" and forensics == "success" and not concerns:
+        decision = "accept"
+    else:
+        decision = "flag for review"
 
-    return results
+    other_checks = f"; other local checks raised: {', '.join(concerns)}" if concerns else ""
+    return json.dumps({
+        "decision": decision,
+        "reason": f"Provisional local verdict from ELA ({ela}) and forensics ({forensics}){other_checks}; "
+                  f"identity fields were not checked because the model was unavailable ({reason}).",
+        "provisional": True
+    })
 
 
 def kyc_decision(pipeline_result: Dict[str, Any]) -> str:
     """
     Make a final KYC verification decision based on results from all verification steps.
     
+    Submissions rejected by the image quality gate are denied with a recapture
+    request without calling the model. If the model endpoint is unavailable
+    (OCR could not run or the decision call failed), a provisional
+    local_decision() is returned instead.
+    
+    With STREAMING_DECISION enabled (off by default) the response is streamed and
+    the request is cancelled once the decision field is complete, so the reason
+    may be truncated.
+    
     Args:
         pipeline_result: Dictionary containing results from all verification steps
         
     Returns:
         Decision as a JSON string with decision and reason fields
     """
-    prompt = GLOBAL_DECISION_PROMPT + json.dumps(pipeline_result)
-    decision_result = api_call(GEMINI_ENDPOINT, prompt)
+    quality = pipeline_result.get("Quality") or {}
+    if quality.get("status") == "fail":
+        return json.dumps({
+            "decision": "deny",
+            "reason": quality.get("message", "Image quality is insufficient for verification."),
+            "recapture": True
+        })
+
+    ocr = pipeline_result.get("OCR") or {}
+    if ocr.get("model_unavailable"):
+        return local_decision(pipeline_result, "OCR could not run")
+
+    results_json = json.dumps(pipeline_result)
+    prompt = GLOBAL_DECISION_PROMPT + results_json
+    try:
+        if STREAMING_DECISION:
+            return api_call(GEMINI_STREAM_ENDPOINT, prompt,
+                            cached_prefix=GLOBAL_DECISION_PROMPT, suffix_text=results_json,
+                            required_fields=("decision",))
+
+        decision_result = api_call(GEMINI_ENDPOINT, prompt,
+                                   cached_prefix=GLOBAL_DECISION_PROMPT, suffix_text=results_json)
+    except ModelUnavailable as e:
+        return local_decision(pipeline_result, str(e))
     return decision_result
 
 
@@ -1,42 +1,46 @@
 """
 Error Level Analysis (ELA) module for detecting image tampering.
 """
+import io
+
 from PIL import Image, ImageChops, ImageEnhance
-import os
 import numpy as np
-import matplotlib.pyplot as plt
 
-from kyc_engine.shared import get_output_path
+from kyc_engine.artifact_store import get_artifact_store
+from kyc_engine.thresholds import get_thresholds
+from kyc_engine.visualization import build_ela_composite, encode_png
 
 
-def ela_analysis(image_path, quality=90, output_path=None):
+def ela_analysis(image_path, quality=90, output_path=None, intermediates=None, verification_id=None, store=True):
     """
     Perform Error Level Analysis on an image to detect tampering.
     
     Args:
         image_path: Path to the input image
         quality: JPEG compression quality for recompression
-        output_path: Optional path to save the ELA image
+        output_path: Optional path to save the ELA image (default: the artifact store)
+        intermediates: Optional dict that receives the arrays used for visualization
+        verification_id: Optional verification the stored ELA image belongs to
+        store: Whether to store the ELA image here; if False (on a forensic
+            worker) its encoded bytes are left in intermediates["ela"]["artifact"]
+            for the caller to store
         
     Returns:
         Dictionary with analysis results
     """
-    # Open the image and convert to RGB
+    # Open the image and convert to RGB; like image_loading.load_image(), the EXIF
+    # orientation is not applied, so the maps line up with the forensic ones
     original = Image.open(image_path).convert("RGB")
 
-    # Generate output path if not provided
-    if output_path is None:
-        output_path = get_output_path("ela_result.jpg", "analysis")
-    
-    # Save a temporary JPEG with controlled quality
-    temp_path = get_output_path("temp_ela_check.jpg", "temp")
-    original.save(temp_path, "JPEG", quality=quality)
-
-    # Reopen the recompressed image
-    recompressed = Image.open(temp_path)
+    # Recompress in memory with controlled quality
+    buffer = io.BytesIO()
+    original.save(buffer, "JPEG", quality=quality)
+    buffer.seek(0)
+    recompressed = Image.open(buffer)
 
     # Compute the absolute difference (Error Level Analysis)
     ela_image = ImageChops.difference(original, recompressed)
+    difference = np.array(ela_image)
 
     # Enhance differences to make them more visible
     extrema = ela_image.getextrema()
@@ -45,13 +49,23 @@ def ela_analysis(image_path, quality=90, output_path=None):
     ela_image = ImageEnhance.Brightness(ela_image).enhance(scale)
 
     # Save the ELA result
-    ela_image.save(output_path)
+    artifact = None
+    if output_path is None:
+        encoded = io.BytesIO()
+        ela_image.save(encoded, "JPEG")
+        if store:
+            output_path = get_artifact_store().put(encoded.getvalue(), "ela", verification_id, "jpg")
+        else:
+            artifact = {"data": encoded.getvalue(), "kind": "ela", "extension": "jpg"}
+    else:
+        ela_image.save(output_path)
 
-    # Determine the status and message based on error level
-    if max_diff < 50:
+    # Determine the status and message based on error level (see thresholds.py)
+    cutoffs = get_thresholds()["ela"]
+    if max_diff < cutoffs["flag_level"]:
         status = "success"
         message = "No significant manipulation detected."
-    elif 50 <= max_diff < 150:
+    elif max_diff < cutoffs["fail_level"]:
         status = "flag for review"
         message = "Possible minor modifications. Requires further verification."
     else:
@@ -64,6 +78,18 @@ def ela_analysis(image_path, quality=90, output_path=None):
         "error_level": max_diff,
         "output_path": output_path
     }
+
+    if intermediates is not None:
+        intermediates["ela"] = {
+            "original": np.array(original),
+            "recompressed": np.array(recompressed.convert("RGB")),
+            "ela": np.array(ela_image),
+            # Raw per-channel difference; the ELA image above is brightness-stretched
+            "difference": difference,
+            "report": report
+        }
+        if artifact is not None:
+            intermediates["ela"]["artifact"] = artifact
     return report
 
 
@@ -80,61 +106,21 @@ def generate_composite_ela_image(image_path, quality=90, output_path=None):
     Args:
         image_path: Path to the input image
         quality: JPEG compression quality for recompression
-        output_path: Optional path to save the composite image
+        output_path: Optional path to save the composite image (default: the artifact store)
         
     Returns:
         Path to the saved composite image
     """
-    # Generate output path if not provided
-    if output_path is None:
-        output_path = get_output_path("composite_ela_image.png", "analysis")
-    
-    # Perform ELA analysis and save the result image
-    ela_result_path = get_output_path("ela_result.jpg", "analysis")
-    report = ela_analysis(image_path, quality=quality, output_path=ela_result_path)
+    # Perform ELA analysis, keeping the arrays needed for the composite
+    intermediates = {}
+    ela_analysis(image_path, quality=quality, intermediates=intermediates)
 
-    # Load images with PIL and convert to NumPy arrays for plotting
-    original = Image.open(image_path).convert("RGB")
-    recompressed = Image.open(get_output_path("temp_ela_check.jpg", "temp")).convert("RGB")
-    ela_image = Image.open(ela_result_path).convert("RGB")
-
-    original_np = np.array(original)
-    recompressed_np = np.array(recompressed)
-    ela_np = np.array(ela_image)
-
-    # Create a 2x2 composite plot using matplotlib
-    fig, axs = plt.subplots(2, 2, figsize=(12, 10))
-
-    # Original Image
-    axs[0, 0].imshow(original_np)
-    axs[0, 0].set_title("Original Image")
-    axs[0, 0].axis("off")
-
-    # Recompressed Image
-    axs[0, 1].imshow(recompressed_np)
-    axs[0, 1].set_title("Recompressed Image")
-    axs[0, 1].axis("off")
-
-    # ELA Image
-    axs[1, 0].imshow(ela_np)
-    axs[1, 0].set_title("ELA Image")
-    axs[1, 0].axis("off")
-
-    # Summary Tile with analysis report
-    axs[1, 1].axis("off")
-    summary_text = (
-        f"Status: {report['status']}\n"
-        f"Error Level: {report['error_level']}\n"
-        f"Message: {report['message']}"
-    )
-    axs[1, 1].text(0.5, 0.5, summary_text, fontsize=12, ha='center', va='center', wrap=True)
-    axs[1, 1].set_title("Summary")
-
-    plt.tight_layout()
-
-    # Save the composite image
-    plt.savefig(output_path)
-    plt.close(fig)
+    # Tile the intermediates and save the composite image
+    png = encode_png(build_ela_composite(intermediates["ela"]))
+    if output_path is None:
+        return get_artifact_store().put(png, "ela_composite", extension="png")
+    with open(output_path, "wb") as file:
+        file.write(png)
 
     return output_path
 
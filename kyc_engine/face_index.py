@@ -0,0 +1,342 @@
+"""
+Face embedding index module for detecting one face across multiple identities.
+
+The portrait on every verified ID is reduced to a normalized face embedding,
+stored in SQLite and mirrored in an in-memory NumPy matrix, so a new portrait is
+compared against all previous ones with a single matrix-vector product. A match whose recorded name
+or ID number differs from the submitted form data means the same person applied
+under another identity.
+"""
+import hashlib
+import importlib.util
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from kyc_engine.shared import get_output_path
+
+# DeepFace recognition model and face detector
+FACE_MODEL = os.getenv("KYC_FACE_MODEL", "Facenet512")
+FACE_DETECTOR = os.getenv("KYC_FACE_DETECTOR", "opencv")
+
+# Maximum cosine distance for two portraits to count as the same face
+FACE_DISTANCE = float(os.getenv("KYC_FACE_DISTANCE", "0.30"))
+
+# Rows allocated when the index is first created
+INITIAL_CAPACITY = 1024
+
+# Embeddings kept between the face stage and the final decision
+MAX_PENDING_EMBEDDINGS = 256
+
+_model_lock = threading.Lock()
+_model_loaded = False
+
+_pending_lock = threading.Lock()
+_pending: "OrderedDict[str, Tuple[Any, Dict[str, str]]]" = OrderedDict()
+
+
+def is_available() -> bool:
+    """Return whether the optional deepface dependency is installed."""
+    return importlib.util.find_spec("deepface") is not None
+
+
+def load_model() -> None:
+    """Build the recognition model once per process so later calls reuse it."""
+    global _model_loaded
+    with _model_lock:
+        if _model_loaded:
+            return
+        from deepface import DeepFace
+        DeepFace.build_model(FACE_MODEL)
+        _model_loaded = True
+
+
+def extract_embedding(image_path: str):
+    """
+    Detect the ID portrait and compute its normalized embedding.
+
+    The largest detected face is used, so secondary ghost portraits and
+    holograms are ignored.
+
+    Args:
+        image_path: Path to the ID card image
+
+    Returns:
+        Unit-length float32 embedding, or None if no face was found
+    """
+    import numpy as np
+    from deepface import DeepFace
+
+    load_model()
+    try:
+        faces = DeepFace.represent(
+            img_path=image_path,
+            model_name=FACE_MODEL,
+            detector_backend=FACE_DETECTOR,
+            enforce_detection=True
+        )
+    except ValueError:
+        return None
+    if not faces:
+        return None
+
+    face = max(faces, key=lambda f: f["facial_area"]["w"] * f["facial_area"]["h"])
+    embedding = np.asarray(face["embedding"], dtype=np.float32)
+    norm = float(np.linalg.norm(embedding))
+    return embedding / norm if norm else None
+
+
+def identity_keys(form_data: Dict[str, str]) -> Dict[str, str]:
+    """
+    Hash the normalized name and ID number so identities can be compared without storing them.
+
+    Args:
+        form_data: Dictionary containing user submitted identity information
+
+    Returns:
+        Dictionary with name and id_number hashes
+    """
+    name = unicodedata.normalize("NFKD", form_data.get("full_name", ""))
+    name = " ".join("".join(c for c in name if not unicodedata.combining(c)).lower().split())
+    id_number = "".join(c for c in form_data.get("id_number", "") if c.isalnum()).upper()
+    return {
+        "name": hashlib.sha256(name.encode("utf-8")).hexdigest()[:32],
+        "id_number": hashlib.sha256(id_number.encode("utf-8")).hexdigest()[:32]
+    }
+
+
+FACE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS faces (
+    id INTEGER PRIMARY KEY,
+    verification_id TEXT NOT NULL,
+    decision TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id_number TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    embedding BLOB NOT NULL
+);
+"""
+
+
+class FaceIndex:
+    """
+    Persistent index of face embeddings from previous verifications.
+
+    Each embedding is stored in one SQLite row together with its entry, so
+    concurrent workers cannot pair a face with another verification's identity.
+    Before each search or insert, the rows added since the last read (by any
+    worker) are appended to the in-memory matrix, which doubles its capacity as
+    it grows, so inserts are amortized O(1).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.db_path = (path or get_output_path(f"faces_{FACE_MODEL.lower()}", "index")) + ".db"
+        self._vectors = None
+        self._entries: List[Dict[str, Any]] = []
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connection().executescript(FACE_SCHEMA)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._entries)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _refresh(self) -> None:
+        """Append the rows added since the last read, by this or another worker (called with the lock held)."""
+        import numpy as np
+
+        rows = self._connection().execute(
+            "SELECT id, verification_id, decision, name, id_number, dim, timestamp, embedding "
+            "FROM faces WHERE id > ? ORDER BY id", (self._last_id,)
+        ).fetchall()
+        for row_id, verification_id, decision, name, id_number, dim, timestamp, embedding in rows:
+            self._ensure_capacity(dim)
+            self._vectors[len(self._entries)] = np.frombuffer(embedding, dtype=np.float32)
+            self._entries.append({
+                "verification_id": verification_id,
+                "decision": decision,
+                "name": name,
+                "id_number": id_number,
+                "dim": dim,
+                "timestamp": timestamp
+            })
+            self._last_id = row_id
+
+    def _ensure_capacity(self, dim: int) -> None:
+        """Grow the matrix so one more row fits (called with the lock held)."""
+        import numpy as np
+
+        if self._vectors is None:
+            self._vectors = np.empty((INITIAL_CAPACITY, dim), dtype=np.float32)
+        elif len(self._entries) == len(self._vectors):
+            grown = np.empty((len(self._vectors) * 2, dim), dtype=np.float32)
+            grown[:len(self._entries)] = self._vectors[:len(self._entries)]
+            self._vectors = grown
+
+    def search(self, embedding, max_distance: float = FACE_DISTANCE,
+               limit: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Find indexed faces within max_distance of an embedding.
+
+        Args:
+            embedding: Unit-length query embedding
+            max_distance: Maximum cosine distance
+            limit: Maximum number of matches
+
+        Returns:
+            List of (distance, entry) pairs sorted by distance
+        """
+        import numpy as np
+
+        with self._lock:
+            self._refresh()
+            count = len(self._entries)
+            if not count or self._vectors.shape[1] != len(embedding):
+                return []
+            distances = 1.0 - self._vectors[:count] @ embedding
+            candidates = np.flatnonzero(distances <= max_distance)
+            if len(candidates) > limit:
+                candidates = candidates[np.argpartition(distances[candidates], limit)[:limit]]
+            order = candidates[np.argsort(distances[candidates])]
+            return [(round(float(distances[i]), 4), self._entries[i]) for i in order]
+
+    def add(self, embedding, verification_id: str, decision: str,
+            identity: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Add a verified face to the index and persist it.
+
+        Args:
+            embedding: Unit-length embedding of the portrait
+            verification_id: Identifier of the verification
+            decision: Final decision (accept/deny/flag for review)
+            identity: Hashed identity from identity_keys()
+
+        Returns:
+            The stored entry
+        """
+        import numpy as np
+
+        embedding = np.asarray(embedding, dtype=np.float32)
+        entry = {
+            "verification_id": verification_id,
+            "decision": decision,
+            "name": identity["name"],
+            "id_number": identity["id_number"],
+            "dim": len(embedding),
+            "timestamp": time.time()
+        }
+        with self._lock:
+            # One row per face: the embedding cannot be separated from its entry
+            self._connection().execute(
+                "INSERT INTO faces (verification_id, decision, name, id_number, dim, timestamp, embedding) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (verification_id, decision, entry["name"], entry["id_number"], entry["dim"], entry["timestamp"],
+                 embedding.tobytes())
+            )
+            self._refresh()
+        return entry
+
+
+_default_index: Optional[FaceIndex] = None
+_default_index_lock = threading.Lock()
+
+
+def get_index() -> FaceIndex:
+    """Return the process-wide face index."""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = FaceIndex()
+        return _default_index
+
+
+def check_face(form_data: Dict[str, str], image_path: str,
+               verification_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Search the face index for the ID portrait and compare the recorded identities.
+
+    Args:
+        form_data: Dictionary containing user submitted identity information
+        image_path: Path to the uploaded ID card image
+        verification_id: Identifier under which the embedding is kept until the
+            decision is recorded
+
+    Returns:
+        Dictionary with status, matches and message
+    """
+    if not is_available():
+        return {"status": "success", "applicable": False,
+                "message": "Face matching unavailable: deepface is not installed."}
+
+    embedding = extract_embedding(image_path)
+    if embedding is None:
+        return {"status": "success", "applicable": True, "face_found": False,
+                "message": "No portrait detected on the document; face matching skipped."}
+
+    identity = identity_keys(form_data)
+    if verification_id:
+        with _pending_lock:
+            _pending[verification_id] = (embedding, identity)
+            while len(_pending) > MAX_PENDING_EMBEDDINGS:
+                _pending.popitem(last=False)
+
+    matches = [
+        {
+            "verification_id": entry["verification_id"],
+            "decision": entry["decision"],
+            "distance": distance,
+            "same_identity": entry["name"] == identity["name"] and entry["id_number"] == identity["id_number"]
+        }
+        for distance, entry in get_index().search(embedding)
+    ]
+    conflicts = [match for match in matches if not match["same_identity"]]
+    result = {
+        "status": "success",
+        "applicable": True,
+        "face_found": True,
+        "matches": matches,
+        "message": "Face not matched to a different identity."
+    }
+
+    if any(match["decision"] == "deny" for match in conflicts):
+        result["status"] = "fail"
+        result["message"] = "Same face was submitted under a different identity in a denied verification."
+    elif conflicts:
+        result["status"] = "flag for review"
+        result["message"] = "Same face was previously verified under a different name or ID number."
+    return result
+
+
+def record_face(verification_id: str, decision: str) -> Optional[Dict[str, Any]]:
+    """
+    Add the embedding computed by check_face() for a verification to the index.
+
+    Args:
+        verification_id: Identifier of the verification
+        decision: Final decision (accept/deny/flag for review)
+
+    Returns:
+        The stored entry, or None if no embedding is pending for the verification
+    """
+    with _pending_lock:
+        pending = _pending.pop(verification_id, None)
+    if pending is None:
+        return None
+    embedding, identity = pending
+    return get_index().add(embedding, verification_id, decision, identity)
@@ -0,0 +1,542 @@
+"""
+Dispatch of the CPU-heavy forensic checks to worker processes.
+
+By default ELA and the pixel-level forensics run inside the verification, on
+the API host. With KYC_FORENSIC_BROKER set, the pipeline submits them as tasks
+to a broker instead and waits for the result, so forensic CPU capacity is
+scaled by adding workers (see forensic_worker.py) rather than API processes:
+
+- "memory": an in-process queue served by worker threads started with the
+  application, bounded to KYC_FORENSIC_CONCURRENCY checks at once
+- "file": a queue in an SQLite file (KYC_BROKER_DB) shared by every process on
+  the host, or across hosts on a shared volume; workers run separately
+- "package.module:factory": any other broker, built by calling the factory
+
+Each task carries its own id; the worker stores the result under it and only
+the submitting verification reads it back. Workers send heartbeats, which
+extend the lease on the tasks they hold: a task whose worker stopped
+heartbeating is handed to another worker. When no worker is alive the check
+runs locally, so verifications never wait on an empty pool.
+
+File-broker payloads are pickled; the broker file must only be writable by the
+service's own processes. Results of remote tasks carry only preview-sized maps
+(see visualization.reduce_intermediates) and the ELA image's encoded bytes,
+which the API stores in its own artifact store.
+"""
+import importlib
+import json
+import logging
+import os
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Dict, Any, List, Optional, Sequence
+
+from kyc_engine.log_config import request_id_var
+
+logger = logging.getLogger(__name__)
+
+# Broker the forensic checks are dispatched to ("" runs them inside the verification)
+BROKER = os.getenv("KYC_FORENSIC_BROKER", "").strip()
+
+# Checks an in-process broker runs at once (0 uses one per core)
+CONCURRENCY = int(os.getenv("KYC_FORENSIC_CONCURRENCY", "0")) or os.cpu_count() or 1
+
+# Seconds a verification waits for a dispatched check before giving up on it
+TASK_TIMEOUT = float(os.getenv("KYC_FORENSIC_TIMEOUT", "120"))
+
+# Seconds between two heartbeats of a worker
+HEARTBEAT_INTERVAL = 5.0
+
+# Seconds without a heartbeat after which a worker is presumed dead and its tasks are re-queued
+WORKER_TIMEOUT = float(os.getenv("KYC_WORKER_TIMEOUT", "30"))
+
+# Times a task is handed out before it is failed (a check that kills its worker is not retried forever)
+MAX_ATTEMPTS = 2
+
+# Seconds between two polls of the file broker
+POLL_INTERVAL = 0.05
+
+# Seconds an unread result is kept, e.g. for a verification whose process died
+RESULT_TTL = 600.0
+
+
+def _run_ela(image_path: str, intermediates: Dict[str, Any], verification_id: Optional[str],
+             store: bool = True) -> Dict[str, Any]:
+    from kyc_engine.ela_check import ela_analysis
+    return ela_analysis(image_path, intermediates=intermediates, verification_id=verification_id, store=store)
+
+
+def _run_forensics(image_path: str, intermediates: Dict[str, Any], verification_id: Optional[str],
+                   store: bool = True) -> Dict[str, Any]:
+    from kyc_engine.image_forensics import pixel_level_check
+    return pixel_level_check(image_path, intermediates=intermediates)
+
+
+# Checks that can run on a worker, by pipeline step name; each takes
+# (image_path, intermediates, verification_id, store) and returns its report.
+# With store False, artifacts are left in intermediates for the caller to store
+FORENSIC_TASKS = {
+    "ELA": _run_ela,
+    "Forensics": _run_forensics,
+}
+
+
+class ForensicTaskError(Exception):
+    """Raised when a dispatched check failed on its worker or got no result in time."""
+
+
+def execute_task(task: Dict[str, Any], worker_id: str) -> Dict[str, Any]:
+    """
+    Run a forensic task (on a worker).
+
+    Tasks from a remote broker carry the image bytes, which are written to a
+    temporary file for the duration of the check. Their results only carry
+    preview-sized intermediates, and artifacts are returned rather than stored.
+
+    Args:
+        task: Task built by dispatch()
+        worker_id: Identifier of the worker running it
+
+    Returns:
+        Result dictionary with the report and intermediates, or the error
+    """
+    token = request_id_var.set(task.get("request_id") or "-")
+    image_path = task["image_path"]
+    remote = task.get("image") is not None
+    temp_path = None
+    started = time.perf_counter()
+    try:
+        if remote:
+            from kyc_engine.shared import get_output_path
+            extension = os.path.splitext(image_path)[1] or ".jpg"
+            temp_path = get_output_path(f"{task['id']}{extension}", "worker")
+            with open(temp_path, "wb") as file:
+                file.write(task["image"])
+            image_path = temp_path
+
+        intermediates: Dict[str, Any] = {}
+        report = FORENSIC_TASKS[task["kind"]](image_path, intermediates, task.get("verification_id"), not remote)
+        if remote:
+            from kyc_engine.visualization import reduce_intermediates
+            intermediates = reduce_intermediates(intermediates)
+        result = {"report": report, "intermediates": intermediates, "error": None}
+    except Exception as e:
+        logger.error("Forensic task %s (%s) failed: %s", task["id"], task["kind"], e, exc_info=True)
+        result = {"report": None, "intermediates": {}, "error": str(e)}
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        request_id_var.reset(token)
+    result["worker"] = worker_id
+    result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+class Broker:
+    """
+    Interface of a forensic task broker.
+
+    Tasks and results are dictionaries. A broker whose workers may run in other
+    processes sets remote, so tasks carry the image itself rather than its path.
+    """
+
+    name = "broker"
+    remote = True
+
+    def submit(self, task: Dict[str, Any]) -> None:
+        """Queue a task for the next free worker."""
+        raise NotImplementedError
+
+    def result(self, task_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait for a task's result and remove it; None if it did not arrive within timeout."""
+        raise NotImplementedError
+
+    def cancel(self, task_id: str) -> None:
+        """Withdraw a task whose result is no longer awaited."""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, kinds: Sequence[str], timeout: float) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued task of one of the given kinds, waiting up to timeout for one."""
+        raise NotImplementedError
+
+    def complete(self, task_id: str, result: Dict[str, Any]) -> None:
+        """Store a task's result for its submitter."""
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id: str, info: Dict[str, Any]) -> None:
+        """Record that a worker is alive, with its current load."""
+        raise NotImplementedError
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Return the last heartbeat of each worker seen within WORKER_TIMEOUT."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Report the queue depth and the live workers."""
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    """
+    Broker for worker threads in the same process.
+
+    Tasks reference the image by path and results are handed back through a
+    future per task, so nothing is copied or serialized.
+    """
+
+    name = "memory"
+    remote = False
+
+    def __init__(self):
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._futures: Dict[str, Future] = {}
+        self._heartbeats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, task: Dict[str, Any]) -> None:
+        with self._lock:
+            self._futures[task["id"]] = Future()
+        self._queue.put(task)
+
+    def result(self, task_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            future = self._futures.get(task_id)
+        if future is None:
+            return None
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            return None
+        with self._lock:
+            self._futures.pop(task_id, None)
+        return result
+
+    def cancel(self, task_id: str) -> None:
+        # A queued task is skipped by the worker once its future is gone
+        with self._lock:
+            self._futures.pop(task_id, None)
+
+    def claim(self, worker_id: str, kinds: Sequence[str], timeout: float) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                task = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+            with self._lock:
+                awaited = task["id"] in self._futures
+            if not awaited:
+                continue
+            if task["kind"] in kinds:
+                return task
+            # Meant for a worker serving other kinds
+            self._queue.put(task)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def complete(self, task_id: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            future = self._futures.get(task_id)
+        if future is not None:
+            future.set_result(result)
+
+    def heartbeat(self, worker_id: str, info: Dict[str, Any]) -> None:
+        with self._lock:
+            self._heartbeats[worker_id] = dict(info, worker_id=worker_id, heartbeat_at=time.time())
+
+    def workers(self) -> List[Dict[str, Any]]:
+        cutoff = time.time() - WORKER_TIMEOUT
+        with self._lock:
+            return [dict(info) for info in self._heartbeats.values() if info["heartbeat_at"] >= cutoff]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"broker": self.name, "queued": self._queue.qsize(), "workers": self.workers()}
+
+
+FILE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    state TEXT NOT NULL,
+    worker_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    result BLOB,
+    submitted_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks (state, submitted_at);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    info TEXT NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+QUEUED = "queued"
+CLAIMED = "claimed"
+DONE = "done"
+
+
+class FileBroker(Broker):
+    """
+    Broker backed by an SQLite file.
+
+    Tasks are claimed in an immediate transaction, so two workers never take
+    the same one. A claim is a lease that the worker's heartbeats renew; once
+    it lapses the task is queued again, up to MAX_ATTEMPTS hand-outs.
+    """
+
+    name = "file"
+    remote = True
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            from kyc_engine.shared import get_output_path
+            path = os.getenv("KYC_BROKER_DB") or get_output_path("broker.db", "store")
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(FILE_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, task: Dict[str, Any]) -> None:
+        now = time.time()
+        conn = self._connection()
+        conn.execute("INSERT INTO tasks (id, kind, payload, state, submitted_at) VALUES (?, ?, ?, ?, ?)",
+                     (task["id"], task["kind"], pickle.dumps(task, pickle.HIGHEST_PROTOCOL), QUEUED, now))
+        # Results nobody came back for
+        conn.execute("DELETE FROM tasks WHERE state = ? AND finished_at < ?", (DONE, now - RESULT_TTL))
+
+    def result(self, task_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        conn = self._connection()
+        deadline = time.monotonic() + timeout
+        while True:
+            row = conn.execute("SELECT result FROM tasks WHERE id = ? AND state = ?", (task_id, DONE)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+                return pickle.loads(row[0])
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def cancel(self, task_id: str) -> None:
+        self._connection().execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def _claim_once(self, worker_id: str, kinds: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """Claim a task if one is queued or its lease has lapsed."""
+        conn = self._connection()
+        now = time.time()
+        placeholders = ",".join("?" * len(kinds))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT id, payload, attempts FROM tasks WHERE kind IN ({placeholders}) "
+                f"AND (state = ? OR (state = ? AND lease_until < ?)) ORDER BY submitted_at LIMIT 1",
+                (*kinds, QUEUED, CLAIMED, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            task_id, payload, attempts = row
+            if attempts >= MAX_ATTEMPTS:
+                error = {"report": None, "intermediates": {}, "worker": None,
+                         "error": f"Task abandoned by {attempts} workers"}
+                conn.execute("UPDATE tasks SET state = ?, result = ?, finished_at = ? WHERE id = ?",
+                             (DONE, pickle.dumps(error), now, task_id))
+                conn.execute("COMMIT")
+                logger.error("Forensic task %s failed: abandoned by %d workers", task_id, attempts)
+                return None
+            conn.execute("UPDATE tasks SET state = ?, worker_id = ?, attempts = attempts + 1, lease_until = ? "
+                         "WHERE id = ?", (CLAIMED, worker_id, now + WORKER_TIMEOUT, task_id))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return pickle.loads(payload)
+
+    def claim(self, worker_id: str, kinds: Sequence[str], timeout: float) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            task = self._claim_once(worker_id, kinds)
+            if task is not None or time.monotonic() >= deadline:
+                return task
+            time.sleep(POLL_INTERVAL)
+
+    def complete(self, task_id: str, result: Dict[str, Any]) -> None:
+        # A task re-queued meanwhile keeps whichever result arrives first; a cancelled one is gone
+        self._connection().execute(
+            "UPDATE tasks SET state = ?, result = ?, finished_at = ? WHERE id = ? AND state != ?",
+            (DONE, pickle.dumps(result, pickle.HIGHEST_PROTOCOL), time.time(), task_id, DONE)
+        )
+
+    def heartbeat(self, worker_id: str, info: Dict[str, Any]) -> None:
+        now = time.time()
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO workers (worker_id, info, heartbeat_at) VALUES (?, ?, ?)",
+                     (worker_id, json.dumps(info), now))
+        conn.execute("UPDATE tasks SET lease_until = ? WHERE worker_id = ? AND state = ?",
+                     (now + WORKER_TIMEOUT, worker_id, CLAIMED))
+        # Workers gone for good
+        conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - 10 * WORKER_TIMEOUT,))
+
+    def workers(self) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            "SELECT worker_id, info, heartbeat_at FROM workers WHERE heartbeat_at >= ? ORDER BY worker_id",
+            (time.time() - WORKER_TIMEOUT,)
+        ).fetchall()
+        return [dict(json.loads(info), worker_id=worker_id, heartbeat_at=heartbeat_at)
+                for worker_id, info, heartbeat_at in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        counts = dict(self._connection().execute(
+            "SELECT state, COUNT(*) FROM tasks WHERE state != ? GROUP BY state", (DONE,)
+        ).fetchall())
+        oldest = self._connection().execute(
+            "SELECT MIN(submitted_at) FROM tasks WHERE state = ?", (QUEUED,)
+        ).fetchone()[0]
+        return {
+            "broker": self.name,
+            "queued": counts.get(QUEUED, 0),
+            "running": counts.get(CLAIMED, 0),
+            "oldest_queued_seconds": round(time.time() - oldest, 1) if oldest else None,
+            "workers": self.workers()
+        }
+
+
+def create_broker(spec: str) -> Broker:
+    """
+    Build the broker named by a KYC_FORENSIC_BROKER value.
+
+    Args:
+        spec: "memory", "file" or "package.module:factory"
+
+    Returns:
+        The broker
+    """
+    if spec == "memory":
+        return InProcessBroker()
+    if spec == "file":
+        return FileBroker()
+    module, _, factory = spec.partition(":")
+    if not factory:
+        raise ValueError(f"Unknown forensic broker '{spec}'; use memory, file or package.module:factory")
+    return getattr(importlib.import_module(module), factory)()
+
+
+_default_broker: Optional[Broker] = None
+_default_broker_lock = threading.Lock()
+
+
+def get_broker() -> Optional[Broker]:
+    """
+    Return the process-wide broker, or None when the checks run inside the verification.
+
+    An in-process broker gets its worker threads on first use.
+    """
+    global _default_broker
+    if not BROKER:
+        return None
+    with _default_broker_lock:
+        if _default_broker is None:
+            _default_broker = create_broker(BROKER)
+            if not _default_broker.remote:
+                from kyc_engine.forensic_worker import ForensicWorker
+                ForensicWorker(_default_broker, CONCURRENCY).start()
+        return _default_broker
+
+
+def is_dispatched(step: str) -> bool:
+    """Return whether a pipeline step is sent to a forensic worker rather than run in place."""
+    return bool(BROKER) and step in FORENSIC_TASKS
+
+
+def dispatch(kind: str, image_path: str, verification_id: Optional[str] = None,
+             intermediates: Optional[Dict[str, Any]] = None,
+             timeout: float = TASK_TIMEOUT) -> Dict[str, Any]:
+    """
+    Run a forensic check on a worker and wait for its report.
+
+    Without a broker, or with no live worker serving the check, it runs in the calling thread.
+
+    Args:
+        kind: Check name from FORENSIC_TASKS
+        image_path: Path to the ID card image
+        verification_id: Optional verification the check belongs to
+        intermediates: Optional dict that receives the check's visualization arrays
+        timeout: Maximum seconds to wait for the result
+
+    Returns:
+        The check's report
+
+    Raises:
+        ForensicTaskError: If the check failed on its worker or no result arrived in time
+    """
+    intermediates = intermediates if intermediates is not None else {}
+    broker = get_broker()
+    if broker is None or not any(kind in worker.get("kinds", ()) for worker in broker.workers()):
+        if broker is not None:
+            logger.warning("No live forensic worker serves %s on the %s broker; running it locally", kind, broker.name)
+        return FORENSIC_TASKS[kind](image_path, intermediates, verification_id)
+
+    task = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "verification_id": verification_id,
+        "request_id": request_id_var.get(),
+        "image_path": image_path,
+        "image": None,
+        "submitted_at": time.time()
+    }
+    if broker.remote:
+        with open(image_path, "rb") as file:
+            task["image"] = file.read()
+
+    broker.submit(task)
+    result = broker.result(task["id"], timeout)
+    if result is None:
+        broker.cancel(task["id"])
+        raise ForensicTaskError(f"No result for {kind} within {timeout:.0f} seconds")
+    if result["error"]:
+        raise ForensicTaskError(f"{kind} failed on worker {result['worker']}: {result['error']}")
+
+    logger.debug("%s ran on worker %s in %s ms", kind, result["worker"], result.get("duration_ms"))
+    for values in result["intermediates"].values():
+        artifact = values.pop("artifact", None)
+        if artifact is not None:
+            from kyc_engine.artifact_store import get_artifact_store
+            path = get_artifact_store().put(artifact["data"], artifact["kind"], verification_id, artifact["extension"])
+            result["report"]["output_path"] = path
+            if values.get("report") is not None:
+                values["report"]["output_path"] = path
+    intermediates.update(result["intermediates"])
+    return result["report"]
+
+
+def broker_status() -> Dict[str, Any]:
+    """
+    Report where the forensic checks run.
+
+    Returns:
+        Dictionary with the broker name, its queue depth and live workers
+        ({"broker": "inline"} when the checks run inside the verification)
+    """
+    broker = get_broker()
+    if broker is None:
+        return {"broker": "inline"}
+    return broker.stats()
@@ -0,0 +1,164 @@
+"""
+Forensic worker: runs the checks dispatched through a forensic broker.
+
+Each worker serves up to `concurrency` checks at once, one thread per slot, so
+a host's CPU is shared out by choosing how many workers it runs and how many
+slots each has. A heartbeat thread reports the worker's load to the broker,
+where the API's health endpoint reads it.
+
+Run one per forensic host (or several per host):
+
+    KYC_BROKER_DB=/shared/broker.db python -m kyc_engine.forensic_worker --concurrency 4
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional, Sequence
+
+from kyc_engine.forensic_broker import (
+    CONCURRENCY,
+    FORENSIC_TASKS,
+    HEARTBEAT_INTERVAL,
+    Broker,
+    create_broker,
+    execute_task
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds a slot waits for a task before checking whether the worker is stopping
+CLAIM_TIMEOUT = 1.0
+
+
+class ForensicWorker:
+    """Pool of threads claiming forensic tasks from a broker."""
+
+    def __init__(self, broker: Broker, concurrency: int = CONCURRENCY,
+                 kinds: Optional[Sequence[str]] = None, worker_id: Optional[str] = None):
+        self.broker = broker
+        self.concurrency = max(1, concurrency)
+        self.kinds = tuple(kinds or FORENSIC_TASKS.keys())
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.started_at = time.time()
+        self._active = 0
+        self._processed = 0
+        self._failed = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Report the worker's identity and load.
+
+        Returns:
+            Dictionary with host, pid, kinds served, slots, busy slots and task counts
+        """
+        with self._lock:
+            return {
+                "host": socket.gethostname(),
+                "pid": os.getpid(),
+                "kinds": list(self.kinds),
+                "concurrency": self.concurrency,
+                "active": self._active,
+                "processed": self._processed,
+                "failed": self._failed,
+                "started_at": self.started_at
+            }
+
+    def _serve(self) -> None:
+        """Claim and run tasks until the worker is stopped (one slot)."""
+        while not self._stopping.is_set():
+            try:
+                task = self.broker.claim(self.worker_id, self.kinds, CLAIM_TIMEOUT)
+            except Exception as e:
+                logger.error("Worker %s could not claim a task: %s", self.worker_id, e)
+                self._stopping.wait(CLAIM_TIMEOUT)
+                continue
+            if task is None:
+                continue
+
+            with self._lock:
+                self._active += 1
+            result = execute_task(task, self.worker_id)
+            with self._lock:
+                self._active -= 1
+                self._processed += 1
+                self._failed += result["error"] is not None
+            try:
+                self.broker.complete(task["id"], result)
+            except Exception as e:
+                logger.error("Worker %s could not store the result of task %s: %s", self.worker_id, task["id"], e)
+
+    def _beat(self) -> None:
+        """Send heartbeats until the worker is stopped."""
+        while not self._stopping.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.broker.heartbeat(self.worker_id, self.info())
+            except Exception as e:
+                logger.warning("Worker %s heartbeat failed: %s", self.worker_id, e)
+
+    def start(self) -> "ForensicWorker":
+        """Start the slot threads and the heartbeat thread."""
+        # Announced before the first task can be dispatched, so it is not run locally instead
+        self.broker.heartbeat(self.worker_id, self.info())
+        self._threads = [
+            threading.Thread(target=self._serve, name=f"kyc-forensic-{slot}", daemon=True)
+            for slot in range(self.concurrency)
+        ]
+        self._threads.append(threading.Thread(target=self._beat, name="kyc-forensic-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        logger.info("Forensic worker %s serving %s with %d slots on the %s broker",
+                    self.worker_id, ",".join(self.kinds), self.concurrency, self.broker.name)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop claiming tasks and wait for the running ones to finish."""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        logger.info("Forensic worker %s stopped after %d tasks", self.worker_id, self._processed)
+
+    def run(self) -> None:
+        """Serve until SIGINT or SIGTERM, then finish the running tasks."""
+        signal.signal(signal.SIGTERM, lambda *_: self._stopping.set())
+        signal.signal(signal.SIGINT, lambda *_: self._stopping.set())
+        self.start()
+        while not self._stopping.wait(1.0):
+            pass
+        self.stop()
+
+
+if __name__ == "__main__":
+    from kyc_engine.log_config import configure_logging
+    from kyc_engine.warmup import warm_up
+
+    parser = argparse.ArgumentParser(description="Run forensic checks dispatched by the KYC service")
+    parser.add_argument("--broker", default=os.getenv("KYC_FORENSIC_BROKER") or "file",
+                        help="Broker to serve: file or package.module:factory (default: KYC_FORENSIC_BROKER or file)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help="Checks run at once (default: KYC_FORENSIC_CONCURRENCY or one per core)")
+    parser.add_argument("--kinds", help=f"Comma-separated checks to serve (default: {','.join(FORENSIC_TASKS)})")
+    parser.add_argument("--status", action="store_true", help="Print the broker's queue and live workers and exit")
+    args = parser.parse_args()
+
+    if args.broker == "memory":
+        parser.error("the memory broker is served by the application itself")
+    configure_logging()
+    broker = create_broker(args.broker)
+    if args.status:
+        print(json.dumps(broker.stats(), indent=4))
+    else:
+        kinds = [kind.strip() for kind in args.kinds.split(",")] if args.kinds else None
+        unknown = set(kinds or ()) - set(FORENSIC_TASKS)
+        if unknown:
+            parser.error(f"unknown checks: {', '.join(sorted(unknown))}")
+        warm_up(["ela", "forensics"])
+        ForensicWorker(broker, args.concurrency, kinds).run()
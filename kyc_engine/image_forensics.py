@@ -1,14 +1,109 @@
 """
 Pixel-level forensic analysis module for detecting image manipulation.
 """
-import os
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 from skimage.util import random_noise
 from skimage.metrics import structural_similarity as ssim
 
-from kyc_engine.shared import get_output_path
+from kyc_engine.image_loading import image_size, load_image, reduction_for
+from kyc_engine.artifact_store import get_artifact_store
+from kyc_engine.thresholds import DEFAULT_THRESHOLDS, get_thresholds
+from kyc_engine.visualization import build_forensics_composite, encode_png
+
+CLONE_BLOCK_SIZE = 50
+
+# Blocks flatter than this standard deviation match anywhere, and blocks whose
+# gradients mostly point one way (a straight edge or rule) match themselves
+# further along the line, so both are left out of the per-block clone map
+CLONE_MIN_BLOCK_STD = 4.0
+CLONE_MAX_BLOCK_COHERENCE = 0.8
+
+# Default thresholds for full-resolution scores; runtime values come from thresholds.get_thresholds()
+BASE_THRESHOLDS = DEFAULT_THRESHOLDS["forensics"]["thresholds"]
+
+# Ratio of reduced-scale to full-resolution scores, measured with
+# `python -m kyc_engine.image_loading <images>`
+SCALE_FACTORS = {
+    "edge": {1: 1.0, 2: 1.34, 4: 1.94, 8: 2.24},
+    "noise": {1: 1.0, 2: 1.0, 4: 1.0, 8: 1.0}
+}
+
+
+def _edge_map(gray):
+    """Compute the Sobel gradient magnitude of a grayscale image."""
+    sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
+    sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
+    return np.hypot(sobelx, sobely)
+
+
+def _noise_map(gray):
+    """Compute the difference between a grayscale image and a noisy copy of it."""
+    noise_estimate = random_noise(gray, mode='gaussian')
+    return cv2.absdiff(gray, (noise_estimate * 255).astype(np.uint8))
+
+
+def _gradient_coherence(block):
+    """Measure how strongly a block's gradients share one orientation (0 isotropic, 1 a single edge)."""
+    gx = cv2.Sobel(block, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(block, cv2.CV_32F, 0, 1, ksize=3)
+    jxx, jyy, jxy = float(np.sum(gx * gx)), float(np.sum(gy * gy)), float(np.sum(gx * gy))
+    total = jxx + jyy
+    return float(np.sqrt((jxx - jyy) ** 2 + 4 * jxy ** 2) / total) if total else 1.0
+
+
+def _clone_search(gray, block_size=CLONE_BLOCK_SIZE):
+    """
+    Search for the block that best matches another region of the image.
+
+    Args:
+        gray: Grayscale image array
+        block_size: Size of the square blocks to match
+
+    Returns:
+        Tuple of (best match score, (x, y) of the best matching block or None,
+        per-block best match scores outside the block's neighbourhood with flat
+        and single-edge blocks set to 0)
+    """
+    h, w = gray.shape
+    best_score = None
+    best_location = None
+    block_scores = np.zeros((max(0, h // block_size), max(0, w // block_size)), dtype=np.float32)
+
+    for y in range(0, h - block_size + 1, block_size):
+        for x in range(0, w - block_size + 1, block_size):
+            block = gray[y:y + block_size, x:x + block_size]
+            res = cv2.matchTemplate(gray, block, cv2.TM_CCOEFF_NORMED)
+            if y < res.shape[0] and x < res.shape[1]:
+                res[y, x] = 0  # Avoid self-match
+            score = float(np.max(res))
+            if block.std() >= CLONE_MIN_BLOCK_STD and _gradient_coherence(block) <= CLONE_MAX_BLOCK_COHERENCE:
+                # Shifting smooth content by a few pixels matches almost perfectly,
+                # so the map ignores the block's own neighbourhood
+                half = block_size // 2
+                res[max(0, y - half):y + half + 1, max(0, x - half):x + half + 1] = 0
+                block_scores[y // block_size, x // block_size] = float(np.max(res))
+            if best_score is None or score > best_score:
+                best_score = score
+                best_location = (x, y)
+
+    return (best_score if best_score is not None else 0.0), best_location, block_scores
+
+
+def _artifact_analysis(gray):
+    """
+    Recompress a grayscale image and measure the structural difference.
+
+    Args:
+        gray: Grayscale image array
+
+    Returns:
+        Tuple of (artifact score, absolute difference map)
+    """
+    _, compressed = cv2.imencode('.jpg', gray, [cv2.IMWRITE_JPEG_QUALITY, 50])
+    decompressed = cv2.imdecode(compressed, cv2.IMREAD_GRAYSCALE)
+    score, _ = ssim(gray, decompressed, full=True)
+    return float(1 - score), cv2.absdiff(gray, decompressed)
 
 
 def analyze_edges(image):
@@ -22,10 +117,7 @@ def analyze_edges(image):
         Edge strength score
     """
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-    sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-    edges = np.hypot(sobelx, sobely)
-    return float(np.mean(edges))
+    return float(np.mean(_edge_map(gray)))
 
 
 def analyze_noise(image):
@@ -39,9 +131,7 @@ def analyze_noise(image):
         Noise level score
     """
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    noise_estimate = random_noise(gray, mode='gaussian')
-    noise_difference = cv2.absdiff(gray, (noise_estimate * 255).astype(np.uint8))
-    return float(np.mean(noise_difference))
+    return float(np.mean(_noise_map(gray)))
 
 
 def detect_cloning(image):
@@ -55,19 +145,8 @@ def detect_cloning(image):
         Cloning detection score
     """
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    h, w = gray.shape
-    block_size = 50
-    clone_scores = []
-
-    for y in range(0, h - block_size + 1, block_size):
-        for x in range(0, w - block_size + 1, block_size):
-            block = gray[y:y + block_size, x:x + block_size]
-            res = cv2.matchTemplate(gray, block, cv2.TM_CCOEFF_NORMED)
-            if y < res.shape[0] and x < res.shape[1]:
-                res[y, x] = 0  # Avoid self-match
-            clone_scores.append(np.max(res))
-
-    return float(max(clone_scores)) if clone_scores else 0.0
+    clone_score, _, _ = _clone_search(gray)
+    return clone_score
 
 
 def jpeg_artifact_analysis(image):
@@ -81,48 +160,54 @@ def jpeg_artifact_analysis(image):
         Artifact score
     """
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    _, compressed = cv2.imencode('.jpg', gray, [cv2.IMWRITE_JPEG_QUALITY, 50])
-    decompressed = cv2.imdecode(compressed, cv2.IMREAD_GRAYSCALE)
-    score, _ = ssim(gray, decompressed, full=True)
-    return float(1 - score)
+    artifact_score, _ = _artifact_analysis(gray)
+    return artifact_score
 
 
-def pixel_level_check(image_path):
+def pixel_level_check(image_path, intermediates=None):
     """
     Perform comprehensive pixel-level forensic analysis.
     
     Args:
         image_path: Path to the input image
+        intermediates: Optional dict that receives the maps used for visualization
         
     Returns:
         Dictionary with analysis results
     """
-    image = cv2.imread(image_path)
-    if image is None:
+    # Clone and artifact analysis need every pixel; edge and noise statistics are
+    # computed on a DCT-domain reduced decode (see image_loading.RESOLUTION_POLICY)
+    gray = load_image(image_path, grayscale=True)
+    if gray is None:
         return {"status": "error", "message": "Image not found"}
 
-    edge_strength = analyze_edges(image)
-    noise_level = analyze_noise(image)
-    clone_score = detect_cloning(image)
-    artifact_score = jpeg_artifact_analysis(image)
+    size = image_size(image_path)
+    reduction = reduction_for("edges", image_path, size)
+    small_gray = load_image(image_path, reduction, grayscale=True) if reduction > 1 else gray
 
-    thresholds = {
-        "clone": 0.90,
-        "noise": 25.0,
-        "edge": 35.0,
-        "artifact": 0.10
-    }
+    edges = _edge_map(small_gray)
+    noise_diff = _noise_map(small_gray)
+    clone_score, clone_location, clone_map = _clone_search(gray)
+    artifact_score, artifact_diff = _artifact_analysis(gray)
 
-    weights = {"clone": 0.4, "noise": 0.3, "edge": 0.2, "artifact": 0.1}
+    edge_strength = float(np.mean(edges))
+    noise_level = float(np.mean(noise_diff))
+
+    config = get_thresholds()["forensics"]
+    thresholds = dict(config["thresholds"])
+    thresholds["edge"] *= SCALE_FACTORS["edge"].get(reduction, 1.0)
+    thresholds["noise"] *= SCALE_FACTORS["noise"].get(reduction, 1.0)
+
+    metrics = {"clone": clone_score, "noise": noise_level, "edge": edge_strength, "artifact": artifact_score}
     score = sum(
-        max(0, (metric - thresholds[key]) * weights[key])
-        for key, metric in zip(weights.keys(), [clone_score, noise_level, edge_strength, artifact_score])
+        max(0, (metrics[key] - thresholds[key]) * weight)
+        for key, weight in config["weights"].items()
     )
 
-    if score >= 1.0:
+    if score >= config["fail_score"]:
         status = "fail"
         message = "Image failed the pixel level check due to high manipulation metrics."
-    elif score >= 0.5:
+    elif score >= config["flag_score"]:
         status = "flag for review"
         message = "Image flagged for further review; please check for possible manipulations."
     else:
@@ -136,10 +221,30 @@ def pixel_level_check(image_path):
             "edge_strength": round(edge_strength, 2),
             "noise_level": round(noise_level, 2),
             "cloning_score": round(clone_score, 2),
-            "artifact_score": round(artifact_score, 2)
+            "artifact_score": round(artifact_score, 2),
+            "edge_noise_scale": f"1/{reduction}"
         },
+        # Unrounded, for the stored feature vectors re-scored offline (see rescoring.py)
+        "metrics": {key: float(value) for key, value in metrics.items()},
         "message": message
     }
+
+    if intermediates is not None:
+        # The preview only needs a reduced color decode; clone coordinates follow its scale
+        preview_reduction = reduction_for("preview", image_path, size)
+        preview = load_image(image_path, preview_reduction)
+        if clone_location is not None:
+            clone_location = (clone_location[0] // preview_reduction, clone_location[1] // preview_reduction)
+        intermediates["forensics"] = {
+            "image": cv2.cvtColor(preview, cv2.COLOR_BGR2RGB),
+            "edges": cv2.normalize(edges, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8),
+            "noise": noise_diff,
+            "artifact": cv2.normalize(artifact_diff, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8),
+            "clone_location": clone_location,
+            "clone_block_size": CLONE_BLOCK_SIZE / preview_reduction,
+            "clone_map": clone_map,
+            "report": result
+        }
     return result
 
 
@@ -157,110 +262,23 @@ def generate_composite_image(image_path, output_path=None):
     
     Args:
         image_path: Path to the input image
-        output_path: Optional path to save the composite image
+        output_path: Optional path to save the composite image (default: the artifact store)
         
     Returns:
         Path to the saved composite image
     """
+    # Run the analysis once, keeping the maps needed for the composite
+    intermediates = {}
+    analysis = pixel_level_check(image_path, intermediates=intermediates)
+    if "forensics" not in intermediates:
+        raise ValueError(analysis.get("message", "Image not found"))
+
+    # Tile the maps and save the composite image
+    png = encode_png(build_forensics_composite(intermediates["forensics"]))
     if output_path is None:
-        output_path = get_output_path("forensics_composite.png", "analysis")
-        
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError("Image not found")
-
-    # Convert for Matplotlib (BGR to RGB)
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-    # --- Edge Visualization ---
-    sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-    sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-    edges = np.hypot(sobelx, sobely)
-    edges_norm = cv2.normalize(edges, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-
-    # --- Noise Visualization ---
-    noise_estimate = random_noise(gray, mode='gaussian')
-    noise_diff = cv2.absdiff(gray, (noise_estimate * 255).astype(np.uint8))
-
-    # --- Cloning Visualization ---
-    h, w = gray.shape
-    block_size = 50
-    best_score = 0
-    best_location = None
-    for y in range(0, h - block_size + 1, block_size):
-        for x in range(0, w - block_size + 1, block_size):
-            block = gray[y:y + block_size, x:x + block_size]
-            res = cv2.matchTemplate(gray, block, cv2.TM_CCOEFF_NORMED)
-            if y < res.shape[0] and x < res.shape[1]:
-                res[y, x] = -1  # Avoid self-match
-            minVal, maxVal, minLoc, maxLoc = cv2.minMaxLoc(res)
-            if maxVal > best_score:
-                best_score = maxVal
-                best_location = (x, y)
-    clone_vis = image_rgb.copy()
-    if best_location is not None:
-        cv2.rectangle(clone_vis, best_location,
-                      (best_location[0] + block_size, best_location[1] + block_size),
-                      (255, 0, 0), 2)
-
-    # --- JPEG Artifact Visualization ---
-    _, compressed = cv2.imencode('.jpg', gray, [cv2.IMWRITE_JPEG_QUALITY, 50])
-    decompressed = cv2.imdecode(compressed, cv2.IMREAD_GRAYSCALE)
-    artifact_diff = cv2.absdiff(gray, decompressed)
-    artifact_norm = cv2.normalize(artifact_diff, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-
-    # --- Get Summary Analysis ---
-    analysis = pixel_level_check(image_path)
-
-    # --- Create Composite Plot ---
-    fig, axs = plt.subplots(2, 3, figsize=(15, 10))
-
-    # Original image
-    axs[0, 0].imshow(image_rgb)
-    axs[0, 0].set_title("Original Image")
-    axs[0, 0].axis("off")
-
-    # Edge detection
-    axs[0, 1].imshow(edges_norm, cmap="gray")
-    axs[0, 1].set_title("Edge Detection")
-    axs[0, 1].axis("off")
-
-    # Noise difference
-    axs[0, 2].imshow(noise_diff, cmap="gray")
-    axs[0, 2].set_title("Noise Difference")
-    axs[0, 2].axis("off")
-
-    # Cloning detection
-    axs[1, 0].imshow(clone_vis)
-    axs[1, 0].set_title("Cloning Detection")
-    axs[1, 0].axis("off")
-
-    # JPEG artifact difference
-    axs[1, 1].imshow(artifact_norm, cmap="gray")
-    axs[1, 1].set_title("JPEG Artifact Difference")
-    axs[1, 1].axis("off")
-
-    # Summary tile
-    axs[1, 2].axis("off")
-    summary_text = (
-        f"Status: {analysis['status']}\n"
-        f"Score: {analysis['score']}\n"
-        f"Edge: {analysis['details']['edge_strength']}\n"
-        f"Noise: {analysis['details']['noise_level']}\n"
-        f"Clone: {analysis['details']['cloning_score']}\n"
-        f"Artifact: {analysis['details']['artifact_score']}\n"
-        f"Msg: {analysis['message']}"
-    )
-    axs[1, 2].text(0.05, 0.5, summary_text, fontsize=12, verticalalignment='center',
-                   transform=axs[1, 2].transAxes)
-    axs[1, 2].set_title("Summary")
-
-    plt.tight_layout()
-
-    # Save the composite image
-    plt.savefig(output_path)
-    plt.close(fig)
+        return get_artifact_store().put(png, "forensics_composite", extension="png")
+    with open(output_path, "wb") as file:
+        file.write(png)
 
     return output_path
 
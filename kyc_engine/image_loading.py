@@ -0,0 +1,225 @@
+"""
+Resolution policy and reduced-resolution image loading.
+
+Checks whose scores do not depend on every pixel of a 12+ megapixel upload get
+a smaller image. JPEGs are decoded at 1/2, 1/4 or 1/8 scale directly in the DCT
+domain (libjpeg scaled decoding), so those checks never pay for a full decode,
+while ELA and the DCT-level checks keep full resolution.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Scale denominators supported by libjpeg's DCT-domain decoding
+REDUCTIONS = (1, 2, 4, 8)
+
+# Minimum long side in pixels each check needs; None keeps full resolution
+RESOLUTION_POLICY: Dict[str, Optional[int]] = {
+    "edges": 1024,
+    "noise": 1024,
+    "ocr": 1600,
+    "preview": 640,
+    "quality": 640,
+    "clone": None,
+    "artifact": None,
+    "ela": None,
+}
+
+
+def _load_policy() -> None:
+    """Apply KYC_RESOLUTION_POLICY overrides, e.g. "edges=800,ocr=0" (0 keeps full resolution)."""
+    for item in filter(None, os.getenv("KYC_RESOLUTION_POLICY", "").split(",")):
+        check, _, value = item.partition("=")
+        try:
+            RESOLUTION_POLICY[check.strip()] = int(value) or None
+        except ValueError:
+            logger.warning("Ignoring invalid resolution policy entry: %s", item)
+
+
+_load_policy()
+
+
+def image_size(image_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Read an image's dimensions from its header without decoding it.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        Tuple of (width, height), or None if the file is not a readable image
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(image_path) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def choose_reduction(size: Optional[Tuple[int, int]], min_side: Optional[int]) -> int:
+    """
+    Pick the largest scale denominator that keeps the long side at or above min_side.
+
+    Args:
+        size: Image size as (width, height)
+        min_side: Minimum long side the check needs, or None for full resolution
+
+    Returns:
+        One of REDUCTIONS
+    """
+    if not size or not min_side:
+        return 1
+    long_side = max(size)
+    return max(r for r in REDUCTIONS if r == 1 or long_side // r >= min_side)
+
+
+def reduction_for(check: str, image_path: str, size: Optional[Tuple[int, int]] = None) -> int:
+    """
+    Look up the scale denominator a check should use for an image.
+
+    Args:
+        check: Name of the check in RESOLUTION_POLICY
+        image_path: Path to the image file
+        size: Image size if already known
+
+    Returns:
+        One of REDUCTIONS
+    """
+    min_side = RESOLUTION_POLICY.get(check)
+    if not min_side:
+        return 1
+    return choose_reduction(size or image_size(image_path), min_side)
+
+
+def load_image(image_path: str, reduction: int = 1, grayscale: bool = False):
+    """
+    Decode an image with OpenCV at full or reduced resolution.
+
+    JPEGs are scaled during decoding; other formats are decoded and then resized.
+    The EXIF orientation is ignored, so every check (ELA included, which reads
+    the file with PIL) sees the pixels in the order they are stored and its
+    maps line up with the others and with the JPEG block grid.
+
+    Args:
+        image_path: Path to the image file
+        reduction: Scale denominator from REDUCTIONS
+        grayscale: Decode to a single grayscale channel instead of BGR
+
+    Returns:
+        Image array, or None if the image could not be read
+    """
+    import cv2
+
+    flags = {
+        (1, False): cv2.IMREAD_COLOR,
+        (2, False): cv2.IMREAD_REDUCED_COLOR_2,
+        (4, False): cv2.IMREAD_REDUCED_COLOR_4,
+        (8, False): cv2.IMREAD_REDUCED_COLOR_8,
+        (1, True): cv2.IMREAD_GRAYSCALE,
+        (2, True): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        (4, True): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        (8, True): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    }
+    return cv2.imread(image_path, flags[(reduction, grayscale)] | cv2.IMREAD_IGNORE_ORIENTATION)
+
+
+def encode_for_upload(image_path: str, min_side: Optional[int]) -> Tuple[bytes, int]:
+    """
+    Prepare image bytes for a model request at the resolution the check needs.
+
+    Images already small enough are sent unchanged; larger JPEGs are draft-decoded
+    at reduced scale and re-encoded.
+
+    Args:
+        image_path: Path to the image file
+        min_side: Minimum long side the model needs, or None for the original file
+
+    Returns:
+        Tuple of (image bytes, scale denominator used)
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        reduction = choose_reduction(image.size, min_side)
+        if reduction > 1:
+            width, height = image.size
+            if image.format == "JPEG":
+                image.draft("RGB", (width // reduction, height // reduction))
+            else:
+                image = image.reduce(reduction)
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, "JPEG", quality=95)
+            return buffer.getvalue(), reduction
+
+    with open(image_path, "rb") as file:
+        return file.read(), 1
+
+
+def calibrate(image_paths: Iterable[str], reductions: Iterable[int] = REDUCTIONS) -> Dict[str, Any]:
+    """
+    Measure how the size-insensitive forensic scores shift with decode scale.
+
+    For every image the edge strength and noise level are computed at each
+    reduction and divided by the full-resolution value. The mean ratios are the
+    factors to apply to the pixel_level_check thresholds at that scale.
+
+    Args:
+        image_paths: Paths of representative ID images
+        reductions: Scale denominators to measure
+
+    Returns:
+        Dictionary with per-image scores, mean ratios and suggested thresholds
+    """
+    import numpy as np
+    from kyc_engine.image_forensics import _edge_map, _noise_map, BASE_THRESHOLDS
+
+    reductions = sorted(set(reductions) | {1})
+    per_image: Dict[str, Dict[int, Dict[str, float]]] = {}
+    ratios: Dict[str, Dict[int, List[float]]] = {"edge": {}, "noise": {}}
+
+    for path in image_paths:
+        scores = {}
+        for reduction in reductions:
+            gray = load_image(path, reduction, grayscale=True)
+            if gray is None:
+                break
+            scores[reduction] = {
+                "edge": float(np.mean(_edge_map(gray))),
+                "noise": float(np.mean(_noise_map(gray)))
+            }
+        if 1 not in scores:
+            logger.warning("Skipping unreadable image: %s", path)
+            continue
+        per_image[path] = scores
+        for reduction, values in scores.items():
+            for metric in ratios:
+                if scores[1][metric]:
+                    ratios[metric].setdefault(reduction, []).append(values[metric] / scores[1][metric])
+
+    mean_ratios = {
+        metric: {reduction: round(float(np.mean(values)), 3) for reduction, values in by_reduction.items()}
+        for metric, by_reduction in ratios.items()
+    }
+    return {
+        "images": per_image,
+        "ratios": mean_ratios,
+        "suggested_thresholds": {
+            metric: {reduction: round(BASE_THRESHOLDS[metric] * ratio, 2) for reduction, ratio in by_reduction.items()}
+            for metric, by_reduction in mean_ratios.items()
+        }
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate forensic thresholds for reduced-resolution decoding")
+    parser.add_argument("images", nargs="+", help="Representative ID images")
+    args = parser.parse_args()
+
+    print(json.dumps(calibrate(args.images), indent=4))
@@ -0,0 +1,684 @@
+"""
+JPEG structure analysis module.
+
+Detects recompression directly from the JPEG bitstream instead of decoding and
+re-encoding the whole image: the quantization tables are compared against the
+IJG (libjpeg) tables and known editor markers, and a sample of the Huffman-coded
+DCT coefficients is decoded to look for double-quantization artifacts in the
+coefficient histograms and for traces of an earlier compression on a shifted 8x8 grid.
+"""
+import os
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+# Luminance blocks kept for the coefficient and grid analysis, spread over the whole image
+MAX_SAMPLED_BLOCKS = int(os.getenv("KYC_JPEG_SAMPLE_BLOCKS", "6000"))
+
+# Zigzag positions of the AC coefficients whose histograms are analysed
+HISTOGRAM_POSITIONS = range(1, 10)
+
+# Highest absolute coefficient value included in the histograms
+MAX_HISTOGRAM_BIN = 20
+
+# Minimum neighbouring bin count for a histogram bin to be considered
+MIN_BIN_COUNT = 20
+
+# Fraction of irregular histogram bins above which double compression is reported
+DOUBLE_COMPRESSION_THRESHOLD = 0.25
+
+# Excess periodicity of the strongest shifted grid over the median, relative to the runner-up's,
+# above which misalignment is reported
+GRID_MISALIGNMENT_THRESHOLD = 2.5
+
+# Low-frequency coefficients (row, column) whose periodicity is measured on shifted grids
+GRID_COEFFICIENTS = ((0, 1), (1, 0), (1, 1), (0, 2), (2, 0))
+
+# Smallest absolute coefficient value, on a shifted grid, included in the periodicity measure
+GRID_MIN_COEFFICIENT = 2.0
+
+# Largest quantization step of an earlier compression looked for on shifted grids
+GRID_MAX_STEP = 30
+
+# Markers of image editors found in APP segments (XMP, Exif, Photoshop IRB)
+EDITOR_SIGNATURES = (
+    b"Photoshop", b"GIMP", b"Lightroom", b"Snapseed", b"Pixelmator",
+    b"Affinity", b"paint.net", b"Picsart", b"Canva"
+)
+
+# Zigzag position -> natural (row-major) index
+ZIGZAG = (
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63
+)
+
+# Annex K example tables (natural order) used by libjpeg and derived encoders
+STANDARD_LUMINANCE_TABLE = (
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99
+)
+
+STANDARD_CHROMINANCE_TABLE = (
+    17, 18, 24, 47, 99, 99, 99, 99,
+    18, 21, 26, 66, 99, 99, 99, 99,
+    24, 26, 56, 99, 99, 99, 99, 99,
+    47, 66, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99
+)
+
+APP_SIGNATURES = (
+    (0xE0, b"JFIF\x00", "JFIF"),
+    (0xE1, b"Exif\x00", "Exif"),
+    (0xE1, b"http://ns.adobe.com/xap/1.0/", "XMP"),
+    (0xE2, b"ICC_PROFILE\x00", "ICC"),
+    (0xED, b"Photoshop 3.0\x00", "Photoshop IRB"),
+    (0xEE, b"Adobe", "Adobe"),
+)
+
+SOF_TYPES = {
+    0xC0: "baseline", 0xC1: "extended sequential", 0xC2: "progressive", 0xC3: "lossless",
+    0xC9: "arithmetic sequential", 0xCA: "arithmetic progressive"
+}
+
+
+def ijg_table(base: Tuple[int, ...], quality: int) -> Tuple[int, ...]:
+    """
+    Scale a base quantization table the way libjpeg does for a quality setting.
+
+    Args:
+        base: Base table in natural order
+        quality: Quality between 1 and 100
+
+    Returns:
+        Scaled table in natural order
+    """
+    scale = 5000 // quality if quality < 50 else 200 - 2 * quality
+    return tuple(min(max((value * scale + 50) // 100, 1), 255) for value in base)
+
+
+def estimate_quality(table: Tuple[int, ...], base: Tuple[int, ...]) -> Tuple[int, bool]:
+    """
+    Find the IJG quality whose scaled table is closest to a quantization table.
+
+    Args:
+        table: Quantization table in natural order
+        base: Base table the encoder would have scaled
+
+    Returns:
+        Tuple of (estimated quality, whether the table matches the IJG table exactly)
+    """
+    best_quality, best_error = 0, None
+    for quality in range(1, 101):
+        error = sum(abs(a - b) for a, b in zip(table, ijg_table(base, quality)))
+        if error == 0:
+            return quality, True
+        if best_error is None or error < best_error:
+            best_quality, best_error = quality, error
+    return best_quality, False
+
+
+def parse_jpeg(data: bytes) -> Dict[str, Any]:
+    """
+    Parse the marker segments of a JPEG file up to its first scan.
+
+    Args:
+        data: Contents of the JPEG file
+
+    Returns:
+        Dictionary with quantization and Huffman tables, frame and scan headers,
+        restart interval, APP signatures and the offset of the entropy-coded data
+
+    Raises:
+        ValueError: If the data is not a JPEG file
+    """
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("Not a JPEG file")
+
+    info = {
+        "quant_tables": {}, "huffman_tables": {}, "frame": None, "scan": None,
+        "restart_interval": 0, "app_signatures": [], "editor_hints": [], "scan_offset": None
+    }
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError(f"Invalid marker at offset {pos}")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        segment = data[pos + 4:pos + 2 + length]
+        pos += 2 + length
+
+        if 0xE0 <= marker <= 0xEF:
+            for app_marker, prefix, name in APP_SIGNATURES:
+                if marker == app_marker and segment.startswith(prefix):
+                    info["app_signatures"].append(name)
+            for hint in EDITOR_SIGNATURES:
+                if hint in segment and hint.decode() not in info["editor_hints"]:
+                    info["editor_hints"].append(hint.decode())
+        elif marker == 0xDB:
+            _parse_dqt(segment, info["quant_tables"])
+        elif marker == 0xC4:
+            _parse_dht(segment, info["huffman_tables"])
+        elif marker == 0xDD:
+            info["restart_interval"] = int.from_bytes(segment[:2], "big")
+        elif marker in SOF_TYPES:
+            info["frame"] = _parse_sof(marker, segment)
+        elif marker == 0xDA:
+            info["scan"] = _parse_sos(segment)
+            info["scan_offset"] = pos
+            break
+        elif marker == 0xD9:
+            break
+    return info
+
+
+def _parse_dqt(segment: bytes, tables: Dict[int, Tuple[int, ...]]) -> None:
+    """Parse a DQT segment into natural-order tables keyed by table id."""
+    pos = 0
+    while pos < len(segment):
+        precision, table_id = segment[pos] >> 4, segment[pos] & 0x0F
+        pos += 1
+        size = 2 if precision else 1
+        zigzag = [int.from_bytes(segment[pos + i * size:pos + (i + 1) * size], "big") for i in range(64)]
+        pos += 64 * size
+        natural = [0] * 64
+        for k, value in enumerate(zigzag):
+            natural[ZIGZAG[k]] = value
+        tables[table_id] = tuple(natural)
+
+
+def _parse_dht(segment: bytes, tables: Dict[Tuple[int, int], Tuple[List[int], bytes]]) -> None:
+    """Parse a DHT segment into (counts, symbols) keyed by (class, table id)."""
+    pos = 0
+    while pos < len(segment):
+        table_class, table_id = segment[pos] >> 4, segment[pos] & 0x0F
+        counts = list(segment[pos + 1:pos + 17])
+        total = sum(counts)
+        tables[(table_class, table_id)] = (counts, segment[pos + 17:pos + 17 + total])
+        pos += 17 + total
+
+
+def _parse_sof(marker: int, segment: bytes) -> Dict[str, Any]:
+    """Parse a start-of-frame segment."""
+    components = []
+    for i in range(segment[5]):
+        component_id, sampling, quant_id = segment[6 + i * 3:9 + i * 3]
+        components.append({"id": component_id, "h": sampling >> 4, "v": sampling & 0x0F, "tq": quant_id})
+    return {
+        "type": SOF_TYPES[marker],
+        "precision": segment[0],
+        "height": int.from_bytes(segment[1:3], "big"),
+        "width": int.from_bytes(segment[3:5], "big"),
+        "components": components
+    }
+
+
+def _parse_sos(segment: bytes) -> Dict[str, Any]:
+    """Parse a start-of-scan segment."""
+    count = segment[0]
+    components = [
+        {"id": segment[1 + i * 2], "td": segment[2 + i * 2] >> 4, "ta": segment[2 + i * 2] & 0x0F}
+        for i in range(count)
+    ]
+    return {"components": components}
+
+
+def _build_lookup(counts: List[int], symbols: bytes) -> List[int]:
+    """
+    Build a 16-bit prefix lookup table for a Huffman table.
+
+    Each entry is (code length << 8) | symbol, or 0 for an invalid prefix.
+    """
+    lookup = [0] * 65536
+    code = 0
+    index = 0
+    for length in range(1, 17):
+        span = 1 << (16 - length)
+        for _ in range(counts[length - 1]):
+            start = code << (16 - length)
+            lookup[start:start + span] = [(length << 8) | symbols[index]] * span
+            code += 1
+            index += 1
+        code <<= 1
+    return lookup
+
+
+def _entropy_segments(data: bytes, start: int) -> List[bytes]:
+    """Split the first scan's entropy-coded data at restart markers and remove byte stuffing."""
+    segments = []
+    segment_start = pos = start
+    while True:
+        pos = data.find(b"\xff", pos)
+        if pos == -1 or pos + 1 >= len(data):
+            segments.append(data[segment_start:])
+            break
+        marker = data[pos + 1]
+        if marker == 0x00 or marker == 0xFF:
+            pos += 1 if marker == 0xFF else 2
+            continue
+        segments.append(data[segment_start:pos])
+        if 0xD0 <= marker <= 0xD7:
+            segment_start = pos = pos + 2
+            continue
+        break
+    return [segment.replace(b"\xff\x00", b"\xff") for segment in segments]
+
+
+def _decode_mcus(data: bytes, mcus: int, components: List[Tuple[int, List[int], List[int], bool]],
+                 keep_mcu: Optional[Callable[[int], bool]] = None) -> List[List[int]]:
+    """
+    Huffman-decode MCUs from one entropy-coded segment.
+
+    Args:
+        data: Unstuffed entropy-coded data starting at an MCU boundary
+        mcus: Number of MCUs to decode
+        components: Per scan component (blocks per MCU, DC lookup, AC lookup, keep blocks)
+        keep_mcu: Optional predicate on the MCU's index in the segment; blocks of
+            other MCUs are decoded (the bitstream is sequential) but not kept
+
+    Returns:
+        Zigzag-ordered quantized coefficients of the kept blocks
+    """
+    bits = data + b"\x00\x00\x00\x00"
+    limit = len(data) * 8
+    pos = 0
+    predictions = [0] * len(components)
+    blocks = []
+
+    for mcu in range(mcus):
+        keep_this = keep_mcu is None or keep_mcu(mcu)
+        for index, (count, dc_lookup, ac_lookup, keep_component) in enumerate(components):
+            keep = keep_component and keep_this
+            for _ in range(count):
+                i = pos >> 3
+                entry = dc_lookup[(((bits[i] << 16) | (bits[i + 1] << 8) | bits[i + 2]) >> (8 - (pos & 7))) & 0xFFFF]
+                if not entry:
+                    raise ValueError("Invalid Huffman code")
+                pos += entry >> 8
+                size = entry & 0xFF
+                if size:
+                    i = pos >> 3
+                    value = ((((bits[i] << 16) | (bits[i + 1] << 8) | bits[i + 2]) >> (8 - (pos & 7))) & 0xFFFF) >> (16 - size)
+                    pos += size
+                    if value < (1 << (size - 1)):
+                        value -= (1 << size) - 1
+                    predictions[index] += value
+
+                block = [0] * 64 if keep else None
+                if keep:
+                    block[0] = predictions[index]
+
+                k = 1
+                while k < 64:
+                    i = pos >> 3
+                    entry = ac_lookup[(((bits[i] << 16) | (bits[i + 1] << 8) | bits[i + 2]) >> (8 - (pos & 7))) & 0xFFFF]
+                    if not entry:
+                        raise ValueError("Invalid Huffman code")
+                    pos += entry >> 8
+                    run, size = (entry >> 4) & 0x0F, entry & 0x0F
+                    if not size:
+                        if run != 15:
+                            break
+                        k += 16
+                        continue
+                    k += run
+                    i = pos >> 3
+                    value = ((((bits[i] << 16) | (bits[i + 1] << 8) | bits[i + 2]) >> (8 - (pos & 7))) & 0xFFFF) >> (16 - size)
+                    pos += size
+                    if value < (1 << (size - 1)):
+                        value -= (1 << size) - 1
+                    if keep and k < 64:
+                        block[k] = value
+                    k += 1
+
+                if keep:
+                    blocks.append(block)
+        if pos > limit:
+            raise ValueError("Entropy-coded data ended early")
+    return blocks
+
+
+def sample_luminance_blocks(data: bytes, info: Dict[str, Any],
+                            max_blocks: int = MAX_SAMPLED_BLOCKS) -> Tuple[List[Tuple[int, int]], List[List[int]]]:
+    """
+    Decode a sample of luminance blocks from the first scan of a sequential JPEG.
+
+    With restart markers the sample is spread over evenly spaced restart intervals.
+    Otherwise the whole scan is decoded, since Huffman data cannot be skipped,
+    and the blocks of evenly spaced MCU rows are kept, so the sample covers the
+    whole card rather than its top strip.
+
+    Args:
+        data: Contents of the JPEG file
+        info: Result of parse_jpeg
+        max_blocks: Maximum number of luminance blocks to keep
+
+    Returns:
+        Tuple of (block positions as (block row, block column), zigzag-ordered coefficients)
+    """
+    frame, scan = info["frame"], info["scan"]
+    frame_components = {component["id"]: component for component in frame["components"]}
+    luma_id = frame["components"][0]["id"]
+    h_max = max(component["h"] for component in frame["components"])
+    v_max = max(component["v"] for component in frame["components"])
+
+    interleaved = len(scan["components"]) > 1
+    lookups = {}
+    components = []
+    luma_shape = (1, 1)
+    for scan_component in scan["components"]:
+        component = frame_components[scan_component["id"]]
+        h, v = (component["h"], component["v"]) if interleaved else (1, 1)
+        for key in ((0, scan_component["td"]), (1, scan_component["ta"])):
+            if key not in lookups:
+                lookups[key] = _build_lookup(*info["huffman_tables"][key])
+        keep = scan_component["id"] == luma_id
+        if keep:
+            luma_shape = (v, h)
+        components.append((h * v, lookups[(0, scan_component["td"])], lookups[(1, scan_component["ta"])], keep))
+
+    if not any(keep for _, _, _, keep in components):
+        raise ValueError("First scan does not contain the luminance component")
+
+    if interleaved:
+        mcus_per_row = -(-frame["width"] // (8 * h_max))
+        mcu_rows = -(-frame["height"] // (8 * v_max))
+    else:
+        luma = frame_components[luma_id]
+        mcus_per_row = -(-frame["width"] * luma["h"] // (8 * h_max))
+        mcu_rows = -(-frame["height"] * luma["v"] // (8 * v_max))
+    total_mcus = mcus_per_row * mcu_rows
+    budget = max(1, max_blocks // (luma_shape[0] * luma_shape[1]))
+
+    segments = _entropy_segments(data, info["scan_offset"])
+    interval = info["restart_interval"] if len(segments) > 1 else 0
+    if interval:
+        count = min(len(segments), max(1, budget // interval))
+        chosen = sorted({round(i * (len(segments) - 1) / max(count - 1, 1)) for i in range(count)})
+        plan = [(segments[i], i * interval, min(interval, total_mcus - i * interval)) for i in chosen]
+        plan = [(segment, first, mcus, None) for segment, first, mcus in plan]
+    else:
+        # Pairs of adjacent MCU rows, so shifted 8x8 grids fit inside the kept strips
+        count = min(max(1, mcu_rows - 1), max(1, budget // (2 * mcus_per_row)))
+        starts = {round(i * max(mcu_rows - 2, 0) / max(count - 1, 1)) for i in range(count)}
+        kept_rows = {row + offset for row in starts for offset in (0, 1)}
+        plan = [(segments[0], 0, total_mcus, lambda mcu: mcu // mcus_per_row in kept_rows)]
+
+    positions, blocks = [], []
+    v, h = luma_shape
+    for segment, first_mcu, mcus, keep_mcu in plan:
+        if mcus <= 0:
+            continue
+        decoded = _decode_mcus(segment, mcus, components, keep_mcu)
+        kept = [first_mcu + mcu for mcu in range(mcus) if keep_mcu is None or keep_mcu(mcu)]
+        for n, block in enumerate(decoded):
+            mcu, within = divmod(n, v * h)
+            mcu_row, mcu_col = divmod(kept[mcu], mcus_per_row)
+            positions.append((mcu_row * v + within // h, mcu_col * h + within % h))
+            blocks.append(block)
+    return positions, blocks
+
+
+def double_quantization_score(coefficients: Any) -> Dict[str, Any]:
+    """
+    Measure periodic artifacts in the histograms of quantized AC coefficients.
+
+    A singly compressed image has smooth, roughly geometric coefficient
+    histograms. Quantizing twice with different steps leaves periodically empty
+    or overfilled bins, which show up as outliers against the geometric mean of
+    their neighbours.
+
+    Args:
+        coefficients: Array of zigzag-ordered quantized coefficients, one row per block
+
+    Returns:
+        Dictionary with the fraction of irregular bins and the number of bins considered
+    """
+    import numpy as np
+
+    irregular = considered = 0
+    for k in HISTOGRAM_POSITIONS:
+        values = np.abs(coefficients[:, k])
+        histogram = np.bincount(values[values <= MAX_HISTOGRAM_BIN + 1], minlength=MAX_HISTOGRAM_BIN + 2)
+        log_hist = np.log(histogram + 1.0)
+        for v in range(2, MAX_HISTOGRAM_BIN + 1):
+            if min(histogram[v - 1], histogram[v + 1]) < MIN_BIN_COUNT:
+                continue
+            considered += 1
+            deviation = log_hist[v] - (log_hist[v - 1] + log_hist[v + 1]) / 2
+            if abs(deviation) > np.log(2):
+                irregular += 1
+
+    return {
+        "score": round(irregular / considered, 4) if considered else 0.0,
+        "bins_considered": considered
+    }
+
+
+def grid_alignment(positions: List[Tuple[int, int]], coefficients: Any,
+                   quant_table: Tuple[int, ...]) -> Dict[str, Any]:
+    """
+    Look for an earlier 8x8 compression grid shifted from the current one.
+
+    The sampled blocks are reconstructed with an inverse DCT and re-transformed
+    on every shifted 8x8 grid. Content that was JPEG-compressed before being
+    cropped or pasted keeps low-frequency DCT coefficients close to multiples of
+    its first quantization steps on the grid it was first compressed on, so
+    their values are periodic there and spread out on every other grid. The
+    strongest periodicity above the median over all shifts is compared with the
+    runner-up's.
+
+    Args:
+        positions: Block positions as (block row, block column)
+        coefficients: Array of zigzag-ordered quantized coefficients, one row per block
+        quant_table: Luminance quantization table in natural order
+
+    Returns:
+        Dictionary with the strongest shifted grid offset and its relative strength
+    """
+    import numpy as np
+
+    natural = np.zeros_like(coefficients, dtype=np.float32)
+    natural[:, list(ZIGZAG)] = coefficients
+    natural *= np.asarray(quant_table, dtype=np.float32)
+    x = np.arange(8)
+    basis = (np.cos((2 * x[None, :] + 1) * x[:, None] * np.pi / 16) * np.sqrt(2 / 8)).astype(np.float32)
+    basis[0] /= np.sqrt(2)
+    pixels = np.clip(np.round(basis.T @ natural.reshape(-1, 8, 8) @ basis), -128, 127)
+
+    rows = sorted({row for row, _ in positions})
+    row_index = {row: i for i, row in enumerate(rows)}
+    width = (max(col for _, col in positions) + 1) * 8
+    plane = np.zeros((len(rows) * 8, width), dtype=np.float32)
+    for (row, col), block in zip(positions, pixels):
+        plane[row_index[row] * 8:row_index[row] * 8 + 8, col * 8:col * 8 + 8] = block
+
+    # Shifted blocks can only be cut from runs of consecutive block rows
+    strips, start = [], 0
+    for i in range(1, len(rows) + 1):
+        if i == len(rows) or rows[i] != rows[i - 1] + 1:
+            if i - start >= 2:
+                strips.append(plane[start * 8:i * 8])
+            start = i
+    if not strips:
+        return {"offset": [0, 0], "score": 1.0}
+
+    # Coefficient values are binned to a quarter, so every shift's periodicity is
+    # measured on a histogram instead of on each block
+    steps = np.arange(2, GRID_MAX_STEP + 1, dtype=np.float64)
+    limit = 1024
+    centres = np.arange(-limit * 4, limit * 4 + 1) / 4
+    phases = np.exp(2j * np.pi * centres[:, None] / steps[None, :])
+    rows_needed = sorted({index for pair in GRID_COEFFICIENTS for index in pair})
+    partial = basis[rows_needed]
+    periodicity = {}
+    for dy in range(8):
+        for dx in range(8):
+            if dy == dx == 0:
+                continue
+            blocks = []
+            for strip in strips:
+                h, w = (strip.shape[0] - dy) // 8 * 8, (strip.shape[1] - dx) // 8 * 8
+                blocks.append(strip[dy:dy + h, dx:dx + w]
+                              .reshape(h // 8, 8, w // 8, 8).transpose(0, 2, 1, 3).reshape(-1, 8, 8))
+            dct = partial @ np.concatenate(blocks) @ partial.T
+            total = 0.0
+            for u, v in GRID_COEFFICIENTS:
+                values = dct[:, rows_needed.index(u), rows_needed.index(v)]
+                # Flat areas leave values near zero, which sit on every lattice
+                values = values[np.abs(values) > GRID_MIN_COEFFICIENT]
+                if len(values) < MIN_BIN_COUNT:
+                    continue
+                bins = np.clip(np.round(values * 4).astype(np.int64) + limit * 4, 0, len(centres) - 1)
+                histogram = np.bincount(bins, minlength=len(centres))
+                total += float(np.abs(histogram @ phases).max()) / len(values)
+            periodicity[(dy, dx)] = total / len(GRID_COEFFICIENTS)
+
+    # Shifts next to the current grid share most of its pixels and inherit some
+    # of its periodicity, so the strongest shift has to stand out from the runner-up
+    ranked = sorted(periodicity, key=periodicity.get, reverse=True)
+    baseline = float(np.median(list(periodicity.values())))
+    offset = ranked[0]
+    score = (periodicity[offset] - baseline) / max(periodicity[ranked[1]] - baseline, 1e-6)
+    return {
+        "offset": list(offset) if score >= GRID_MISALIGNMENT_THRESHOLD else [0, 0],
+        "score": round(score, 4)
+    }
+
+
+def describe_encoder(info: Dict[str, Any], luma_quality: Tuple[int, bool],
+                     chroma_quality: Optional[Tuple[int, bool]]) -> str:
+    """Summarize which kind of encoder produced the file."""
+    if info["editor_hints"]:
+        return f"image editor ({', '.join(info['editor_hints'])})"
+    if "Photoshop IRB" in info["app_signatures"] or "Adobe" in info["app_signatures"]:
+        return "Adobe software"
+    standard = luma_quality[1] and (chroma_quality is None or chroma_quality[1])
+    if standard:
+        return f"libjpeg-compatible encoder at quality {luma_quality[0]}"
+    if "Exif" in info["app_signatures"]:
+        return "camera firmware (custom quantization tables)"
+    return "unknown encoder (custom quantization tables)"
+
+
+def jpeg_structure_check(image_path: str, max_blocks: int = MAX_SAMPLED_BLOCKS) -> Dict[str, Any]:
+    """
+    Analyse a JPEG file's structure for signs of recompression and editing.
+
+    Detection limits: double quantization only shows when the earlier
+    compression was noticeably stronger than the last one (e.g. quality 60
+    saved again at 90); equal or weaker earlier compression leaves no trace, and
+    strong sensor noise or fine texture smooths the histograms over. A shifted
+    grid is found the same way, from the periodicity the earlier compression
+    left, so a crop of an image last saved at quality 90 or above and saved
+    again at a similar quality goes unnoticed. Only max_blocks luminance blocks
+    are kept, from evenly spaced MCU rows, and progressive JPEGs get the table
+    analysis only.
+
+    Args:
+        image_path: Path to the image file
+        max_blocks: Maximum number of luminance blocks to decode
+
+    Returns:
+        Dictionary with status, encoder and quality estimates, double compression
+        and grid alignment results, and an explanatory message
+    """
+    import numpy as np
+
+    with open(image_path, "rb") as file:
+        data = file.read()
+
+    try:
+        info = parse_jpeg(data)
+    except ValueError:
+        return {
+            "status": "success",
+            "applicable": False,
+            "message": "Image is not a JPEG file; JPEG structure analysis does not apply."
+        }
+
+    frame = info["frame"]
+    if frame is None or not info["quant_tables"]:
+        return {"status": "flag for review", "applicable": True,
+                "message": "JPEG file is missing its frame header or quantization tables."}
+
+    luma_table = info["quant_tables"].get(frame["components"][0]["tq"])
+    if luma_table is None:
+        return {"status": "flag for review", "applicable": True,
+                "message": "JPEG luminance component refers to a quantization table the file does not define."}
+    chroma_table = None
+    if len(frame["components"]) > 1:
+        chroma_table = info["quant_tables"].get(frame["components"][1]["tq"])
+    luma_quality = estimate_quality(luma_table, STANDARD_LUMINANCE_TABLE)
+    chroma_quality = estimate_quality(chroma_table, STANDARD_CHROMINANCE_TABLE) if chroma_table else None
+
+    result = {
+        "status": "success",
+        "applicable": True,
+        "format": frame["type"],
+        "dimensions": [frame["width"], frame["height"]],
+        "quality_estimate": luma_quality[0],
+        "standard_tables": luma_quality[1] and (chroma_quality is None or chroma_quality[1]),
+        "encoder": describe_encoder(info, luma_quality, chroma_quality),
+        "app_segments": info["app_signatures"],
+        "double_compression_score": None,
+        "grid_offset": None,
+        "grid_score": None,
+        "blocks_analyzed": 0
+    }
+
+    indicators = []
+    if info["editor_hints"]:
+        indicators.append(f"editing software markers ({', '.join(info['editor_hints'])})")
+
+    if frame["type"] in ("baseline", "extended sequential") and info["scan"] and frame["precision"] == 8:
+        try:
+            positions, blocks = sample_luminance_blocks(data, info, max_blocks)
+        except (ValueError, KeyError, IndexError) as e:
+            positions, blocks = [], []
+            result["coefficient_analysis_skipped"] = str(e)
+
+        if blocks:
+            coefficients = np.asarray(blocks, dtype=np.int32)
+            histogram = double_quantization_score(coefficients)
+            grid = grid_alignment(positions, coefficients, luma_table)
+            result.update({
+                "double_compression_score": histogram["score"],
+                "grid_offset": grid["offset"],
+                "grid_score": grid["score"],
+                "blocks_analyzed": len(blocks)
+            })
+            if histogram["score"] > DOUBLE_COMPRESSION_THRESHOLD:
+                indicators.append("double quantization artifacts in the DCT coefficient histograms")
+            if grid["offset"] != [0, 0]:
+                indicators.append(f"blocking on an 8x8 grid shifted by {grid['offset']}")
+    else:
+        result["coefficient_analysis_skipped"] = f"Not supported for {frame['type']} JPEG"
+
+    if len(indicators) >= 2:
+        result["status"] = "fail"
+    elif indicators:
+        result["status"] = "flag for review"
+
+    if indicators:
+        result["message"] = "JPEG structure shows " + "; ".join(indicators) + "."
+    else:
+        result["message"] = f"No recompression evidence found; encoded by {result['encoder']}."
+    return result
+
+
+if __name__ == "__main__":
+    # Example test case
+    image_path = r"C:\Users\nazguul\Desktop\PFE_Workplace\Resources\ID Cards\new_york_fake_id-scaled-e1601065688702-1600x1029.jpg"
+    print(jpeg_structure_check(image_path))
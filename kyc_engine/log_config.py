@@ -0,0 +1,158 @@
+"""
+Structured, non-blocking logging.
+
+Modules log through `logging.getLogger(__name__)`. configure_logging() routes
+the kyc_engine, api and app loggers into a bounded in-memory queue; a single
+listener thread formats the records and writes them to stderr, so a request
+thread only enqueues a record and never waits on stdout. Every record carries
+the id of the request it was logged for, taken from a context variable set
+when the request starts.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+# Minimum level written (DEBUG also dumps the full aggregated results of each verification)
+LOG_LEVEL = os.getenv("KYC_LOG_LEVEL", "INFO").upper()
+
+# "json" for one JSON object per line, "text" for human-readable lines
+LOG_FORMAT = os.getenv("KYC_LOG_FORMAT", "json").lower()
+
+# Records buffered for the listener; records beyond this are dropped, not waited on
+QUEUE_SIZE = int(os.getenv("KYC_LOG_QUEUE_SIZE", "10000"))
+
+# Loggers whose records go through the queue
+LOGGER_NAMES = ("kyc_engine", "api", "app", "__main__")
+
+# Id of the request being handled by the current thread or task
+request_id_var: ContextVar[Optional[str]] = ContextVar("kyc_request_id", default=None)
+
+_configure_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def bind_request_id(incoming: Optional[str] = None) -> str:
+    """
+    Set the current request's id for logging.
+
+    Args:
+        incoming: Id sent by the caller (X-Request-ID header), if any
+
+    Returns:
+        The caller's id if it is usable, otherwise a newly generated one
+    """
+    incoming = (incoming or "").strip()
+    request_id = incoming[:64] if incoming and incoming.isprintable() else uuid.uuid4().hex
+    request_id_var.set(request_id)
+    return request_id
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request id to every record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking or raising when the queue is full."""
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge the message arguments and render any traceback, leaving formatting to the listener."""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects with structured fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "message": record.getMessage()
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Format records as readable lines, with structured fields appended as JSON."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + json.dumps(fields, default=str)
+        return text
+
+
+def configure_logging(level: Optional[str] = None) -> None:
+    """
+    Route the application loggers through the queue and start the listener thread.
+
+    Safe to call more than once; only the first call configures anything.
+
+    Args:
+        level: Minimum level name (default KYC_LOG_LEVEL)
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        output = logging.StreamHandler()
+        output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+        log_queue: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+        handler = DroppingQueueHandler(log_queue)
+        # The request id lives in the request's context, so read it before the record is queued
+        handler.addFilter(RequestIdFilter())
+
+        for name in LOGGER_NAMES:
+            logger = logging.getLogger(name)
+            logger.setLevel(level or LOG_LEVEL)
+            logger.addHandler(handler)
+            logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
@@ -1,10 +1,12 @@
 """
 Metadata analysis module for detecting image tampering through EXIF data.
 """
+import hashlib
 import json
-from typing import Dict, Any, Optional
+import logging
+import os
+from typing import Dict, Any, List, Optional, Tuple
 
-from PIL import Image, ExifTags
 from kyc_engine.shared import (
     GLOBAL_TAMPERING_PROMPT,
     api_call,
@@ -12,6 +14,31 @@ from kyc_engine.shared import (
     parse_json
 )
 
+logger = logging.getLogger(__name__)
+
+# Static part of the tampering prompt, cacheable by the provider
+TAMPERING_PROMPT_PREFIX = GLOBAL_TAMPERING_PROMPT.format(metadata="").rstrip()
+
+# Maximum size of the serialized metadata sent to the model (0 disables the limit)
+METADATA_BYTE_BUDGET = int(os.getenv("KYC_METADATA_BYTE_BUDGET", "4096"))
+
+# Tags that are always summarized, whatever their size
+BINARY_TAGS = {"MakerNote", "PrintImageMatching", "JPEGThumbnail", "ComponentsConfiguration"}
+
+# IFD offset tags that carry no information for the analysis
+POINTER_TAGS = {"ExifOffset", "InteropOffset"}
+
+# Tags kept first when the byte budget forces tags to be dropped
+PRIORITY_TAGS = (
+    "Software", "Make", "Model", "DateTime", "DateTimeOriginal", "DateTimeDigitized",
+    "GPSInfo", "ImageWidth", "ImageLength", "ExifImageWidth", "ExifImageHeight",
+    "Orientation", "XResolution", "YResolution", "ResolutionUnit", "HostComputer",
+    "LensModel", "Artist", "Copyright"
+)
+
+# Longest bytes value that may be decoded as text instead of summarized
+MAX_TEXT_BYTES = 64
+
 
 def extract_metadata(image_path: str) -> Dict[str, Any]:
     """
@@ -23,6 +50,8 @@ def extract_metadata(image_path: str) -> Dict[str, Any]:
     Returns:
         Dictionary containing EXIF metadata with decoded tag names
     """
+    from PIL import Image, ExifTags
+
     try:
         img = Image.open(image_path)
         exif_data = img._getexif()
@@ -35,10 +64,164 @@ def extract_metadata(image_path: str) -> Dict[str, Any]:
             metadata[decoded] = value
         return metadata
     except Exception as e:
-        print(f"Error extracting metadata: {e}")
+        logger.warning("Error extracting metadata: %s", e)
         return {}
 
 
+def _json_default(value: Any) -> Any:
+    """Serialize EXIF rationals as floats and anything else as a string."""
+    if hasattr(value, 'numerator') and hasattr(value, 'denominator'):
+        return float(value)
+    return str(value)
+
+
+def metadata_to_json(metadata: Dict[str, Any]) -> str:
+    """
+    Serialize raw EXIF metadata exactly as extracted.
+    
+    Args:
+        metadata: EXIF metadata with decoded tag names
+        
+    Returns:
+        Indented JSON string of the metadata
+    """
+    return json.dumps(metadata, indent=2, default=_json_default)
+
+
+def _summarize_bytes(value: bytes) -> Any:
+    """Decode short printable byte strings, and reduce anything else to length + hash."""
+    if len(value) <= MAX_TEXT_BYTES:
+        text = value.rstrip(b"\x00").decode("ascii", errors="ignore").strip()
+        if text and text.isprintable():
+            return text
+    return {"binary_bytes": len(value), "sha256": hashlib.sha256(value).hexdigest()[:16]}
+
+
+def _to_float(value: Any) -> Any:
+    """Convert an EXIF rational to a rounded float, leaving other values unchanged."""
+    if isinstance(value, int):
+        return value
+    if hasattr(value, 'numerator') and hasattr(value, 'denominator'):
+        try:
+            return round(float(value), 6)
+        except (ZeroDivisionError, ValueError):
+            return None
+    return value
+
+
+def _dms_to_degrees(dms: Any, ref: Any) -> Optional[float]:
+    """Convert a (degrees, minutes, seconds) rational tuple to signed decimal degrees."""
+    try:
+        degrees, minutes, seconds = (float(part) for part in dms)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    value = degrees + minutes / 60.0 + seconds / 3600.0
+    if str(ref).upper() in ("S", "W"):
+        value = -value
+    return round(value, 6)
+
+
+def _normalize_gps(gps: Dict[Any, Any]) -> Dict[str, Any]:
+    """Decode GPS tag ids and flatten coordinates to decimal degrees."""
+    from PIL import ExifTags
+
+    decoded = {ExifTags.GPSTAGS.get(tag, str(tag)): value for tag, value in gps.items()}
+    flat = {}
+    for axis, ref in (("GPSLatitude", "GPSLatitudeRef"), ("GPSLongitude", "GPSLongitudeRef")):
+        if axis in decoded:
+            flat[axis] = _dms_to_degrees(decoded.pop(axis), decoded.pop(ref, ""))
+    for key, value in decoded.items():
+        flat[key] = _normalize_value(key, value)
+    return flat
+
+
+def _normalize_value(key: str, value: Any) -> Any:
+    """Reduce one EXIF value to compact JSON-friendly data."""
+    if key in BINARY_TAGS and isinstance(value, (bytes, str)):
+        raw = value if isinstance(value, bytes) else value.encode("utf-8", errors="ignore")
+        return {"binary_bytes": len(raw), "sha256": hashlib.sha256(raw).hexdigest()[:16]}
+    if key == "GPSInfo" and isinstance(value, dict):
+        return _normalize_gps(value)
+    if key == "UserComment" and isinstance(value, bytes):
+        # The first 8 bytes declare the character code (ASCII, UNICODE, JIS or undefined)
+        value = value[8:] if len(value) >= 8 else value
+    if isinstance(value, bytes):
+        return _summarize_bytes(value)
+    if isinstance(value, str):
+        return value.rstrip("\x00").strip()
+    if isinstance(value, dict):
+        return {str(k): _normalize_value(str(k), v) for k, v in value.items()}
+    if isinstance(value, (tuple, list)):
+        return [_normalize_value(key, item) for item in value]
+    return _to_float(value)
+
+
+def normalize_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalize EXIF metadata for compact serialization.
+    
+    Binary blobs (MakerNote, PrintImageMatching, thumbnails, ...) are replaced by
+    their length and a short hash, GPS coordinates become decimal degrees and
+    rationals become floats.
+    
+    Args:
+        metadata: EXIF metadata with decoded tag names
+        
+    Returns:
+        Normalized metadata dictionary
+    """
+    return {
+        str(key): _normalize_value(str(key), value)
+        for key, value in metadata.items()
+        if key not in POINTER_TAGS
+    }
+
+
+def _dump_compact(metadata: Dict[str, Any]) -> str:
+    """Serialize metadata as JSON without whitespace."""
+    return json.dumps(metadata, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def compact_metadata(metadata: Dict[str, Any],
+                     byte_budget: int = METADATA_BYTE_BUDGET) -> Tuple[str, Dict[str, Any]]:
+    """
+    Serialize EXIF metadata as compact JSON within a byte budget.
+    
+    When the normalized metadata exceeds the budget, the largest non-priority tags
+    are dropped first, then the largest priority tags.
+    
+    Args:
+        metadata: EXIF metadata with decoded tag names
+        byte_budget: Maximum size of the output in bytes (0 disables the limit)
+        
+    Returns:
+        Tuple of (compact JSON string, report of prompt bytes saved)
+    """
+    normalized = normalize_metadata(metadata)
+    compact = _dump_compact(normalized)
+    dropped: List[str] = []
+
+    if byte_budget and len(compact.encode("utf-8")) > byte_budget:
+        sizes = {key: len(_dump_compact({key: value})) for key, value in normalized.items()}
+        order = sorted(normalized, key=lambda key: (key in PRIORITY_TAGS, -sizes[key]))
+        for key in order:
+            if len(compact.encode("utf-8")) <= byte_budget:
+                break
+            normalized.pop(key)
+            dropped.append(key)
+            compact = _dump_compact(normalized)
+
+    original_bytes = len(metadata_to_json(metadata).encode("utf-8"))
+    compact_bytes = len(compact.encode("utf-8"))
+    report = {
+        "original_bytes": original_bytes,
+        "compact_bytes": compact_bytes,
+        "saved_bytes": original_bytes - compact_bytes,
+        "dropped_tags": dropped
+    }
+    return compact, report
+
+
 def detect_tampering(image_path: str) -> Optional[Dict[str, Any]]:
     """
     Extract metadata and analyze it for signs of tampering.
@@ -51,19 +234,18 @@ def detect_tampering(image_path: str) -> Optional[Dict[str, Any]]:
     """
     full_metadata = extract_metadata(image_path)
 
-    # Convert metadata to JSON, handling non-serializable types
-    metadata_json = json.dumps(
-        full_metadata,
-        indent=2,
-        default=lambda o: float(o) if hasattr(o, 'numerator') and hasattr(o, 'denominator') else str(o)
-    )
+    # Convert metadata to compact JSON, summarizing binary and non-serializable values
+    metadata_json, prompt_bytes = compact_metadata(full_metadata)
     
     # Build the prompt with the complete metadata injected
     prompt = GLOBAL_TAMPERING_PROMPT.format(metadata=metadata_json)
     
     # Call the Gemini API using only the text prompt
-    result = api_call(GEMINI_ENDPOINT, prompt)
-    return parse_json(result)
+    result = parse_json(api_call(GEMINI_ENDPOINT, prompt,
+                                 cached_prefix=TAMPERING_PROMPT_PREFIX, suffix_text=metadata_json))
+    if isinstance(result, dict):
+        result["prompt_bytes"] = prompt_bytes
+    return result
 
 
 if __name__ == "__main__":
@@ -1,35 +1,284 @@
 """
 OCR verification module for extracting and verifying information from ID cards.
 """
-from typing import Dict, Optional, Any
+import datetime
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, Optional, Any, Set, Tuple
 
-from ollama import chat, ChatResponse
+from kyc_engine.image_loading import RESOLUTION_POLICY
 from kyc_engine.shared import (
+    GLOBAL_EXTRACTION_PROMPT,
     GLOBAL_OCR_PROMPT,
     api_call,
     GEMINI_ENDPOINT,
     parse_json
 )
 
+OCR_FIELDS = ("full_name", "dob", "nationality", "id_number")
 
-def gemini(form_data: Dict[str, str], img_path: str) -> Optional[Dict[str, Any]]:
+# Response schema of the extraction-only prompt
+EXTRACTION_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "status": {"type": "STRING", "enum": ["success", "fail"]},
+        "extracted": {
+            "type": "OBJECT",
+            "properties": {field: {"type": "STRING"} for field in OCR_FIELDS},
+            "required": list(OCR_FIELDS)
+        },
+        "message": {"type": "STRING"}
+    },
+    "required": ["status", "extracted", "message"]
+}
+
+# Minimum similarity (0-1) for a name or nationality to match the form
+FUZZY_MATCH_RATIO = 0.85
+
+# Value the extraction prompt returns for a field absent from the card
+NOT_FOUND = "not found"
+
+_MONTHS = {name: number for number, names in enumerate((
+    ("jan", "january", "janvier"), ("feb", "february", "fevrier"), ("mar", "march", "mars"),
+    ("apr", "april", "avril"), ("may", "mai"), ("jun", "june", "juin"), ("jul", "july", "juillet"),
+    ("aug", "august", "aout"), ("sep", "sept", "september", "septembre"), ("oct", "october", "octobre"),
+    ("nov", "november", "novembre"), ("dec", "december", "decembre")
+), start=1) for name in names}
+
+
+def build_ocr_prompt(form_data: Dict[str, str]) -> str:
     """
-    Process ID card extraction and verification using the Gemini API.
+    Fill the OCR prompt with the submitted form values.
     
     Args:
         form_data: Dictionary containing user submitted identity information
-        img_path: Path to the uploaded ID card image
         
     Returns:
-        Parsed JSON result with extraction and verification data
+        Prompt text
     """
-    prompt = GLOBAL_OCR_PROMPT.format(
+    return GLOBAL_OCR_PROMPT.format(
         form_full_name=form_data.get("full_name", ""),
         form_dob=form_data.get("dob", ""),
         form_nationality=form_data.get("nationality", ""),
         form_id_number=form_data.get("id_number", "")
     )
-    return parse_json(api_call(GEMINI_ENDPOINT, prompt, img_path))
+
+
+def build_ocr_prompt_parts(form_data: Dict[str, str]) -> Tuple[str, str]:
+    """
+    Split the OCR prompt into a static prefix and the form-specific suffix.
+    
+    The prefix keeps the form placeholders as symbolic names so it is identical
+    for every request and can be cached by the provider.
+    
+    Args:
+        form_data: Dictionary containing user submitted identity information
+        
+    Returns:
+        Tuple of (static prefix, suffix with the form values)
+    """
+    prefix = GLOBAL_OCR_PROMPT.format(
+        form_full_name="<form_full_name>",
+        form_dob="<form_dob>",
+        form_nationality="<form_nationality>",
+        form_id_number="<form_id_number>"
+    )
+    suffix = (
+        "Form values:\n"
+        f"form_full_name: {form_data.get('full_name', '')}\n"
+        f"form_dob: {form_data.get('dob', '')}\n"
+        f"form_nationality: {form_data.get('nationality', '')}\n"
+        f"form_id_number: {form_data.get('id_number', '')}\n"
+    )
+    return prefix, suffix
+
+
+def gemini(form_data: Dict[str, str], img_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Process ID card extraction and verification using the Gemini API.
+    
+    Args:
+        form_data: Dictionary containing user submitted identity information
+        img_path: Path to the uploaded ID card image
+        
+    Returns:
+        Parsed JSON result with extraction and verification data
+    """
+    prompt = build_ocr_prompt(form_data)
+    prefix, suffix = build_ocr_prompt_parts(form_data)
+    return parse_json(api_call(GEMINI_ENDPOINT, prompt, img_path,
+                               cached_prefix=prefix, suffix_text=suffix,
+                               image_min_side=RESOLUTION_POLICY["ocr"]))
+
+
+def extract_fields(img_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Extract the identity fields from an ID card image without any form data.
+    
+    Used when the image is uploaded before the form is complete; the fields
+    are compared with the form later by compare_fields().
+    
+    Args:
+        img_path: Path to the uploaded ID card image
+        
+    Returns:
+        Parsed JSON result with status, extracted fields and message
+    """
+    return parse_json(api_call(
+        GEMINI_ENDPOINT,
+        GLOBAL_EXTRACTION_PROMPT,
+        img_path,
+        generation_config={
+            "responseMimeType": "application/json",
+            "responseSchema": EXTRACTION_RESPONSE_SCHEMA
+        },
+        image_min_side=RESOLUTION_POLICY["ocr"]
+    ))
+
+
+def _normalize_text(value: str) -> str:
+    """Strip accents and punctuation, case-fold and collapse whitespace."""
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(c for c in value if not unicodedata.combining(c)).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", value).split())
+
+
+def _similarity(a: str, b: str, ignore_order: bool = False) -> float:
+    """Similarity (0-1) of two normalized strings, optionally ignoring word order."""
+    if ignore_order:
+        a, b = " ".join(sorted(a.split())), " ".join(sorted(b.split()))
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _expand_year(year: int) -> int:
+    """Expand a two-digit year to the most recent matching year not in the future."""
+    if year >= 100:
+        return year
+    current = datetime.date.today().year
+    return year + 2000 if 2000 + year <= current else year + 1900
+
+
+def _date_candidates(value: str) -> Set[Tuple[int, int, int]]:
+    """
+    Read a date in any common format as the set of (year, month, day) it may mean.
+    
+    Numeric dates whose day and month are ambiguous (03/04/1990) yield both
+    readings. Without a four-digit year, a two-digit year is read from the
+    last number (07-07-98), or from the first when it cannot be a day (98-07-07).
+    """
+    text = _normalize_text(value)
+    month = next((number for word, number in _MONTHS.items() if re.search(rf"\b{word}\b", text)), None)
+    numbers = [int(n) for n in re.findall(r"\d+", text)]
+    years = [n for n in numbers if n >= 1000]
+    if len(years) > 1:
+        return set()
+    if years:
+        splits = [(years[0], [n for n in numbers if n != years[0]])]
+    elif len(numbers) == (2 if month is not None else 3):
+        splits = [(numbers[-1], numbers[:-1])]
+        if numbers[0] > 31:
+            splits.append((numbers[0], numbers[1:]))
+    else:
+        return set()
+
+    candidates = set()
+    for year, rest in splits:
+        if month is not None:
+            orders = [(month, day) for day in rest[:1]]
+        elif len(rest) == 2:
+            orders = [(rest[0], rest[1]), (rest[1], rest[0])]
+        else:
+            orders = []
+        candidates.update((_expand_year(year), m, d) for m, d in orders if 1 <= m <= 12 and 1 <= d <= 31)
+    return candidates
+
+
+def _field_match(field: str, form_value: str, found_value: str) -> Tuple[Optional[bool], float]:
+    """
+    Compare one form field with its extracted value.
+    
+    Returns:
+        Tuple of (match, similarity); match is None when the dates could not be
+        read, so the comparison is left to a reviewer
+    """
+    form_norm, found_norm = _normalize_text(form_value), _normalize_text(found_value)
+    if field == "id_number":
+        form_id = form_norm.replace(" ", "")
+        found_id = found_norm.replace(" ", "")
+        return form_id == found_id, _similarity(form_id, found_id)
+    if field == "dob":
+        form_dates, found_dates = _date_candidates(form_value), _date_candidates(found_value)
+        if form_dates and found_dates:
+            return bool(form_dates & found_dates), 1.0 if form_dates & found_dates else 0.0
+        if form_norm == found_norm:
+            return True, 1.0
+        return None, _similarity(form_norm, found_norm)
+    ratio = _similarity(form_norm, found_norm, ignore_order=field == "full_name")
+    if field == "nationality" and form_norm and found_norm and (form_norm in found_norm or found_norm in form_norm):
+        # "Algeria" vs "Algerian"
+        ratio = max(ratio, FUZZY_MATCH_RATIO)
+    return ratio >= FUZZY_MATCH_RATIO, ratio
+
+
+def compare_fields(form_data: Dict[str, str], extraction: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compare extracted ID card fields with the form locally, without a model call.
+    
+    Applies the rules of the OCR prompt: a name, date of birth or nationality
+    found on the card that does not match fails the check, a mismatched ID
+    number or a date that cannot be read flags it for review, and fields not
+    found on the card are not failures.
+    
+    Args:
+        form_data: Dictionary containing user submitted identity information
+        extraction: Result of extract_fields()
+        
+    Returns:
+        OCR result shaped like the gemini() result
+    """
+    if extraction.get("status") != "success":
+        return {
+            "status": "fail",
+            "Similarity Score": 0,
+            "detailed_result": {},
+            "message": extraction.get("message") or "no id card recognized."
+        }
+
+    extracted = extraction.get("extracted") or {}
+    detailed, ratios, problems = {}, [], []
+    status = "success"
+    for field in OCR_FIELDS:
+        form_value = form_data.get(field) or ""
+        found_value = str(extracted.get(field) or NOT_FOUND)
+        if found_value.strip().casefold() == NOT_FOUND:
+            detailed[field] = {"form_value": form_value, "founded_value": NOT_FOUND, "match": False}
+            if field in ("full_name", "dob"):
+                status = "flag for review" if status == "success" else status
+                problems.append(f"{field} not found on the card")
+            continue
+
+        match, ratio = _field_match(field, form_value, found_value)
+        detailed[field] = {"form_value": form_value, "founded_value": found_value, "match": bool(match)}
+        ratios.append(ratio)
+        if match is None:
+            # Neither a match nor a mismatch could be established
+            status = "flag for review" if status == "success" else status
+            problems.append(f"{field} could not be compared with the card")
+        elif not match:
+            problems.append(f"{field} does not match the card")
+            if field == "id_number":
+                status = "flag for review" if status == "success" else status
+            else:
+                status = "fail"
+
+    return {
+        "status": status,
+        "Similarity Score": round(100 * sum(ratios) / len(ratios)) if ratios else 0,
+        "detailed_result": detailed,
+        "message": "; ".join(problems) or "All extracted fields match the form.",
+        "local_comparison": True
+    }
 
 
 def ollama(form_data: Dict[str, str], image_path: str) -> str:
@@ -46,19 +295,17 @@ def ollama(form_data: Dict[str, str], image_path: str) -> str:
     Returns:
         Raw response text from Ollama model
     """
-    prompt = GLOBAL_OCR_PROMPT.format(
-        form_full_name=form_data.get("full_name", ""),
-        form_dob=form_data.get("dob", ""),
-        form_nationality=form_data.get("nationality", ""),
-        form_id_number=form_data.get("id_number", "")
-    )
+    # Imported here so the default Gemini path does not load the ollama client
+    from ollama import chat
+
+    prompt = build_ocr_prompt(form_data)
     messages = [
         {
             "role": "user",
             "content": prompt
         }
     ]
-    response: ChatResponse = chat(model='lminicpm-v:latest', messages=messages)
+    response = chat(model='lminicpm-v:latest', messages=messages)
     return response.message.content
 
 
@@ -0,0 +1,342 @@
+"""
+Perceptual-hash index module for detecting recycled ID images.
+
+Every verified image is reduced to a 64-bit DCT perceptual hash (pHash) and stored in
+a BK-tree, so near-duplicates (small crops, resizes, recompressions) of previously
+verified documents can be found with a fast Hamming-distance lookup.
+
+The pHash only says two images look alike: an edited name leaves it unchanged.
+It therefore only drives the Duplicate flag; stored check results are reused
+only for a byte-identical image (same SHA-256).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from kyc_engine.shared import get_output_path
+
+# Maximum Hamming distance for two images to count as near-duplicates
+DUPLICATE_DISTANCE = int(os.getenv("KYC_DUPLICATE_DISTANCE", "10"))
+
+# Stage results kept in the index and reused for near-identical images
+REUSABLE_STAGES = ("JPEG", "ELA", "Forensics", "Localization")
+
+# Statuses of a completed check; skipped, shed, unavailable or failed steps are not reused
+REUSABLE_STATUSES = ("success", "flag for review", "fail")
+
+
+def compute_phash(image_path: str) -> Optional[int]:
+    """
+    Compute the 64-bit perceptual hash of an image.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        Hash as an integer, or None if the image could not be read
+    """
+    import cv2
+    import numpy as np
+
+    # A reduced decode is plenty for a 32x32 thumbnail
+    gray = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return None
+
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low_freq = cv2.dct(small)[:8, :8].flatten()
+    bits = low_freq > np.median(low_freq[1:])
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def identity_key(form_data: Dict[str, str]) -> Optional[str]:
+    """
+    Hash the submitter's normalized name and ID number into one key.
+
+    Args:
+        form_data: Dictionary containing user submitted identity information
+
+    Returns:
+        Hex key, or None when the form carries neither field (e.g. an upload
+        analysed before its form)
+    """
+    if not (form_data.get("full_name") or form_data.get("id_number")):
+        return None
+    from kyc_engine.face_index import identity_keys
+    keys = identity_keys(form_data)
+    return hashlib.sha256(f"{keys['name']}\n{keys['id_number']}".encode("utf-8")).hexdigest()[:32]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Count the differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes using Hamming distance.
+
+    Each node stores the items that share its exact hash, so lookups only
+    descend into children whose edge distance can still be within range.
+    """
+
+    def __init__(self):
+        self._root: Optional[Tuple[int, List[Any], Dict[int, Any]]] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, item: Any) -> None:
+        """
+        Insert an item under the given hash.
+
+        Args:
+            value: Hash of the item
+            item: Payload to return from searches
+        """
+        self._size += 1
+        if self._root is None:
+            self._root = (value, [item], {})
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """
+        Find all items whose hash is within max_distance of value.
+
+        Args:
+            value: Hash to search for
+            max_distance: Maximum Hamming distance
+
+        Returns:
+            List of (distance, item) pairs sorted by distance
+        """
+        if self._root is None:
+            return []
+
+        matches = []
+        stack = [self._root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in items)
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class PerceptualHashIndex:
+    """
+    Persistent pHash index of previously verified images.
+
+    Entries are appended to a JSON Lines file shared by every worker and loaded
+    into a BK-tree; whenever the file's size or modification time changes, the
+    lines added since the last load are read before the next lookup.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_output_path("phash_index.jsonl", "index")
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        # Bytes of the file already in the tree, and its (size, mtime) when they were read
+        self._offset = 0
+        self._stamp: Optional[Tuple[int, int]] = None
+
+    def _load(self) -> None:
+        """Read the entries added to the file since the last load (called with the lock held)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        if stamp == self._stamp:
+            return
+        if stat.st_size < self._offset:
+            # The file was replaced; read it again from the start
+            self._tree = BKTree()
+            self._offset = 0
+
+        with open(self.path, "rb") as file:
+            file.seek(self._offset)
+            data = file.read()
+        # A line another worker is still writing is read on a later load
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8", errors="replace").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self._tree.add(int(entry["phash"], 16), entry)
+        self._offset += end
+        self._stamp = stamp if end == len(data) else None
+
+    def lookup(self, phash: int, max_distance: int = DUPLICATE_DISTANCE) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Find indexed images within max_distance of the given hash.
+
+        Args:
+            phash: Perceptual hash of the new image
+            max_distance: Maximum Hamming distance
+
+        Returns:
+            List of (distance, entry) pairs sorted by distance
+        """
+        with self._lock:
+            self._load()
+            return self._tree.search(phash, max_distance)
+
+    def add(self, phash: int, verification_id: str, decision: str,
+            results: Optional[Dict[str, Any]] = None, image_hash: Optional[str] = None,
+            identity: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Add a verified image to the index and persist it.
+
+        Args:
+            phash: Perceptual hash of the image
+            verification_id: Identifier of the verification
+            decision: Final decision (accept/deny/flag for review)
+            results: Stage results to keep for reuse by the same image
+            image_hash: SHA-256 of the image file
+            identity: Hashed identity of the submitter from identity_key()
+
+        Returns:
+            The stored entry
+        """
+        entry = {
+            "phash": format(phash, "016x"),
+            "verification_id": verification_id,
+            "decision": decision,
+            "timestamp": time.time(),
+            "image_hash": image_hash,
+            "identity": identity,
+            "results": {
+                stage: results[stage]
+                for stage in REUSABLE_STAGES
+                if results and isinstance(results.get(stage), dict)
+                and results[stage].get("status") in REUSABLE_STATUSES
+            }
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry, default=str) + "\n")
+            # Reads this entry along with any other worker's since the last load
+            self._load()
+        return entry
+
+
+_default_index: Optional[PerceptualHashIndex] = None
+_default_index_lock = threading.Lock()
+
+
+def get_index() -> PerceptualHashIndex:
+    """Return the process-wide pHash index."""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = PerceptualHashIndex()
+        return _default_index
+
+
+def check_duplicates(image_path: str, image_hash: Optional[str] = None,
+                     form_data: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Look up an image in the pHash index before running the full pipeline.
+
+    Earlier submissions of the same image by the same person (same hashed name
+    and ID number) are listed but do not flag the image as recycled.
+
+    Args:
+        image_path: Path to the uploaded ID card image
+        image_hash: SHA-256 of the image file; results are only reused from an
+            entry with the same hash
+        form_data: Dictionary containing user submitted identity information
+
+    Returns:
+        Tuple of (stage result, stage results reusable from the identical image)
+    """
+    phash = compute_phash(image_path)
+    if phash is None:
+        return {"status": "error", "message": "Image could not be read"}, {}
+
+    matches = get_index().lookup(phash)
+    identity = identity_key(form_data or {})
+    result = {
+        "status": "success",
+        "phash": format(phash, "016x"),
+        "matches": [
+            {
+                "verification_id": entry["verification_id"],
+                "decision": entry["decision"],
+                "distance": distance,
+                "same_identity": identity is not None and entry.get("identity") == identity
+            }
+            for distance, entry in matches[:5]
+        ],
+        "message": "No previously verified near-duplicate found."
+    }
+
+    denied = [entry for _, entry in matches if entry.get("decision") == "deny"]
+    others = [entry for _, entry in matches if identity is None or entry.get("identity") != identity]
+    if denied:
+        result["status"] = "fail"
+        result["message"] = "Image is a near-duplicate of a previously denied document."
+    elif others:
+        result["status"] = "flag for review"
+        result["message"] = "Image was previously submitted in another verification under a different identity."
+    elif matches:
+        result["message"] = "Image was previously submitted by the same person."
+
+    reusable = {}
+    identical = next((entry for _, entry in matches if image_hash and entry.get("image_hash") == image_hash), None)
+    if identical is not None:
+        for stage, stage_result in identical.get("results", {}).items():
+            reusable[stage] = dict(stage_result, reused_from=identical["verification_id"])
+
+    return result, reusable
+
+
+def record_verification(phash: str, verification_id: str, decision: str,
+                        results: Dict[str, Any], image_hash: Optional[str] = None,
+                        form_data: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Add a completed verification to the pHash index.
+
+    Args:
+        phash: Hex hash reported by the duplicate check
+        verification_id: Identifier of the verification
+        decision: Final decision (accept/deny/flag for review)
+        results: Pipeline results of the verification
+        image_hash: SHA-256 of the image file
+        form_data: Dictionary containing user submitted identity information
+
+    Returns:
+        The stored entry
+    """
+    return get_index().add(int(phash, 16), verification_id, decision, results, image_hash,
+                           identity_key(form_data or {}))
@@ -0,0 +1,247 @@
+"""
+Opt-in per-request profiling.
+
+A verification is profiled when the request carries the admin profiling header
+(X-KYC-Profile with the KYC_PROFILE_TOKEN value) or is picked by the
+KYC_PROFILE_SAMPLE_RATE sample. A background thread then samples the stack of
+the thread running the pipeline, and tracemalloc snapshots taken between steps
+attribute allocations to each step. The artifacts are written under
+output/profiles keyed by verification id:
+
+    <verification_id>.collapsed   one "frame;frame;... count" line per stack (flamegraph.pl, speedscope)
+    <verification_id>.json        per-step duration, memory and top allocations
+
+Requests that are not profiled never construct a profiler, so the normal path
+pays nothing.
+"""
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from kyc_engine.shared import get_output_path
+
+logger = logging.getLogger(__name__)
+
+# Request header that asks for a profile; its value must equal PROFILE_TOKEN
+PROFILE_HEADER = "X-KYC-Profile"
+
+# Admin token enabling profiling through PROFILE_HEADER (unset disables the header)
+PROFILE_TOKEN = os.getenv("KYC_PROFILE_TOKEN")
+
+# Fraction of verifications profiled without the header (0 disables sampling)
+SAMPLE_RATE = float(os.getenv("KYC_PROFILE_SAMPLE_RATE", "0"))
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = float(os.getenv("KYC_PROFILE_INTERVAL", "0.005"))
+
+# Allocation sites reported per step and overall
+TOP_ALLOCATIONS = 10
+
+# tracemalloc is process-wide, so only one request is profiled at a time
+_active_lock = threading.Lock()
+
+
+def profile_path(verification_id: str, extension: str) -> str:
+    """Return the path of a profile artifact for a verification."""
+    name = "".join(c for c in verification_id if c.isalnum() or c in "-_")
+    return get_output_path(f"{name}.{extension}", "profiles")
+
+
+def has_profile_token(header_value: Optional[str]) -> bool:
+    """Return whether a PROFILE_HEADER value matches the configured admin token."""
+    return bool(header_value and PROFILE_TOKEN and hmac.compare_digest(header_value, PROFILE_TOKEN))
+
+
+def should_profile(header_value: Optional[str] = None) -> bool:
+    """
+    Decide whether a request is profiled.
+
+    Args:
+        header_value: Value of the PROFILE_HEADER request header, if any
+
+    Returns:
+        True for a matching admin token or a sampled request
+    """
+    if has_profile_token(header_value):
+        return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def _frame_label(code) -> str:
+    """Name a stack frame as function (file:line)."""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _snapshot():
+    """Take a tracemalloc snapshot without the profiler's own allocations."""
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+
+def _top_allocations(snapshot, baseline, limit: int = TOP_ALLOCATIONS) -> List[Dict[str, Any]]:
+    """Report the allocation sites that grew the most between two snapshots."""
+    stats = snapshot.compare_to(baseline, "lineno")
+    growth = [stat for stat in stats if stat.size_diff > 0]
+    growth.sort(key=lambda stat: stat.size_diff, reverse=True)
+    return [
+        {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_kib": round(stat.size_diff / 1024, 1),
+            "count": stat.count_diff
+        }
+        for stat in growth[:limit]
+    ]
+
+
+class RequestProfiler:
+    """
+    Stack sampler and per-step allocation tracker for one verification.
+
+    Call start() from the thread that runs the pipeline, step() as each
+    pipeline step begins, and finish() with the verification id at the end.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.active = False
+        self._stacks: Counter = Counter()
+        self._steps: List[Dict[str, Any]] = []
+        self._current: Optional[Dict[str, Any]] = None
+        self._label = "setup"
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._first_snapshot = None
+        self._last_snapshot = None
+        self._started_tracing = False
+
+    def start(self) -> bool:
+        """
+        Begin sampling the calling thread and tracing allocations.
+
+        Returns:
+            False (and the profiler stays inactive) if another request is being profiled
+        """
+        if not _active_lock.acquire(blocking=False):
+            logger.info("Profiling skipped: another request is being profiled")
+            return False
+        self.active = True
+        self._thread_id = threading.get_ident()
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        self._first_snapshot = self._last_snapshot = _snapshot()
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample_loop, name="kyc-profiler", daemon=True)
+        self._sampler.start()
+        return True
+
+    def _sample_loop(self) -> None:
+        """Record the profiled thread's stack every interval."""
+        current_frames = sys._current_frames
+        while not self._stop.wait(self.interval):
+            frame = current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(f"step:{self._label}")
+            self._stacks[";".join(reversed(stack))] += 1
+
+    def _close_step(self) -> None:
+        """Attribute the time and allocations since the last step boundary to the current step."""
+        if self._current is None:
+            return
+        duration = time.perf_counter() - self._current.pop("_started")
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = _snapshot()
+        self._current.update({
+            "duration_ms": round(duration * 1000, 1),
+            "traced_kib": round(current / 1024, 1),
+            "peak_kib": round(peak / 1024, 1),
+            "top_allocations": _top_allocations(snapshot, self._last_snapshot)
+        })
+        self._steps.append(self._current)
+        self._last_snapshot = snapshot
+        self._current = None
+
+    def step(self, name: str) -> None:
+        """Mark the start of a pipeline step (or the decision)."""
+        if not self.active:
+            return
+        self._close_step()
+        # Peak memory is reported per step
+        tracemalloc.reset_peak()
+        self._label = name
+        self._current = {"step": name, "_started": time.perf_counter()}
+
+    def finish(self, verification_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Stop profiling and write the artifacts.
+
+        Args:
+            verification_id: Identifier the artifacts are stored under
+
+        Returns:
+            The JSON report, or None if the profiler never started
+        """
+        if not self.active:
+            return None
+        try:
+            self._stop.set()
+            self._sampler.join()
+            self._close_step()
+            snapshot = _snapshot()
+            report = {
+                "verification_id": verification_id,
+                "created_at": time.time(),
+                "duration_ms": round((time.perf_counter() - self._started) * 1000, 1),
+                "sample_interval_ms": round(self.interval * 1000, 2),
+                "samples": sum(self._stacks.values()),
+                "steps": self._steps,
+                "top_allocations": _top_allocations(snapshot, self._first_snapshot)
+            }
+        finally:
+            if self._started_tracing:
+                tracemalloc.stop()
+            self.active = False
+            _active_lock.release()
+
+        with open(profile_path(verification_id, "collapsed"), "w", encoding="utf-8") as file:
+            for stack, count in self._stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        with open(profile_path(verification_id, "json"), "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=4)
+        logger.info("Profile written for verification %s: %d samples", verification_id, report["samples"])
+        return report
+
+
+def load_profile(verification_id: str, collapsed: bool = False) -> Optional[Any]:
+    """
+    Read a stored profile.
+
+    Args:
+        verification_id: Identifier of the profiled verification
+        collapsed: Return the collapsed stacks text instead of the JSON report
+
+    Returns:
+        Collapsed stacks text or report dict, or None if the verification was not profiled
+    """
+    path = profile_path(verification_id, "collapsed" if collapsed else "json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return file.read() if collapsed else json.load(file)
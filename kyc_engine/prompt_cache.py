@@ -0,0 +1,181 @@
+"""
+Provider-side context caching for the static prompt prefixes.
+
+The long instruction blocks (OCR, tampering, decision) never change between
+calls. They are registered once as Gemini cached content, refreshed before they
+expire, and requests then only carry the variable suffix. Whenever caching is
+unavailable (disabled, prompt below the provider's minimum size, API error) the
+caller simply sends the full prompt.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from kyc_engine.shared import GEMINI_API_KEY, GEMINI_MODEL
+
+logger = logging.getLogger(__name__)
+
+CACHE_API_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+# Use cached content for static prompt prefixes
+PROMPT_CACHE_ENABLED = os.getenv("KYC_PROMPT_CACHE", "1").lower() in ("1", "true", "yes")
+
+# Lifetime requested for each cached prefix
+CACHE_TTL_SECONDS = int(os.getenv("KYC_PROMPT_CACHE_TTL", "3600"))
+
+# Refresh a cached prefix when it has less than this many seconds left
+REFRESH_MARGIN_SECONDS = 300
+
+# Wait before retrying a prefix the provider refused to cache
+UNAVAILABLE_BACKOFF_SECONDS = 3600
+
+
+def _parse_expire_time(value: Optional[str]) -> Optional[float]:
+    """Parse an RFC 3339 expireTime returned by the API into a UNIX timestamp."""
+    if not value:
+        return None
+    try:
+        # Trim sub-second precision beyond what fromisoformat accepts
+        base, _, fraction = value.rstrip("Z").partition(".")
+        parsed = datetime.fromisoformat(base + "+00:00")
+        return parsed.timestamp() + (float("0." + fraction) if fraction else 0.0)
+    except ValueError:
+        return None
+
+
+class PromptCache:
+    """
+    Registry of cached prompt prefixes keyed by the prefix's hash.
+
+    Registration and refreshes run in background threads, so a lookup never
+    waits on the cache API: until a prefix is registered, callers get None and
+    send the full prompt.
+    """
+
+    def __init__(self, enabled: bool = PROMPT_CACHE_ENABLED, ttl: int = CACHE_TTL_SECONDS):
+        self.enabled = enabled and bool(GEMINI_API_KEY) and bool(GEMINI_MODEL)
+        self.ttl = ttl
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._unavailable_until: Dict[str, float] = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(prefix: str) -> str:
+        return hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+    def lookup(self, prefix: str) -> Optional[str]:
+        """
+        Get the cached content name for a prefix, scheduling registration if needed.
+
+        Args:
+            prefix: Static prompt prefix
+
+        Returns:
+            Cached content name (e.g. "cachedContents/abc") or None
+        """
+        if not self.enabled:
+            return None
+
+        key = self._key(prefix)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["expires_at"] <= now:
+                self._entries.pop(key, None)
+                entry = None
+
+            if entry is None:
+                if self._unavailable_until.get(key, 0) <= now:
+                    self._start(key, prefix, None)
+                return None
+
+            if entry["expires_at"] - now < REFRESH_MARGIN_SECONDS:
+                self._start(key, prefix, entry["name"])
+            return entry["name"]
+
+    def invalidate(self, prefix: str) -> None:
+        """
+        Forget a cached prefix, e.g. after the provider rejected it.
+
+        Args:
+            prefix: Static prompt prefix
+        """
+        with self._lock:
+            self._entries.pop(self._key(prefix), None)
+
+    def _start(self, key: str, prefix: str, name: Optional[str]) -> None:
+        """Start a background registration or refresh (called with the lock held)."""
+        if key in self._in_flight:
+            return
+        self._in_flight.add(key)
+        target = self._refresh if name else self._register
+        args = (key, name) if name else (key, prefix)
+        threading.Thread(target=target, args=args, name="kyc-prompt-cache", daemon=True).start()
+
+    def _store(self, key: str, data: Dict[str, Any]) -> None:
+        """Record a cached content resource returned by the API."""
+        expires_at = _parse_expire_time(data.get("expireTime")) or time.time() + self.ttl
+        with self._lock:
+            self._entries[key] = {"name": data["name"], "expires_at": expires_at}
+
+    def _register(self, key: str, prefix: str) -> None:
+        """Create cached content for a prefix."""
+        import requests
+
+        try:
+            response = requests.post(
+                f"{CACHE_API_URL}/cachedContents?key={GEMINI_API_KEY}",
+                json={
+                    "model": f"models/{GEMINI_MODEL}",
+                    "systemInstruction": {"parts": [{"text": prefix}]},
+                    "ttl": f"{self.ttl}s"
+                },
+                timeout=10
+            )
+            response.raise_for_status()
+            self._store(key, response.json())
+        except Exception as e:
+            logger.warning("Prompt caching unavailable, sending full prompts: %s", e)
+            with self._lock:
+                self._unavailable_until[key] = time.time() + UNAVAILABLE_BACKOFF_SECONDS
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def _refresh(self, key: str, name: str) -> None:
+        """Extend the TTL of existing cached content."""
+        import requests
+
+        try:
+            response = requests.patch(
+                f"{CACHE_API_URL}/{name}?updateMask=ttl&key={GEMINI_API_KEY}",
+                json={"ttl": f"{self.ttl}s"},
+                timeout=10
+            )
+            response.raise_for_status()
+            self._store(key, response.json())
+        except Exception as e:
+            logger.error("Error refreshing cached prompt %s: %s", name, e)
+            with self._lock:
+                self._entries.pop(key, None)
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+
+_default_cache: Optional[PromptCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_prompt_cache() -> PromptCache:
+    """Return the process-wide prompt cache."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PromptCache()
+        return _default_cache
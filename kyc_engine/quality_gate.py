@@ -0,0 +1,198 @@
+"""
+Image quality gate module.
+
+Runs before every other stage on a small decoded frame and rejects photos that
+cannot be verified (blurry, badly exposed, glare-washed, too small or without a
+card-shaped document), so they are sent back for recapture without spending any
+model requests.
+"""
+from typing import Dict, Any, List, Optional
+
+from kyc_engine.image_loading import image_size, load_image, reduction_for
+
+# Minimum long side of the upload in pixels
+MIN_LONG_SIDE = 600
+
+# Minimum variance of the Laplacian on the contrast-stretched analysis frame (lower is blurrier)
+MIN_SHARPNESS = 75.0
+
+# Accepted range of the mean brightness (0-255)
+MIN_BRIGHTNESS = 40.0
+MAX_BRIGHTNESS = 225.0
+
+# Pixels at or above this value count as clipped highlights
+CLIPPED_LEVEL = 250
+
+# Largest clipped blob not touching the frame border, as a fraction of the frame
+MAX_GLARE_FRACTION = 0.02
+
+# Smallest quadrilateral accepted as the card outline, as a fraction of the frame
+MIN_CARD_AREA = 0.2
+
+# Aspect ratios (long side / short side) of a frame cropped to a card or passport page
+CARD_ASPECT_RANGE = (1.3, 1.9)
+
+# Width of the band along the frame border, as a fraction of the short side
+BORDER_BAND = 0.03
+
+# Largest fraction of edge pixels in the border band for the frame itself to count as the card
+# outline (nothing in the picture is cut off by the frame)
+MAX_BORDER_EDGES = 0.01
+
+# Long side of the analysis frame
+FRAME_SIDE = 640
+
+
+def _find_card(edges) -> Optional[float]:
+    """
+    Find the largest four-sided contour in an edge map.
+
+    Args:
+        edges: Canny edge map of the grayscale frame
+
+    Returns:
+        Area of the largest quadrilateral as a fraction of the frame, or None
+    """
+    import cv2
+
+    contours, _ = cv2.findContours(cv2.dilate(edges, None), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    frame_area = float(edges.shape[0] * edges.shape[1])
+    best = None
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            area = cv2.contourArea(approx) / frame_area
+            best = max(best or 0.0, area)
+    return best
+
+
+def _border_edges(edges) -> float:
+    """
+    Measure how much of the picture is cut off by the frame.
+
+    A photo cropped to the card has the card's plain margin along every side,
+    so the card outline is the frame itself and cannot be found as a contour.
+    Any other picture has objects or texture crossing the frame border.
+
+    Args:
+        edges: Canny edge map of the grayscale frame
+
+    Returns:
+        Fraction of edge pixels in the band along the frame border
+    """
+    import numpy as np
+
+    band = max(2, int(round(BORDER_BAND * min(edges.shape))))
+    border = np.ones(edges.shape, dtype=bool)
+    border[band:-band, band:-band] = False
+    return float(np.count_nonzero(edges[border]) / np.count_nonzero(border))
+
+
+def _glare_fraction(gray) -> float:
+    """
+    Measure the largest clipped-highlight blob that does not touch the frame border.
+
+    Blobs touching the border are treated as background (e.g. a white scanner bed).
+
+    Args:
+        gray: Grayscale frame
+
+    Returns:
+        Blob area as a fraction of the frame
+    """
+    import cv2
+    import numpy as np
+
+    clipped = (gray >= CLIPPED_LEVEL).astype(np.uint8)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(clipped, connectivity=8)
+    h, w = gray.shape
+    largest = 0
+    for label in range(1, count):
+        x, y, bw, bh, area = stats[label]
+        if x == 0 or y == 0 or x + bw == w or y + bh == h:
+            continue
+        largest = max(largest, int(area))
+    return largest / float(h * w)
+
+
+def quality_check(image_path: str) -> Dict[str, Any]:
+    """
+    Check whether an upload is good enough to be verified.
+
+    Args:
+        image_path: Path to the uploaded ID card image
+
+    Returns:
+        Dictionary with status ("success" or "fail"), the measured values, the
+        list of problems found, a recapture flag and a message
+    """
+    import cv2
+    import numpy as np
+
+    size = image_size(image_path)
+    if size is None:
+        return {"status": "fail", "recapture": True, "issues": ["unreadable"],
+                "message": "The uploaded file could not be read as an image."}
+
+    gray = load_image(image_path, reduction_for("quality", image_path, size), grayscale=True)
+    if gray is None:
+        return {"status": "fail", "recapture": True, "issues": ["unreadable"],
+                "message": "The uploaded file could not be read as an image."}
+    factor = FRAME_SIDE / float(max(gray.shape))
+    if factor < 1.0:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+
+    # Stretch contrast first so dark or flat exposures are not mistaken for blur
+    low, high = np.percentile(gray, (1, 99))
+    stretched = np.clip((gray - low) * (255.0 / max(high - low, 1.0)), 0, 255)
+    sharpness = float(cv2.Laplacian(stretched, cv2.CV_64F).var())
+    brightness = float(np.mean(gray))
+    glare = _glare_fraction(gray)
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+    card_area = _find_card(edges)
+    border_edges = _border_edges(edges)
+    aspect = max(size) / float(min(size))
+
+    issues: List[str] = []
+    if max(size) < MIN_LONG_SIDE:
+        issues.append(f"resolution too low ({size[0]}x{size[1]})")
+    if sharpness < MIN_SHARPNESS:
+        issues.append("image is blurry")
+    if brightness < MIN_BRIGHTNESS:
+        issues.append("image is too dark")
+    elif brightness > MAX_BRIGHTNESS:
+        issues.append("image is overexposed")
+    if glare > MAX_GLARE_FRACTION:
+        issues.append("glare covers part of the document")
+    # Without an outline, only a frame cropped to the card itself is accepted, by its shape
+    cropped_to_card = border_edges <= MAX_BORDER_EDGES and CARD_ASPECT_RANGE[0] <= aspect <= CARD_ASPECT_RANGE[1]
+    card_found = (card_area is not None and card_area >= MIN_CARD_AREA) or cropped_to_card
+    if not card_found:
+        issues.append("no card-shaped document detected")
+
+    result = {
+        "status": "fail" if issues else "success",
+        "recapture": bool(issues),
+        "details": {
+            "width": size[0],
+            "height": size[1],
+            "sharpness": round(sharpness, 1),
+            "brightness": round(brightness, 1),
+            "glare_fraction": round(glare, 4),
+            "card_area": round(card_area, 3) if card_area is not None else None,
+            "border_edges": round(border_edges, 4)
+        },
+        "issues": issues
+    }
+    if issues:
+        result["message"] = "Please retake the photo: " + "; ".join(issues) + "."
+    else:
+        result["message"] = "Image quality is sufficient for verification."
+    return result
+
+
+if __name__ == "__main__":
+    # Example test case
+    test_image = r"C:\Users\nazguul\Desktop\PFE_Workplace\Resources\ID Cards\new_york_fake_id-scaled-e1601065688702-1600x1029.jpg"
+    print(quality_check(test_image))
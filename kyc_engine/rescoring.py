@@ -0,0 +1,259 @@
+"""
+Offline re-scoring of stored verifications.
+
+Every verification stores the raw ELA and pixel-level metrics as a compact
+float32 feature vector. This module re-applies a candidate threshold
+configuration to the whole corpus in one vectorized NumPy pass and reports
+how the ELA and forensic verdicts would change, as confusion matrices against
+the recorded decisions or reviewer labels:
+
+    python -m kyc_engine.rescoring --thresholds candidate.json --labels reviewed.csv
+"""
+import argparse
+import array
+import csv
+import json
+import math
+from typing import Dict, Any, Iterable, List, Optional
+
+# Order of the values in a stored feature vector
+FEATURE_NAMES = (
+    "ela_error_level",
+    "edge_strength",
+    "noise_level",
+    "cloning_score",
+    "artifact_score",
+    "edge_noise_reduction",
+)
+
+# Verdict classes, in confusion-matrix order
+VERDICTS = ("success", "flag for review", "fail")
+
+# Decisions and reviewer labels mapped onto the verdict classes
+LABEL_CLASSES = {
+    "accept": 0, "success": 0, "genuine": 0,
+    "flag for review": 1, "flag": 1, "review": 1,
+    "deny": 2, "fail": 2, "tampered": 2,
+}
+
+
+def feature_vector(pipeline_results: Dict[str, Any]) -> Optional[bytes]:
+    """
+    Pack the raw ELA and pixel-level metrics of a verification.
+
+    Args:
+        pipeline_results: Results from all verification steps
+
+    Returns:
+        float32 vector in FEATURE_NAMES order as bytes (NaN for missing
+        metrics), or None if neither stage produced metrics
+    """
+    ela = pipeline_results.get("ELA") or {}
+    forensics = pipeline_results.get("Forensics") or {}
+    details = forensics.get("details") or {}
+    if "error_level" not in ela and not details:
+        return None
+
+    # Unrounded metrics; results stored before they were kept fall back to the rounded details
+    metrics = forensics.get("metrics") or {}
+    reduction = str(details.get("edge_noise_scale", "1/1")).partition("/")[2]
+    values = [
+        ela.get("error_level"),
+        metrics.get("edge", details.get("edge_strength")),
+        metrics.get("noise", details.get("noise_level")),
+        metrics.get("clone", details.get("cloning_score")),
+        metrics.get("artifact", details.get("artifact_score")),
+        float(reduction) if reduction else 1.0,
+    ]
+    return array.array("f", [math.nan if v is None else float(v) for v in values]).tobytes()
+
+
+def decode_features(blobs: Iterable[bytes]):
+    """
+    Unpack stored feature vectors into one matrix.
+
+    Args:
+        blobs: Packed vectors from feature_vector(); vectors of another length
+            (written by a different FEATURE_NAMES) must be filtered out first
+
+    Returns:
+        float32 array of shape (n, len(FEATURE_NAMES))
+    """
+    import numpy as np
+
+    data = b"".join(blobs)
+    return np.frombuffer(data, dtype=np.float32).reshape(-1, len(FEATURE_NAMES))
+
+
+def score_ela(features, config: Dict[str, Any]):
+    """
+    Re-apply the ELA cutoffs to every row.
+
+    Args:
+        features: Matrix from decode_features()
+        config: Threshold configuration (see thresholds.DEFAULT_THRESHOLDS)
+
+    Returns:
+        int8 array of verdict indexes into VERDICTS, -1 where the metric is missing
+    """
+    import numpy as np
+
+    level = features[:, FEATURE_NAMES.index("ela_error_level")]
+    cutoffs = config["ela"]
+    verdict = np.select([level < cutoffs["flag_level"], level < cutoffs["fail_level"]], [0, 1], 2)
+    return np.where(np.isnan(level), -1, verdict).astype(np.int8)
+
+
+def score_forensics(features, config: Dict[str, Any]):
+    """
+    Re-apply the pixel-level thresholds and weights to every row.
+
+    Mirrors image_forensics.pixel_level_check(), including the scale factors
+    for edge and noise statistics measured on reduced decodes.
+
+    Args:
+        features: Matrix from decode_features()
+        config: Threshold configuration (see thresholds.DEFAULT_THRESHOLDS)
+
+    Returns:
+        Tuple of (combined scores, int8 verdict indexes, -1 where metrics are missing)
+    """
+    import numpy as np
+    from kyc_engine.image_forensics import SCALE_FACTORS
+
+    forensics = config["forensics"]
+    columns = {
+        "clone": FEATURE_NAMES.index("cloning_score"),
+        "noise": FEATURE_NAMES.index("noise_level"),
+        "edge": FEATURE_NAMES.index("edge_strength"),
+        "artifact": FEATURE_NAMES.index("artifact_score"),
+    }
+    reduction = features[:, FEATURE_NAMES.index("edge_noise_reduction")]
+
+    score = np.zeros(len(features), dtype=np.float64)
+    for key, weight in forensics["weights"].items():
+        threshold = np.full(len(features), forensics["thresholds"][key], dtype=np.float64)
+        for scale, factor in SCALE_FACTORS.get(key, {}).items():
+            threshold[reduction == scale] *= factor
+        score += np.maximum(0.0, (features[:, columns[key]] - threshold) * weight)
+
+    verdict = np.select([score >= forensics["fail_score"], score >= forensics["flag_score"]], [2, 1], 0)
+    missing = np.isnan(features[:, [columns[key] for key in forensics["weights"]]]).any(axis=1)
+    return score, np.where(missing, -1, verdict).astype(np.int8)
+
+
+def confusion_matrix(labels, predictions):
+    """
+    Count label/prediction pairs over the three verdict classes.
+
+    Args:
+        labels: Label class indexes (-1 rows are ignored)
+        predictions: Predicted class indexes (-1 rows are ignored)
+
+    Returns:
+        3x3 int array with labels as rows and predictions as columns
+    """
+    import numpy as np
+
+    valid = (labels >= 0) & (predictions >= 0)
+    pairs = labels[valid].astype(np.int64) * len(VERDICTS) + predictions[valid]
+    return np.bincount(pairs, minlength=len(VERDICTS) ** 2).reshape(len(VERDICTS), len(VERDICTS))
+
+
+def load_labels(path: str) -> Dict[str, str]:
+    """
+    Read reviewer labels from a CSV file with verification_id and label columns.
+
+    Args:
+        path: Path of the CSV file
+
+    Returns:
+        Dictionary mapping verification ids to labels
+    """
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        return {row["verification_id"]: row["label"].strip().lower() for row in csv.DictReader(file)}
+
+
+def rescore(batches: Iterable[List[tuple]], candidate: Dict[str, Any], current: Dict[str, Any],
+            labels: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Score a corpus of stored feature vectors with the current and candidate thresholds.
+
+    Args:
+        batches: Batches of (verification_id, decision, packed features) rows,
+            e.g. from ResultStore.iter_features()
+        candidate: Threshold configuration to evaluate
+        current: Threshold configuration in use, for comparison
+        labels: Optional reviewer labels by verification id; the recorded
+            decision is used for verifications without one
+
+    Returns:
+        Dictionary with the corpus size and, per stage, the confusion matrices
+        under both configurations and the number of changed verdicts
+    """
+    import numpy as np
+
+    row_bytes = len(FEATURE_NAMES) * 4
+    blobs: List[bytes] = []
+    label_classes: List[int] = []
+    skipped = 0
+    for batch in batches:
+        for verification_id, decision, blob in batch:
+            if blob is None or len(blob) != row_bytes:
+                skipped += 1
+                continue
+            label = (labels or {}).get(verification_id) or (decision or "").lower()
+            blobs.append(blob)
+            label_classes.append(LABEL_CLASSES.get(label, -1))
+
+    features = decode_features(blobs)
+    label_array = np.array(label_classes, dtype=np.int8)
+
+    report: Dict[str, Any] = {"verifications": len(blobs), "skipped": skipped, "stages": {}}
+    for stage, scorer in (("ela", score_ela), ("forensics", lambda f, c: score_forensics(f, c)[1])):
+        before = scorer(features, current)
+        after = scorer(features, candidate)
+        report["stages"][stage] = {
+            "current": confusion_matrix(label_array, before).tolist(),
+            "candidate": confusion_matrix(label_array, after).tolist(),
+            "changed": int(np.count_nonzero((before != after) & (after >= 0)))
+        }
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Render a rescore() report as plain-text confusion matrices."""
+    short = ("success", "flag", "fail")
+    lines = [f"Verifications: {report['verifications']} (skipped {report['skipped']} without usable features)"]
+    for stage, result in report["stages"].items():
+        lines.append("")
+        lines.append(f"{stage.upper()}  (rows: label, columns: verdict; {result['changed']} verdicts changed)")
+        for name in ("current", "candidate"):
+            lines.append(f"  {name}:")
+            lines.append("    " + " " * 10 + "".join(f"{label:>10}" for label in short))
+            for label, row in zip(short, result[name]):
+                lines.append("    " + f"{label:<10}" + "".join(f"{count:>10}" for count in row))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from kyc_engine.result_store import ResultStore
+    from kyc_engine.thresholds import get_thresholds, load_thresholds
+
+    parser = argparse.ArgumentParser(description="Re-score stored verifications against candidate thresholds")
+    parser.add_argument("--thresholds", help="JSON file with the candidate thresholds (default: built-in defaults)")
+    parser.add_argument("--labels", help="CSV file with verification_id,label columns (default: recorded decisions)")
+    parser.add_argument("--db", help="Result store path (default: KYC_RESULT_STORE or output/store/verifications.db)")
+    parser.add_argument("--since", type=float, default=0.0, help="Only verifications created at or after this UNIX time")
+    parser.add_argument("--until", type=float, default=float("inf"), help="Only verifications created before this UNIX time")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+    result = rescore(
+        store.iter_features(args.since, args.until),
+        candidate=load_thresholds(args.thresholds),
+        current=get_thresholds(),
+        labels=load_labels(args.labels) if args.labels else None
+    )
+    print(json.dumps(result, indent=4) if args.json else format_report(result))
@@ -0,0 +1,327 @@
+"""
+Persistent verification result store.
+
+Each finished verification is written to an embedded SQLite database by a
+background writer thread, so the request path only enqueues a record. Indexes on
+decision, timestamp and image hash back the audit and cache-reuse queries.
+"""
+import array
+import atexit
+import contextlib
+import json
+import logging
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional
+
+from kyc_engine.shared import get_output_path
+
+logger = logging.getLogger(__name__)
+
+# Records written per transaction
+BATCH_SIZE = 50
+
+# Maximum seconds a record waits in the queue before being written
+FLUSH_INTERVAL = 1.0
+
+# Records kept in memory while the writer catches up; extra records are dropped
+MAX_PENDING = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verifications (
+    verification_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    decision TEXT,
+    image_hash TEXT,
+    phash TEXT,
+    duration_ms REAL,
+    stage_timings TEXT,
+    stage_results TEXT,
+    decision_result TEXT,
+    features BLOB,
+    provisional INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_verifications_decision ON verifications (decision, created_at);
+CREATE INDEX IF NOT EXISTS idx_verifications_created_at ON verifications (created_at);
+CREATE INDEX IF NOT EXISTS idx_verifications_image_hash ON verifications (image_hash);
+"""
+
+# Columns added after the first release, created on older databases at startup
+ADDED_COLUMNS = {
+    "features": "BLOB",
+    "provisional": "INTEGER NOT NULL DEFAULT 0"
+}
+
+# Indexes on added columns, created once the columns exist
+ADDED_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_verifications_provisional ON verifications (provisional, created_at);
+"""
+
+COLUMNS = (
+    "verification_id", "created_at", "decision", "image_hash", "phash",
+    "duration_ms", "stage_timings", "stage_results", "decision_result", "features", "provisional"
+)
+
+JSON_COLUMNS = ("stage_timings", "stage_results", "decision_result")
+
+
+class ResultStore:
+    """
+    SQLite-backed store of verification results with a batched background writer.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("KYC_RESULT_STORE") or get_output_path("verifications.db", "store")
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=MAX_PENDING)
+        self._local = threading.local()
+
+        # The connection's own context manager only commits; closing() also closes it
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(verifications)")}
+            for column, definition in ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE verifications ADD COLUMN {column} {definition}")
+            conn.executescript(ADDED_INDEXES)
+
+        self._writer = threading.Thread(target=self._write_loop, name="kyc-result-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection configured for concurrent readers and one writer."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """Return the calling thread's read connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """
+        Queue a verification record for writing without blocking.
+
+        Args:
+            record: Verification record (see COLUMNS); JSON columns may be dicts
+
+        Returns:
+            True if the record was queued, False if the queue was full
+        """
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """
+        Block until every queued record has been written.
+
+        Args:
+            timeout: Maximum seconds to wait
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self) -> None:
+        """Write the remaining records and stop the writer thread."""
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+
+    def _write_loop(self) -> None:
+        """Run the writer thread over one connection, closed when the thread stops."""
+        with contextlib.closing(self._connect()) as conn:
+            self._write_batches(conn)
+
+    def _write_batches(self, conn: sqlite3.Connection) -> None:
+        """Collect queued records into batches and write each in one transaction until close() is called."""
+        running = True
+        while running:
+            batch = []
+            item = self._queue.get()
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while True:
+                if item is None:
+                    running = False
+                    self._queue.task_done()
+                else:
+                    batch.append(item)
+                if not running or len(batch) >= BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self._write_batch(conn, batch)
+                except Exception as e:
+                    logger.error("Error writing %d verification results: %s", len(batch), e)
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch: List[Dict[str, Any]]) -> None:
+        """Insert or replace a batch of records."""
+        rows = []
+        for record in batch:
+            row = []
+            for column in COLUMNS:
+                value = record.get(column)
+                if column == "provisional":
+                    value = int(bool(value))
+                elif column in JSON_COLUMNS and value is not None and not isinstance(value, str):
+                    value = json.dumps(value, default=str)
+                row.append(value)
+            rows.append(row)
+
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO verifications ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                rows
+            )
+
+    def _query(self, where: str, params: tuple, limit: int) -> List[Dict[str, Any]]:
+        """Run a SELECT over the verifications table and decode JSON columns."""
+        rows = self._reader().execute(
+            f"SELECT * FROM verifications WHERE {where} ORDER BY created_at DESC LIMIT ?",
+            params + (limit,)
+        ).fetchall()
+
+        records = []
+        for row in rows:
+            record = dict(row)
+            for column in JSON_COLUMNS:
+                if record.get(column):
+                    try:
+                        record[column] = json.loads(record[column])
+                    except json.JSONDecodeError:
+                        pass
+            if record.get("features") is not None:
+                # Packed float32 vector (see rescoring.FEATURE_NAMES); NaN marks a missing metric
+                values = array.array("f", record["features"])
+                record["features"] = [None if math.isnan(v) else round(v, 4) for v in values]
+            record["provisional"] = bool(record.get("provisional"))
+            records.append(record)
+        return records
+
+    def iter_features(self, since: float = 0.0, until: float = float("inf"),
+                      batch_size: int = 5000) -> Iterator[List[tuple]]:
+        """
+        Stream the stored feature vectors of a time range in batches.
+
+        Args:
+            since: Range start as UNIX time (inclusive)
+            until: Range end as UNIX time (exclusive)
+            batch_size: Rows fetched per batch
+
+        Yields:
+            Lists of (verification_id, decision, packed features) tuples
+        """
+        with contextlib.closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "SELECT verification_id, decision, features FROM verifications "
+                "WHERE features IS NOT NULL AND created_at >= ? AND created_at < ?",
+                (since, until)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [tuple(row) for row in rows]
+
+    def get(self, verification_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch one verification by id.
+
+        Args:
+            verification_id: Identifier of the verification
+
+        Returns:
+            Verification record or None
+        """
+        records = self._query("verification_id = ?", (verification_id,), 1)
+        return records[0] if records else None
+
+    def find_by_decision(self, decision: str, since: float = 0.0, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Fetch the most recent verifications with a given decision.
+
+        Args:
+            decision: Decision to filter on (accept/deny/flag for review)
+            since: Only include verifications created at or after this UNIX time
+            limit: Maximum number of records
+
+        Returns:
+            List of verification records, newest first
+        """
+        return self._query("decision = ? AND created_at >= ?", (decision, since), limit)
+
+    def find_provisional(self, since: float = 0.0, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Fetch verifications decided locally while the model was unavailable.
+
+        Args:
+            since: Only include verifications created at or after this UNIX time
+            limit: Maximum number of records
+
+        Returns:
+            List of provisional verification records, newest first
+        """
+        return self._query("provisional = 1 AND created_at >= ?", (since,), limit)
+
+    def find_by_hash(self, image_hash: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Fetch previous verifications of the exact same image.
+
+        Args:
+            image_hash: SHA-256 of the image file
+            limit: Maximum number of records
+
+        Returns:
+            List of verification records, newest first
+        """
+        return self._query("image_hash = ?", (image_hash,), limit)
+
+    def find_between(self, start: float, end: float, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Fetch verifications created within a time range.
+
+        Args:
+            start: Range start as UNIX time (inclusive)
+            end: Range end as UNIX time (exclusive)
+            limit: Maximum number of records
+
+        Returns:
+            List of verification records, newest first
+        """
+        return self._query("created_at >= ? AND created_at < ?", (start, end), limit)
+
+
+_default_store: Optional[ResultStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_store() -> ResultStore:
+    """Return the process-wide result store, creating it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ResultStore()
+            atexit.register(_default_store.close)
+        return _default_store
@@ -1,19 +1,35 @@
 import base64
 import json
+import logging
 import os
 import time
-from typing import Optional, Dict, Any
+from json.decoder import scanstring
+from typing import Optional, Dict, Any, Sequence
 
-import requests
 from dotenv import load_dotenv
 
+from kyc_engine.circuit_breaker import ModelUnavailable, get_breaker
+
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # API configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL")
 GEMINI_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+GEMINI_STREAM_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}"
+
+# Stream the decision response and stop reading once the decision field is complete;
+# opt-in, since the reason is then cut off or missing
+STREAMING_DECISION = os.getenv("KYC_STREAMING_DECISION", "").lower() in ("1", "true", "yes")
+
+# Send OCR and metadata analysis to the model in one request instead of two
+CONSOLIDATED_MODEL_CALL = os.getenv("KYC_CONSOLIDATED_MODEL_CALL", "").lower() in ("1", "true", "yes")
+
+# Seconds to wait for the model endpoint to connect or send data
+MODEL_TIMEOUT = float(os.getenv("KYC_MODEL_TIMEOUT", "30"))
 
 # Output directory configuration
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output")
@@ -117,6 +133,37 @@ Return the result strictly in the following JSON structure (with no extra commen
 """
 
 
+# --------------------------------------------------------------------
+# Extraction-only prompt for images uploaded before the form is complete;
+# the extracted fields are compared with the form locally (ocr_check.compare_fields)
+GLOBAL_EXTRACTION_PROMPT = """
+You are an ADVANCED AI specialized in ID card information extraction. You are provided with an image of an ID card. Your only task is to EXTRACT information from the ID card image exactly as it appears; no form data is provided and you must not compare anything.
+
+It is imperative that the image is of an ID card. If it is not, set status to "fail" and include the message: "no id card recognized."
+
+Instructions:
+
+1. **Full Name:** Extract the full name as printed on the card.
+2. **Date of Birth (DOB):** Extract the date of birth as printed on the card, keeping its original format.
+3. **Nationality:** Identify the nationality from a nationality field, a country name or emblem, or the type/design of the card. Use "not found" if it cannot be determined.
+4. **ID Number:** Extract the ID number, document number or similar identifier. Use "not found" if there is none.
+
+**Output:**
+
+Return the result strictly in the following JSON structure (with no extra commentary):
+
+{
+  "status": "success | fail",
+  "extracted": {
+    "full_name": "<extracted value> | not found",
+    "dob": "<extracted value> | not found",
+    "nationality": "<extracted value> | not found",
+    "id_number": "<extracted value> | not found"
+  },
+  "message": "<Explanation of any issues found>"
+}
+"""
+
 # --------------------------------------------------------------------
 # Global prompt for metadata analyze
 GLOBAL_TAMPERING_PROMPT = """
@@ -151,6 +198,19 @@ Complete Metadata:
 {metadata}
 """
 # --------------------------------------------------------------------
+# Global prompt for the consolidated OCR + metadata request
+GLOBAL_COMBINED_PROMPT = """
+You are performing two independent checks on the same ID card submission and must answer both in a single JSON response.
+
+=== PART A: ID CARD EXTRACTION (result goes under the "OCR" key) ===
+{ocr_instructions}
+
+=== PART B: METADATA ANALYSIS (result goes under the "Metadata" key) ===
+{tampering_instructions}
+
+Respond strictly with one JSON object of the form {{"OCR": <Part A result>, "Metadata": <Part B result>}} and no extra commentary.
+"""
+# --------------------------------------------------------------------
 GLOBAL_DECISION_PROMPT = """
 You are an elite AI designed for strict data analysis and decisive judgment in ID verification. Your task is to evaluate results from multiple verification layers and determine if an ID is authentic.
 
@@ -158,7 +218,10 @@ Priority ranking for verification layers (highest to lowest):
 1. OCR Verification (Critical - if it fails, the verification should generally fail)
 2. ELA Check (Error Level Analysis) (Very High priority - strong evidence of tampering)
 3. Image Forensics Check (High priority - pixel-level evidence of manipulation)
-4. Metadata Verification (Medium priority - supplementary evidence)
+4. JPEG Structure Check (High priority - quantization tables and DCT coefficient statistics read from the JPEG bitstream)
+5. Face Check (High priority - the ID portrait compared with faces from previous verifications)
+6. Metadata Verification (Medium priority - supplementary evidence)
+7. Duplicate Check (Perceptual-hash lookup - decisive only when it matches a previously denied document)
 
 ### RULES:
 1. **OCR is the MOST CRITICAL check:**
@@ -168,12 +231,21 @@ Priority ranking for verification layers (highest to lowest):
 2. **ELA and Image Forensics are CRUCIAL for detecting tampering:**
    - If both ELA and Forensics indicate tampering (status="fail"), the decision should be "deny" regardless of OCR
    - If either shows signs of manipulation, this should heavily influence the decision
+   - A JPEG status of "fail" (e.g. double compression together with a shifted 8x8 grid) corroborates ELA and Forensics findings; double compression alone is common for images re-saved by phones and messaging apps and only warrants "flag for review"
+   - Localization fuses the ELA, artifact, noise and clone maps per region of the document; regions it reports (e.g. over the name or the portrait) show where the other checks agree on an edit and strengthen their findings, but a flagged region alone only warrants "flag for review"
 
 3. **Metadata is SUPPORTIVE but not decisive:**
    - Metadata issues alone should not result in denial unless extremely suspicious
    - Missing metadata fields are common and not necessarily suspicious
+   - A step with status "skipped" and "shed": true was dropped because the service was under load; treat it as not run, never as a finding either way
 
-4. **Your output must follow this exact JSON format:**
+4. **Duplicate and Face checks detect recycled documents and identities:**
+   - If Duplicate status is "fail", the image is a near-duplicate of a document that was already denied, and the decision should be "deny"
+   - If Duplicate status is "flag for review", the same image was used in an earlier verification; weigh this as suspicious
+   - If Face status is "fail", the same face was used under another identity in a denied verification and the decision should be "deny"
+   - If Face status is "flag for review", the same face appears under a different name or ID number; the decision should not be "accept"
+
+5. **Your output must follow this exact JSON format:**
 
 {{
   "decision": "<accept/deny/flag for review>",
@@ -197,7 +269,7 @@ def parse_json(input_str: str) -> Optional[Dict[str, Any]]:
     end = input_str.rfind('}') + 1
     
     if start == -1 or end == 0:
-        print("No JSON content found in string")
+        logger.warning("No JSON content found in model response")
         return None
         
     json_content = input_str[start:end]
@@ -206,65 +278,273 @@ def parse_json(input_str: str) -> Optional[Dict[str, Any]]:
         parsed_json = json.loads(json_content)
         return parsed_json
     except json.JSONDecodeError as e:
-        print(f"Error parsing JSON: {e}")
+        logger.warning("Error parsing JSON from model response: %s", e)
         return None
 
 
-def encode_image(img_path: str) -> Optional[str]:
+class StreamingJSONParser:
+    """Incrementally parse the top-level fields of a JSON object received in chunks.
+
+    Each top-level value is decoded as soon as it is complete, so callers can act
+    on the leading fields of a response before the rest has been generated.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self.partial: Optional[tuple] = None
+        self.done = False
+        self._pos: Optional[int] = None
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """Add a chunk of response text and decode any newly completed fields.
+
+        Args:
+            chunk: Next piece of the response text
+
+        Returns:
+            All top-level fields decoded so far
+        """
+        self.text += chunk
+        if self._pos is None:
+            start = self.text.find("{")
+            if start == -1:
+                return self.fields
+            self._pos = start + 1
+
+        while not self.done and self._next_field():
+            pass
+        return self.fields
+
+    def _skip(self, pos: int, chars: str = " \t\r\n") -> int:
+        while pos < len(self.text) and self.text[pos] in chars:
+            pos += 1
+        return pos
+
+    def _next_field(self) -> bool:
+        """Decode the next complete key/value pair, returning False when more text is needed."""
+        text = self.text
+        pos = self._skip(self._pos, " \t\r\n,")
+        if pos >= len(text):
+            return False
+        if text[pos] != '"':
+            # End of the object (or output that is not a JSON object)
+            self.done = True
+            return False
+
+        try:
+            key, pos = scanstring(text, pos + 1)
+        except ValueError:
+            return False
+        pos = self._skip(pos)
+        if pos >= len(text):
+            return False
+        if text[pos] != ":":
+            self.done = True
+            return False
+        pos = self._skip(pos + 1)
+        if pos >= len(text):
+            return False
+
+        try:
+            value, end = self._decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            if text[pos] == '"':
+                self.partial = (key, self._partial_string(pos + 1))
+            return False
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and (
+                end == len(text) or text[end] in ".eE+-0123456789"):
+            # A number at the end of the buffer may still have digits coming
+            return False
+
+        self.fields[key] = value
+        self.partial = None
+        self._pos = end
+        return True
+
+    def _partial_string(self, start: int) -> str:
+        """Decode the received part of an unterminated string value."""
+        raw = self.text[start:]
+        # Drop an escape sequence cut off at the end of the buffer
+        for trim in range(min(len(raw), 6) + 1):
+            try:
+                return json.loads('"' + raw[:len(raw) - trim] + '"')
+            except json.JSONDecodeError:
+                continue
+        return ""
+
+
+def encode_image(img_path: str, min_side: Optional[int] = None) -> Optional[str]:
     """Encode an image file to a Base64 string.
     
     Args:
         img_path: Path to the image file
+        min_side: Optional minimum long side in pixels; larger JPEGs are
+            draft-decoded at 1/2, 1/4 or 1/8 scale before encoding
         
     Returns:
         Base64 encoded string or None if encoding failed
     """
     try:
+        if min_side:
+            from kyc_engine.image_loading import encode_for_upload
+            data, _ = encode_for_upload(img_path, min_side)
+            return base64.b64encode(data).decode("utf-8")
         with open(img_path, "rb") as file:
             return base64.b64encode(file.read()).decode("utf-8")
     except Exception as e:
-        print(f"Error encoding image: {e}")
+        logger.error("Error encoding image: %s", e)
         return None
 
 
 def api_call(endpoint: str, prompt_text: str, img_path: str = None, 
-             retries: int = 3, delay: int = 2) -> str:
+             retries: int = 3, delay: int = 2,
+             generation_config: Optional[Dict[str, Any]] = None,
+             cached_prefix: Optional[str] = None,
+             suffix_text: Optional[str] = None,
+             required_fields: Optional[Sequence[str]] = None,
+             image_min_side: Optional[int] = None) -> str:
     """Handle API calls with retry logic for both text-only and text-with-image requests.
     
+    When cached_prefix is given and the provider has it cached, only suffix_text
+    is sent along with a reference to the cached prefix; otherwise the full
+    prompt_text is sent.
+    
+    When required_fields is given, endpoint must be a streamGenerateContent
+    endpoint (see GEMINI_STREAM_ENDPOINT). The response is parsed while it
+    streams and the connection is closed as soon as all required top-level
+    fields are complete; fields still being generated are returned truncated
+    and listed under "truncated_fields".
+    
+    Provider failures (connection errors, timeouts, 429 and 5xx responses) are
+    counted by the shared circuit breaker; while it is open no request is sent.
+    
     Args:
         endpoint: API endpoint URL
         prompt_text: Text prompt to send
         img_path: Optional path to image file
         retries: Number of retry attempts
         delay: Delay between retries in seconds
+        generation_config: Optional generationConfig (e.g. a JSON response schema)
+        cached_prefix: Optional static part of the prompt eligible for context caching
+        suffix_text: Variable part of the prompt sent after the cached prefix
+        required_fields: Top-level JSON fields after which a streamed response may stop
+        image_min_side: Minimum long side in pixels the model needs from the image
         
     Returns:
         API response text or error message
+        
+    Raises:
+        ModelUnavailable: If the circuit breaker is open or every attempt failed
+            with a provider failure
     """
-    payload = {"contents": [{"parts": [{"text": prompt_text}]}]}
+    import requests
+
+    cached_content = None
+    if cached_prefix and suffix_text is not None:
+        from kyc_engine.prompt_cache import get_prompt_cache
+        cached_content = get_prompt_cache().lookup(cached_prefix)
+
+    def build_payload(use_cache: bool) -> Dict[str, Any]:
+        text = suffix_text if use_cache else prompt_text
+        payload = {"contents": [{"role": "user", "parts": [{"text": text}]}]}
+
+        if img_path:
+            image_data = encode_image(img_path, image_min_side)
+            if image_data:
+                payload["contents"][0]["parts"].append({
+                    "inline_data": {"mime_type": "image/jpeg", "data": image_data}
+                })
 
-    if img_path:
-        image_data = encode_image(img_path)
-        if image_data:
-            payload["contents"][0]["parts"].append({
-                "inline_data": {"mime_type": "image/jpeg", "data": image_data}
-            })
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        if use_cache:
+            payload["cachedContent"] = cached_content
+        return payload
 
+    payload = build_payload(cached_content is not None)
     headers = {"Content-Type": "application/json"}
+    breaker = get_breaker()
+
+    # Asked once per call: a half-open probe keeps its retries, and a provider
+    # failure that opens the breaker ends the retries below
+    if not breaker.allow():
+        raise ModelUnavailable("Model endpoint circuit breaker is open; call not attempted")
 
     for attempt in range(retries):
         try:
-            response = requests.post(endpoint, json=payload, headers=headers)
+            if required_fields:
+                with requests.post(endpoint, json=payload, headers=headers, stream=True,
+                                   timeout=MODEL_TIMEOUT) as response:
+                    response.raise_for_status()
+                    breaker.record_success()
+                    return read_streamed_json(response, required_fields)
+
+            response = requests.post(endpoint, json=payload, headers=headers, timeout=MODEL_TIMEOUT)
             response.raise_for_status()
+            breaker.record_success()
             data = response.json()
             return data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get(
                 "text", "No response received.")
         except Exception as e:
-            print(f"\tAttempt {attempt + 1} failed: {str(e)}")
-            if attempt < retries - 1:
+            logger.warning("Model call attempt %d failed: %s", attempt + 1, e)
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            provider_failure = isinstance(e, (requests.ConnectionError, requests.Timeout)) or \
+                (status is not None and (status == 429 or status >= 500))
+            if provider_failure:
+                breaker.record_failure()
+            elif status is not None:
+                # The endpoint answered (e.g. 400 or 403): it is reachable, so a probe succeeded
+                breaker.record_success()
+            if cached_content and status in (400, 403, 404):
+                # The cached prefix expired or was rejected; fall back to the full prompt
+                get_prompt_cache().invalidate(cached_prefix)
+                cached_content = None
+                payload = build_payload(False)
+            if attempt < retries - 1 and not (provider_failure and breaker.is_open()):
                 time.sleep(delay)
+            elif provider_failure:
+                raise ModelUnavailable(f"Model endpoint unavailable after {attempt + 1} attempts: {e}") from e
             else:
                 return json.dumps({
                     "status": "fail",
                     "message": f"API call failed after multiple attempts, Endpoint {endpoint}",
                 })
+
+
+def read_streamed_json(response: Any, required_fields: Sequence[str]) -> str:
+    """Read a server-sent event stream of response chunks until the required fields are complete.
+    
+    Args:
+        response: Streaming requests response from a streamGenerateContent endpoint
+        required_fields: Top-level JSON fields that must be complete before returning
+        
+    Returns:
+        JSON text of the decoded fields, or the full response text when the stream
+        ended first
+    """
+    parser = StreamingJSONParser()
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        try:
+            data = json.loads(line[len("data:"):])
+        except json.JSONDecodeError:
+            continue
+
+        for part in data.get("candidates", [{}])[0].get("content", {}).get("parts", []):
+            parser.feed(part.get("text", ""))
+
+        if all(field in parser.fields for field in required_fields):
+            if parser.done:
+                return parser.text
+            fields = dict(parser.fields)
+            if parser.partial:
+                key, value = parser.partial
+                fields[key] = value
+                fields["truncated_fields"] = [key]
+            # Leaving the caller's context closes the connection and cancels the rest
+            return json.dumps(fields)
+
+    return parser.text or "No response received."
@@ -0,0 +1,169 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+Double-clicked submits and client retries send the same request again while the
+first copy is still running. The first caller of a key becomes the leader and
+starts the work on a thread of its own; the leader and every caller arriving
+with the same key before it finishes replay the flight's events as they are
+produced, so the work runs once and every caller receives the same result. A
+leader that disconnects leaves the work running for its followers; it stops
+once no caller is left.
+"""
+import contextvars
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+
+class Flight:
+    """Events produced by one in-flight computation, shared with its followers."""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.followers = 0
+        # Callers still replaying, leader included; changed under the registry's lock
+        self.consumers = 1
+        self._condition = threading.Condition()
+
+    def publish(self, event: Any) -> None:
+        """Append an event and wake the followers."""
+        with self._condition:
+            self.events.append(event)
+            self._condition.notify_all()
+
+    def finish(self, error: Optional[Exception] = None) -> None:
+        """Mark the computation as complete (or failed) and wake the followers."""
+        with self._condition:
+            self.done = True
+            self.error = error
+            self._condition.notify_all()
+
+    def replay(self) -> Iterator[Any]:
+        """
+        Yield the leader's events, waiting for new ones until the flight is done.
+
+        Raises:
+            Exception: The leader's error if the computation failed
+        """
+        position = 0
+        while True:
+            with self._condition:
+                while position == len(self.events) and not self.done:
+                    self._condition.wait()
+                pending = self.events[position:]
+                done, error = self.done, self.error
+            for event in pending:
+                yield event
+            position += len(pending)
+            if done and position == len(self.events):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """Registry of in-flight computations by key."""
+
+    def __init__(self):
+        self.coalesced = 0
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: str) -> Tuple[Flight, bool]:
+        """
+        Attach to the flight for a key, starting one if none is running.
+
+        Args:
+            key: Identity of the computation
+
+        Returns:
+            Tuple of (flight, True if the caller is the leader)
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                flight.consumers += 1
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def _end(self, key: str, flight: Flight) -> None:
+        """Unregister a flight, so new arrivals start their own (called with the lock held)."""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _produce(self, key: str, flight: Flight, events: Iterator[Any]) -> None:
+        """Publish a flight's events until they run out or no caller is left (on the producer thread)."""
+        error: Optional[Exception] = RuntimeError("The coalesced verification was abandoned before it finished")
+        try:
+            for event in events:
+                flight.publish(event)
+                with self._lock:
+                    if flight.consumers == 0:
+                        self._end(key, flight)
+                        break
+            else:
+                error = None
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(events, "close", None)
+            if close:
+                close()
+            with self._lock:
+                self._end(key, flight)
+            flight.finish(error)
+
+    def run(self, key: str, produce: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """
+        Run produce() once per concurrent key, yielding its events to every caller.
+
+        Args:
+            key: Identity of the computation
+            produce: Called by the leader only, in its own thread; returns the
+                event iterator, which is then consumed on a producer thread
+
+        Yields:
+            The flight's events, in order
+
+        Raises:
+            Exception: The producer's error, in the leader and all followers
+        """
+        flight, leader = self.join(key)
+        try:
+            if leader:
+                try:
+                    events = produce()
+                except Exception as e:
+                    # Nothing will produce for this flight: release the key and its followers
+                    with self._lock:
+                        self._end(key, flight)
+                    flight.finish(e)
+                    raise
+                threading.Thread(target=contextvars.copy_context().run, args=(self._produce, key, flight, events),
+                                 name="kyc-single-flight", daemon=True).start()
+            yield from flight.replay()
+        finally:
+            with self._lock:
+                flight.consumers -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """Report the number of running flights and of requests coalesced into one."""
+        with self._lock:
+            return {"in_flight": len(self._flights), "coalesced": self.coalesced}
+
+
+_default_flights: Optional[SingleFlight] = None
+_default_flights_lock = threading.Lock()
+
+
+def get_flights() -> SingleFlight:
+    """Return the process-wide single-flight registry."""
+    global _default_flights
+    with _default_flights_lock:
+        if _default_flights is None:
+            _default_flights = SingleFlight()
+        return _default_flights
@@ -0,0 +1,323 @@
+"""
+Tamper localization module.
+
+The ELA and pixel-level stages each produce a full map of the document (ELA
+difference, noise residual, JPEG artifact difference, per-block clone matches),
+but only report one global score. This module aligns those already computed
+maps onto a common tile grid and scores every tile, so a reviewer is pointed at
+the region that was most likely edited instead of only being told that an edit
+happened somewhere.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+
+# Tile grid (rows, columns) every map is averaged onto; ID-1 cards are ~1.58:1
+TILE_GRID = (12, 18)
+
+# Contribution of each recompression/noise map to the relative tile score
+MAP_WEIGHTS = {
+    "ela": 0.35,
+    "artifact": 0.55,
+    "noise": 0.1
+}
+
+# ELA and artifact maps are divided by the tile's edge energy plus this floor (0-255 scale),
+# so dense text and the portrait do not stand out just for having more detail
+EDGE_FLOOR = 8.0
+
+# Relative scores are averaged over this many neighbouring tiles (odd), since an
+# edited name or photo spans several tiles while single-tile outliers are noise
+SMOOTHING_TILES = 3
+
+# Per-map robust z-scores are capped so one extreme map cannot drown out the others
+MAX_MAP_SCORE = 8.0
+
+# Clone-match scores at or below this are ordinary self-similarity; a copied
+# region matches its source almost exactly
+CLONE_MATCH_FLOOR = 0.98
+
+# Score added to a tile containing an exact clone match
+CLONE_WEIGHT = 2.0
+
+# Combined score above which a tile counts as suspicious
+REGION_THRESHOLD = 1.5
+
+# Number of suspicious regions reported
+MAX_REGIONS = 3
+
+# Checks with an absolute verdict on the whole image; tile scores are relative to the
+# document itself (every card has a portrait that stands out), so regions only raise
+# the status when one of these, or an exact clone match, agrees
+CORROBORATING_CHECKS = ("JPEG", "ELA", "Forensics")
+
+# Scale factor turning the median absolute deviation into a standard deviation
+MAD_SCALE = 1.4826
+
+
+def tile_means(array, grid: Tuple[int, int] = TILE_GRID):
+    """
+    Average a map over the cells of a tile grid.
+
+    Args:
+        array: 2D map or RGB image of any resolution
+        grid: Tile grid as (rows, columns)
+
+    Returns:
+        float32 array of shape grid with the mean value of each tile
+    """
+    import cv2
+    import numpy as np
+
+    array = np.asarray(array, dtype=np.float32)
+    if array.ndim == 3:
+        array = array.mean(axis=2)
+    rows, cols = grid
+    # INTER_AREA averages all source pixels that fall into each target cell
+    return cv2.resize(array, (cols, rows), interpolation=cv2.INTER_AREA)
+
+
+def tile_max(array, grid: Tuple[int, int] = TILE_GRID):
+    """
+    Take the maximum of a coarse map over the cells of a tile grid.
+
+    Used for the per-block clone map, where averaging would dilute a single
+    copied block on large images.
+
+    Args:
+        array: 2D map (e.g. one value per clone-search block)
+        grid: Tile grid as (rows, columns)
+
+    Returns:
+        float32 array of shape grid with the maximum value of each tile
+    """
+    import cv2
+    import numpy as np
+
+    rows, cols = grid
+    array = np.asarray(array, dtype=np.float32)
+    if array.shape[0] < rows or array.shape[1] < cols:
+        array = cv2.resize(array, (max(cols, array.shape[1]), max(rows, array.shape[0])),
+                           interpolation=cv2.INTER_NEAREST)
+    row_index = np.arange(array.shape[0]) * rows // array.shape[0]
+    col_index = np.arange(array.shape[1]) * cols // array.shape[1]
+    pooled = np.zeros(grid, dtype=np.float32)
+    np.maximum.at(pooled, (row_index[:, None], col_index[None, :]), array)
+    return pooled
+
+
+def robust_z(values):
+    """
+    Score each tile by how far above the document's typical tile it is.
+
+    Uses the median and median absolute deviation so that a tampered region
+    cannot inflate the baseline it is compared against. A map that is constant
+    over most of the document (e.g. an image that recompresses without any
+    error) has no baseline and scores 0 everywhere.
+
+    Args:
+        values: Tile grid of a single map
+
+    Returns:
+        Grid of robust z-scores in [0, MAX_MAP_SCORE]
+    """
+    import numpy as np
+
+    median = float(np.median(values))
+    mad = float(np.median(np.abs(values - median))) * MAD_SCALE
+    if mad <= 0:
+        return np.zeros_like(values)
+    return np.clip((values - median) / mad, 0.0, MAX_MAP_SCORE)
+
+
+def collect_maps(intermediates: Dict[str, Any],
+                 grid: Tuple[int, int] = TILE_GRID) -> Tuple[Dict[str, Any], Optional[Tuple[int, int]]]:
+    """
+    Align the forensic maps kept by earlier stages onto the tile grid.
+
+    Args:
+        intermediates: Stage intermediates filled by ela_analysis() and pixel_level_check()
+        grid: Tile grid as (rows, columns)
+
+    Returns:
+        Tuple of (map name -> tile grid, full image size as (width, height) or None)
+    """
+    import numpy as np
+
+    ela = intermediates.get("ela") or {}
+    forensics = intermediates.get("forensics") or {}
+
+    # Maps reduced for transfer (see visualization.reduce_intermediates) carry their scale
+    size = None
+    for values, name in ((ela, "original"), (forensics, "artifact")):
+        if values.get(name) is not None:
+            scale = values.get(f"{name}_scale", 1.0)
+            size = (round(values[name].shape[1] / scale), round(values[name].shape[0] / scale))
+            break
+
+    maps = {}
+    if ela.get("difference") is not None:
+        maps["ela"] = tile_means(ela["difference"], grid)
+    if forensics.get("artifact") is not None:
+        maps["artifact"] = tile_means(forensics["artifact"], grid)
+
+    # Recompression error grows with detail, so compare it per unit of edge energy
+    if forensics.get("edges") is not None:
+        edges = tile_means(forensics["edges"], grid)
+        for name in maps:
+            maps[name] = maps[name] / (edges + EDGE_FLOOR)
+
+    if forensics.get("noise") is not None:
+        maps["noise"] = tile_means(forensics["noise"], grid)
+
+    clone_map = forensics.get("clone_map")
+    if clone_map is not None and clone_map.size:
+        maps["clone"] = tile_max(clone_map, grid)
+    return maps, size
+
+
+def fuse_maps(maps: Dict[str, Any], weights: Dict[str, float] = MAP_WEIGHTS):
+    """
+    Combine per-map tile grids into one tamper score per tile.
+
+    Recompression and noise maps are scored relative to the rest of the
+    document with robust_z(), smoothed over neighbouring tiles and averaged
+    with the given weights. Clone matches are absolute evidence: tiles with a
+    near-exact match elsewhere get up to CLONE_WEIGHT added.
+
+    Args:
+        maps: Map name -> tile grid from collect_maps()
+        weights: Contribution of each relative map; missing maps are left out
+            and the remaining weights renormalized
+
+    Returns:
+        Tuple of (combined score grid, map name -> per-map score grid)
+    """
+    import cv2
+    import numpy as np
+
+    scores = {name: robust_z(tiles) for name, tiles in maps.items() if name in weights}
+    combined = np.zeros(next(iter(maps.values())).shape, dtype=np.float32)
+    if scores:
+        total = sum(weights[name] for name in scores)
+        smoothed = {name: cv2.blur(grid, (SMOOTHING_TILES, SMOOTHING_TILES), borderType=cv2.BORDER_REFLECT)
+                    for name, grid in scores.items()}
+        combined += sum(weights[name] * grid for name, grid in smoothed.items()) / total
+
+    if "clone" in maps:
+        clone = np.clip((maps["clone"] - CLONE_MATCH_FLOOR) / (1.0 - CLONE_MATCH_FLOOR), 0.0, 1.0)
+        scores["clone"] = clone
+        combined += CLONE_WEIGHT * clone
+    return combined, scores
+
+
+def _position_label(cx: float, cy: float) -> str:
+    """Name the part of the document a point (as fractions of width and height) lies in."""
+    vertical = "top" if cy < 1 / 3 else "bottom" if cy > 2 / 3 else "middle"
+    horizontal = "left" if cx < 1 / 3 else "right" if cx > 2 / 3 else "center"
+    if vertical == "middle":
+        return "center" if horizontal == "center" else f"middle-{horizontal}"
+    return vertical if horizontal == "center" else f"{vertical}-{horizontal}"
+
+
+def find_regions(combined, scores: Dict[str, Any], size: Optional[Tuple[int, int]],
+                 threshold: float = REGION_THRESHOLD, limit: int = MAX_REGIONS) -> List[Dict[str, Any]]:
+    """
+    Group adjacent suspicious tiles into regions, strongest first.
+
+    Args:
+        combined: Combined score grid from fuse_maps()
+        scores: Per-map score grids from fuse_maps()
+        size: Full image size as (width, height), used for pixel boxes
+        threshold: Combined score a tile needs to be suspicious
+        limit: Maximum number of regions
+
+    Returns:
+        List of regions with score, position label, bounding box and the mean
+        score of each map inside the region
+    """
+    import cv2
+    import numpy as np
+
+    rows, cols = combined.shape
+    mask = (combined >= threshold).astype(np.uint8)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+    regions = []
+    for label in range(1, count):
+        x, y, w, h, _ = stats[label]
+        inside = labels == label
+        box = [x / cols, y / rows, w / cols, h / rows]
+        region = {
+            "score": round(float(combined[inside].max()), 2),
+            "position": _position_label(box[0] + box[2] / 2, box[1] + box[3] / 2),
+            "bbox_fraction": [round(v, 3) for v in box],
+            "contributions": {name: round(float(grid[inside].mean()), 2) for name, grid in scores.items()}
+        }
+        if size:
+            region["bbox"] = [int(box[0] * size[0]), int(box[1] * size[1]),
+                              int(round(box[2] * size[0])), int(round(box[3] * size[1]))]
+        regions.append(region)
+
+    regions.sort(key=lambda r: r["score"], reverse=True)
+    return regions[:limit]
+
+
+def localize_tampering(intermediates: Dict[str, Any],
+                       checks: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Build the fused tamper heatmap and report the most suspicious regions.
+
+    Only reuses the maps the ELA and forensic stages left in intermediates;
+    nothing is decoded or recomputed here. The regions are informational
+    unless a clone match or one of the CORROBORATING_CHECKS flags the image.
+
+    Args:
+        intermediates: Stage intermediates; receives a "localization" entry
+            with the heatmap for visualization
+        checks: Results of the earlier checks by step name
+
+    Returns:
+        Dictionary with status, maps used, peak score, regions and message
+    """
+    maps, size = collect_maps(intermediates)
+    if not maps:
+        return {"status": "success", "applicable": False,
+                "message": "No forensic maps available; tamper localization skipped."}
+
+    combined, scores = fuse_maps(maps)
+    regions = find_regions(combined, scores, size)
+
+    checks = checks or {}
+    corroborated = sorted(name for name in CORROBORATING_CHECKS
+                          if (checks.get(name) or {}).get("status") in ("flag for review", "fail"))
+    if any(region["contributions"].get("clone", 0) > 0 for region in regions):
+        corroborated.append("clone match")
+
+    result = {
+        "status": "flag for review" if regions and corroborated else "success",
+        "applicable": True,
+        "grid": list(TILE_GRID),
+        "maps_used": sorted(maps),
+        "max_score": round(float(combined.max()), 2),
+        "regions": regions
+    }
+    if regions:
+        places = ", ".join(f"{r['position']} ({r['score']})" for r in regions)
+        result["corroborated_by"] = corroborated
+        if corroborated:
+            result["message"] = (f"Localized tampering evidence at: {places} "
+                                 f"(corroborated by {', '.join(corroborated)}).")
+        else:
+            result["message"] = f"Most distinctive regions (informational, no other check flags the image): {places}."
+    else:
+        result["message"] = "No localized tampering evidence across the forensic maps."
+
+    preview = (intermediates.get("forensics") or {}).get("image")
+    if preview is None:
+        preview = (intermediates.get("ela") or {}).get("original")
+    if preview is not None:
+        intermediates["localization"] = {
+            "image": preview,
+            "heatmap": combined,
+            "report": result
+        }
+    return result
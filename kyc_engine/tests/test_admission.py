@@ -0,0 +1,80 @@
+"""Tests for admission control and degraded mode."""
+import threading
+import time
+
+import pytest
+
+from kyc_engine.admission import AdmissionController, Overloaded
+
+
+def test_rejects_beyond_the_in_flight_limit_and_queue():
+    controller = AdmissionController(max_in_flight=2, max_queue=0, degrade_after=0)
+    first, second = controller.admit(), controller.admit()
+
+    with pytest.raises(Overloaded) as error:
+        controller.admit()
+
+    assert error.value.retry_after >= 1
+    assert controller.stats()["rejected"] == 1
+    first.release()
+    first.release()
+    # Releasing twice frees one slot only
+    assert controller.stats()["in_flight"] == 1
+    controller.admit().release()
+    second.release()
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_queued_request_gets_the_next_free_slot():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5, degrade_after=0)
+    running = controller.admit()
+    admitted = []
+
+    waiter = threading.Thread(target=lambda: admitted.append(controller.admit()))
+    waiter.start()
+    while controller.stats()["queued"] == 0:
+        time.sleep(0.01)
+    # The queue is full: a third request is turned away at once
+    with pytest.raises(Overloaded):
+        controller.admit()
+    running.release()
+    waiter.join(5)
+
+    assert len(admitted) == 1
+    assert controller.stats()["in_flight"] == 1
+
+
+def test_queued_request_times_out():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05, degrade_after=0)
+    with controller.admit():
+        with pytest.raises(Overloaded):
+            controller.admit()
+    assert controller.stats()["queued"] == 0
+
+
+def test_sustained_queueing_sheds_work_in_order_and_recovers():
+    controller = AdmissionController(max_in_flight=1, max_queue=2, queue_timeout=5,
+                                     shed_order=("Metadata", "Composites"), degrade_after=0.05)
+    running = controller.admit()
+    admitted = []
+
+    waiter = threading.Thread(target=lambda: admitted.append(controller.admit()))
+    waiter.start()
+    while controller.stats()["queued"] == 0:
+        time.sleep(0.01)
+    # Each check moves at most one level, once degrade_after has passed since the last change
+    time.sleep(0.08)
+    assert controller.stats()["shed"] == ["Metadata"]
+    time.sleep(0.08)
+    assert controller.stats()["shed"] == ["Metadata", "Composites"]
+    running.release()
+    waiter.join(5)
+    assert admitted[0].shed == ("Metadata", "Composites")
+    admitted[0].release()
+
+    # Without queueing, one level is restored per degrade_after
+    time.sleep(0.07)
+    assert controller.stats()["degraded_level"] == 1
+    time.sleep(0.07)
+    assert controller.stats()["degraded_level"] == 0
+    assert controller.admit().shed == ()
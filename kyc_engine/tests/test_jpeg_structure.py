@@ -0,0 +1,85 @@
+"""Tests for the JPEG bitstream analysis on known single and double compressed files."""
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from kyc_engine.jpeg_structure import jpeg_structure_check, parse_jpeg, estimate_quality, STANDARD_LUMINANCE_TABLE
+
+
+def _card(size=(960, 600)):
+    """Synthetic ID card: shaded background, printed fields and a textured portrait."""
+    width, height = size
+    rng = np.random.default_rng(11)
+    x = np.linspace(0, 1, width)[None, :, None]
+    y = np.linspace(0, 1, height)[:, None, None]
+    background = 150 + 60 * x + 30 * y * np.array([1.0, 0.6, 0.2])
+    # Guilloche-like print texture, so blocks away from the fields are not flat
+    texture = Image.fromarray(np.clip(rng.normal(128, 60, (height, width)), 0, 255).astype(np.uint8))
+    texture = np.asarray(texture.filter(ImageFilter.GaussianBlur(1.5)), dtype=np.float64)[:, :, None] - 128
+    card = Image.fromarray(np.clip(background + texture, 0, 255).astype(np.uint8))
+
+    portrait = rng.normal(110, 45, (height // 2, width // 4, 3))
+    portrait = Image.fromarray(np.clip(portrait, 0, 255).astype(np.uint8)).filter(ImageFilter.GaussianBlur(2))
+    card.paste(portrait, (width // 16, height // 4))
+
+    draw = ImageDraw.Draw(card)
+    for row in range(8):
+        top = height // 4 + row * height // 14
+        draw.text((width // 2, top), f"FIELD {row}: SAMPLE VALUE {row * 7919}", fill=(20, 20, 40))
+        draw.rectangle((width // 2, top + 14, width // 2 + 300, top + 16), fill=(90, 30, 30))
+    return card
+
+
+def _saved(image, quality, path=None):
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    if path is not None:
+        path.write_bytes(buffer.getvalue())
+        return str(path)
+    buffer.seek(0)
+    return Image.open(buffer).convert("RGB")
+
+
+def test_quality_is_read_from_the_quantization_tables(tmp_path):
+    path = _saved(_card(), 75, tmp_path / "card.jpg")
+
+    info = parse_jpeg(open(path, "rb").read())
+
+    assert estimate_quality(info["quant_tables"][0], STANDARD_LUMINANCE_TABLE) == (75, True)
+
+
+def test_single_compression_is_clean(tmp_path):
+    result = jpeg_structure_check(_saved(_card(), 90, tmp_path / "single.jpg"))
+
+    assert result["status"] == "success"
+    assert result["grid_offset"] == [0, 0]
+    assert result["blocks_analyzed"] > 0
+
+
+def test_double_compression_is_flagged(tmp_path):
+    path = _saved(_saved(_card(), 60), 90, tmp_path / "double.jpg")
+
+    result = jpeg_structure_check(path)
+
+    assert result["status"] == "flag for review"
+    assert "double quantization" in result["message"]
+
+
+def test_crop_after_compression_shows_a_shifted_grid(tmp_path):
+    first = _saved(_card(), 75)
+    # Cropping 5 columns and 3 rows moves the earlier grid to row 5, column 3
+    path = _saved(first.crop((5, 3, first.width, first.height)), 90, tmp_path / "cropped.jpg")
+
+    result = jpeg_structure_check(path)
+
+    assert result["grid_offset"] == [5, 3]
+    assert result["status"] != "success"
+
+
+def test_sample_covers_the_whole_card(tmp_path):
+    path = _saved(_card(), 90, tmp_path / "card.jpg")
+
+    result = jpeg_structure_check(path, max_blocks=2000)
+
+    assert 0 < result["blocks_analyzed"] <= 2000
@@ -0,0 +1,58 @@
+"""Tests for the local comparison of extracted card fields with the form."""
+import pytest
+
+from kyc_engine.ocr_check import compare_fields
+
+FORM = {"full_name": "José Álvarez García", "dob": "1990-04-03", "nationality": "Algeria", "id_number": "AB 123-456"}
+
+
+def _extraction(**fields):
+    extracted = {"full_name": "GARCIA JOSE ALVAREZ", "dob": "03/04/1990", "nationality": "Algerian",
+                 "id_number": "AB123456"}
+    extracted.update(fields)
+    return {"status": "success", "extracted": extracted}
+
+
+def test_accents_case_word_order_and_punctuation_do_not_matter():
+    result = compare_fields(FORM, _extraction())
+
+    assert result["status"] == "success"
+    assert all(field["match"] for field in result["detailed_result"].values())
+    assert result["local_comparison"] is True
+
+
+@pytest.mark.parametrize("card_dob", ["3 April 1990", "APR 03 1990", "04/03/1990", "03.04.90"])
+def test_dates_match_in_any_common_format(card_dob):
+    assert compare_fields(FORM, _extraction(dob=card_dob))["detailed_result"]["dob"]["match"]
+
+
+def test_two_digit_year_is_read_as_the_most_recent_past_year():
+    form = dict(FORM, dob="2001-07-07")
+
+    assert compare_fields(form, _extraction(dob="07-07-01"))["status"] == "success"
+    assert compare_fields(form, _extraction(dob="7 Jul 01"))["status"] == "success"
+    # The first number is a year only when it cannot be a day
+    assert compare_fields(dict(FORM, dob="1998-07-07"), _extraction(dob="98-07-07"))["status"] == "success"
+
+
+def test_mismatched_name_or_date_fails_but_id_number_only_flags():
+    assert compare_fields(FORM, _extraction(full_name="Karim Benali"))["status"] == "fail"
+    assert compare_fields(FORM, _extraction(dob="1991-04-03"))["status"] == "fail"
+    assert compare_fields(FORM, _extraction(id_number="AB123457"))["status"] == "flag for review"
+
+
+def test_unreadable_date_and_missing_fields_are_left_to_a_reviewer():
+    undecidable = compare_fields(FORM, _extraction(dob="19.."))
+    assert undecidable["status"] == "flag for review"
+    assert "could not be compared" in undecidable["message"]
+
+    missing = compare_fields(FORM, _extraction(full_name="not found", nationality="Not Found"))
+    assert missing["status"] == "flag for review"
+    assert missing["detailed_result"]["nationality"]["founded_value"] == "not found"
+
+
+def test_failed_extraction_fails_the_check():
+    result = compare_fields(FORM, {"status": "fail", "message": "no id card recognized."})
+
+    assert result["status"] == "fail"
+    assert result["Similarity Score"] == 0
@@ -0,0 +1,46 @@
+"""Tests for the perceptual-hash BK-tree."""
+import random
+
+from kyc_engine.phash_index import BKTree, hamming_distance
+
+
+def _brute_force(entries, value, max_distance):
+    return sorted((hamming_distance(value, hash_value), item) for hash_value, item in entries
+                  if hamming_distance(value, hash_value) <= max_distance)
+
+
+def test_search_matches_a_linear_scan():
+    rng = random.Random(4)
+    base = rng.getrandbits(64)
+    # Hashes clustered around one image, as near-duplicates are, plus unrelated ones
+    entries = [(base ^ sum(1 << rng.randrange(64) for _ in range(rng.randrange(12))), f"near-{i}")
+               for i in range(300)]
+    entries += [(rng.getrandbits(64), f"other-{i}") for i in range(300)]
+    tree = BKTree()
+    for hash_value, item in entries:
+        tree.add(hash_value, item)
+
+    for max_distance in (0, 4, 10):
+        query = base ^ (1 << 5)
+        assert sorted(tree.search(query, max_distance)) == _brute_force(entries, query, max_distance)
+    assert len(tree) == len(entries)
+
+
+def test_items_sharing_a_hash_are_all_returned():
+    tree = BKTree()
+    tree.add(0b1011, "first")
+    tree.add(0b1011, "second")
+    tree.add(0b0100, "far")
+
+    assert sorted(tree.search(0b1011, 0)) == [(0, "first"), (0, "second")]
+    assert tree.search(0b1010, 1) == [(1, "first"), (1, "second")]
+
+
+def test_results_are_sorted_by_distance_and_empty_tree_finds_nothing():
+    assert BKTree().search(123, 64) == []
+
+    tree = BKTree()
+    for value in (0b1111, 0b0000, 0b0001, 0b0011):
+        tree.add(value, value)
+    distances = [distance for distance, _ in tree.search(0b0000, 4)]
+    assert distances == sorted(distances) == [0, 1, 2, 4]
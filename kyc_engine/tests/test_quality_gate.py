@@ -0,0 +1,49 @@
+"""Tests for the card presence part of the image quality gate."""
+import numpy as np
+from PIL import Image, ImageDraw
+
+from kyc_engine.quality_gate import quality_check
+
+NO_CARD = "no card-shaped document detected"
+
+
+def _card_crop(path):
+    """Photo cropped to an ID card: plain margin on every side, portrait and printed fields."""
+    card = Image.new("RGB", (950, 600), (228, 228, 224))
+    draw = ImageDraw.Draw(card)
+    draw.rectangle((40, 60, 300, 400), fill=(60, 90, 130))
+    for row in range(6):
+        draw.text((340, 80 + row * 50), f"FIELD {row}: VALUE {row * 7919}", fill=(20, 20, 20))
+        draw.rectangle((340, 100 + row * 50, 700, 102 + row * 50), fill=(120, 40, 40))
+    card.save(path, "JPEG", quality=92)
+    return str(path)
+
+
+def _table_photo(path, size=(960, 640)):
+    """3:2 photo without a card: wood grain and objects running off every side of the frame."""
+    rng = np.random.default_rng(5)
+    y, x = np.mgrid[0:size[1], 0:size[0]]
+    grain = 110 + 45 * np.sign(np.sin(x / 9.0 + 3 * np.sin(y / 40.0)))
+    pixels = np.clip(grain[:, :, None] + rng.normal(0, 10, (size[1], size[0], 3)), 0, 255).astype(np.uint8)
+    photo = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(photo)
+    for _ in range(12):
+        x, y = rng.integers(-100, size[0]), rng.integers(-100, size[1])
+        radius = int(rng.integers(60, 220))
+        draw.ellipse((x, y, x + radius, y + radius), fill=tuple(int(v) for v in rng.integers(20, 230, 3)))
+    photo.save(path, "JPEG", quality=92)
+    return str(path)
+
+
+def test_frame_cropped_to_the_card_is_accepted_without_an_outline(tmp_path):
+    result = quality_check(_card_crop(tmp_path / "card.jpg"))
+
+    assert NO_CARD not in result["issues"]
+    assert result["details"]["border_edges"] <= 0.01
+
+
+def test_card_shaped_photo_without_a_card_is_rejected(tmp_path):
+    result = quality_check(_table_photo(tmp_path / "table.jpg"))
+
+    assert result["status"] == "fail"
+    assert NO_CARD in result["issues"]
@@ -0,0 +1,47 @@
+"""Tests for reading streamed model responses."""
+import json
+
+from kyc_engine.shared import read_streamed_json
+
+
+class FakeStream:
+    """Stands in for a streaming requests response and records how far it was read."""
+
+    def __init__(self, chunks):
+        self.lines = []
+        for chunk in chunks:
+            event = {"candidates": [{"content": {"parts": [{"text": chunk}]}}]}
+            self.lines += ["data: " + json.dumps(event), ""]
+        self.read = 0
+
+    def iter_lines(self, decode_unicode=False):
+        for line in self.lines:
+            self.read += 1
+            yield line
+
+
+def test_stops_once_the_required_fields_are_complete():
+    stream = FakeStream(['{"decision": "acc', 'ept", "reason": "All checks', ' passed and the', ' rest"}'])
+
+    result = json.loads(read_streamed_json(stream, ["decision"]))
+
+    assert result["decision"] == "accept"
+    assert result["truncated_fields"] == ["reason"]
+    assert result["reason"].startswith("All checks")
+    # The last two chunks were never read
+    assert stream.read < len(stream.lines) - 2
+
+
+def test_returns_the_whole_object_when_it_completes_with_the_fields():
+    stream = FakeStream(['{"decision": "deny", ', '"reason": "Expired card"}'])
+
+    result = json.loads(read_streamed_json(stream, ["decision", "reason"]))
+
+    assert result == {"decision": "deny", "reason": "Expired card"}
+
+
+def test_ignores_other_lines_and_returns_the_text_of_an_incomplete_stream():
+    stream = FakeStream(['{"reason": "No decision'])
+    stream.lines = [": keep-alive", "data: not json"] + stream.lines
+
+    assert read_streamed_json(stream, ["decision"]) == '{"reason": "No decision'
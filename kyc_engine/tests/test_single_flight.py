@@ -0,0 +1,109 @@
+"""Tests for single-flight coalescing of identical concurrent work."""
+import threading
+
+import pytest
+
+from kyc_engine.single_flight import SingleFlight
+
+
+def _gated(started, release, events=("a", "b", "c"), error=None):
+    """Event source that waits for the test before producing past the first event."""
+    def produce():
+        started.append(1)
+
+        def events_iter():
+            yield events[0]
+            release.wait(5)
+            yield from events[1:]
+            if error is not None:
+                raise error
+        return events_iter()
+    return produce
+
+
+def _collect(flights, key, produce, out, errors):
+    try:
+        out.append(list(flights.run(key, produce)))
+    except Exception as e:
+        errors.append(e)
+
+
+def _wait_for_followers(flights, count):
+    for _ in range(500):
+        if flights.stats()["coalesced"] >= count:
+            return
+        threading.Event().wait(0.01)
+
+
+def test_concurrent_callers_share_one_run():
+    flights, started, release = SingleFlight(), [], threading.Event()
+    produce = _gated(started, release)
+    results, errors = [], []
+
+    threads = [threading.Thread(target=_collect, args=(flights, "key", produce, results, errors)) for _ in range(4)]
+    threads[0].start()
+    while not started:
+        threading.Event().wait(0.01)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_for_followers(flights, 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert started == [1]
+    assert results == [["a", "b", "c"]] * 4
+    assert not errors
+    assert flights.stats() == {"in_flight": 0, "coalesced": 3}
+
+
+def test_followers_finish_when_the_leader_disconnects():
+    flights, started, release = SingleFlight(), [], threading.Event()
+    produce = _gated(started, release)
+
+    leader = flights.run("key", produce)
+    assert next(leader) == "a"
+    results, errors = [], []
+    follower = threading.Thread(target=_collect, args=(flights, "key", produce, results, errors))
+    follower.start()
+    _wait_for_followers(flights, 1)
+    # The leader's client goes away mid-stream
+    leader.close()
+    release.set()
+    follower.join(5)
+
+    assert results == [["a", "b", "c"]]
+    assert started == [1]
+
+
+def test_errors_reach_every_caller_and_free_the_key():
+    flights, started, release = SingleFlight(), [], threading.Event()
+    produce = _gated(started, release, error=ValueError("model failed"))
+    results, errors = [], []
+
+    threads = [threading.Thread(target=_collect, args=(flights, "key", produce, results, errors)) for _ in range(2)]
+    threads[0].start()
+    while not started:
+        threading.Event().wait(0.01)
+    threads[1].start()
+    _wait_for_followers(flights, 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert [str(e) for e in errors] == ["model failed", "model failed"]
+    # A later request with the same key runs again instead of replaying the failure
+    assert list(flights.run("key", lambda: iter(["fresh"]))) == ["fresh"]
+
+
+def test_a_failing_producer_does_not_strand_its_key():
+    flights = SingleFlight()
+
+    def produce():
+        raise RuntimeError("could not start")
+
+    with pytest.raises(RuntimeError):
+        list(flights.run("key", produce))
+
+    assert flights.stats()["in_flight"] == 0
+    assert list(flights.run("key", lambda: iter([1, 2]))) == [1, 2]
@@ -0,0 +1,71 @@
+"""Tests for the tamper localization maps."""
+import numpy as np
+from PIL import Image
+
+from kyc_engine.ela_check import ela_analysis
+from kyc_engine.image_forensics import pixel_level_check
+from kyc_engine.tamper_fusion import collect_maps, localize_tampering
+
+# EXIF tag of the orientation; 6 means the stored image must be rotated 90 degrees clockwise
+ORIENTATION_TAG = 0x0112
+
+
+def _rotated_card(path, size=(480, 300)):
+    """Write a textured landscape JPEG whose EXIF says to display it in portrait."""
+    rng = np.random.default_rng(7)
+    pixels = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = 6
+    Image.fromarray(pixels).save(path, "JPEG", quality=90, exif=exif)
+    return str(path)
+
+
+def _intermediates(image_path):
+    intermediates = {}
+    ela_analysis(image_path, intermediates=intermediates, store=False)
+    pixel_level_check(image_path, intermediates=intermediates)
+    return intermediates
+
+
+def test_maps_of_a_rotated_photo_share_one_orientation(tmp_path):
+    intermediates = _intermediates(_rotated_card(tmp_path / "rotated.jpg"))
+
+    ela_shape = intermediates["ela"]["original"].shape[:2]
+    assert ela_shape == (300, 480)
+    for name in ("artifact", "noise", "edges"):
+        height, width = intermediates["forensics"][name].shape[:2]
+        # Reduced maps keep the aspect ratio of the stored pixels
+        assert width > height, name
+    assert intermediates["forensics"]["artifact"].shape[:2] == ela_shape
+
+    _, size = collect_maps(intermediates)
+    assert size == (480, 300)
+
+
+def _hot_patch_intermediates():
+    """ELA difference with mild noise everywhere and one strongly recompressed patch."""
+    rng = np.random.default_rng(3)
+    difference = rng.integers(0, 6, (600, 900, 3)).astype(np.uint8)
+    difference[100:220, 600:760] = 120
+    return {"ela": {"difference": difference}}
+
+
+def test_regions_are_informational_without_a_corroborating_check():
+    clean = {name: {"status": "success"} for name in ("JPEG", "ELA", "Forensics")}
+
+    result = localize_tampering(_hot_patch_intermediates(), clean)
+
+    assert result["regions"]
+    assert result["regions"][0]["position"] == "top-right"
+    assert result["status"] == "success"
+    assert result["corroborated_by"] == []
+
+
+def test_regions_flag_when_another_check_agrees():
+    checks = {"JPEG": {"status": "flag for review"}, "ELA": {"status": "success"},
+              "Forensics": {"status": "fail"}}
+
+    result = localize_tampering(_hot_patch_intermediates(), checks)
+
+    assert result["status"] == "flag for review"
+    assert result["corroborated_by"] == ["Forensics", "JPEG"]
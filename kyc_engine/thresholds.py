@@ -0,0 +1,120 @@
+"""
+Runtime-configurable scoring thresholds.
+
+The ELA cutoffs and the pixel-level thresholds and weights default to the values
+below. Pointing KYC_THRESHOLDS_FILE at a JSON file overrides any subset of them;
+the file is re-read whenever its modification time changes, so new settings
+(e.g. ones found with `python -m kyc_engine.rescoring`) take effect without a
+redeploy.
+"""
+import copy
+import json
+import logging
+import os
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLDS: Dict[str, Any] = {
+    "ela": {
+        # Maximum per-pixel error level at or above which ELA flags / fails
+        "flag_level": 50,
+        "fail_level": 150
+    },
+    "forensics": {
+        # Full-resolution thresholds; edge and noise are scaled for reduced decodes
+        "thresholds": {
+            "clone": 0.90,
+            "noise": 25.0,
+            "edge": 35.0,
+            "artifact": 0.10
+        },
+        # Weight of each metric's excess over its threshold in the combined score
+        "weights": {
+            "clone": 0.4,
+            "noise": 0.3,
+            "edge": 0.2,
+            "artifact": 0.1
+        },
+        # Combined score at or above which the check flags / fails
+        "flag_score": 0.5,
+        "fail_score": 1.0
+    }
+}
+
+# JSON file with threshold overrides
+THRESHOLDS_FILE = os.getenv("KYC_THRESHOLDS_FILE")
+
+_lock = threading.Lock()
+_cached: Optional[Dict[str, Any]] = None
+_cached_mtime: Optional[float] = None
+
+
+def merge_thresholds(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Recursively apply overrides to a copy of a threshold configuration.
+
+    Args:
+        base: Complete configuration
+        overrides: Partial configuration with the values to replace
+
+    Returns:
+        New merged configuration
+    """
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_thresholds(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_thresholds(path: Optional[str]) -> Dict[str, Any]:
+    """
+    Read a thresholds file and merge it over the defaults.
+
+    Args:
+        path: Path of the JSON file, or None for the defaults
+
+    Returns:
+        Complete threshold configuration
+    """
+    if not path:
+        return copy.deepcopy(DEFAULT_THRESHOLDS)
+    with open(path, "r", encoding="utf-8") as file:
+        return merge_thresholds(DEFAULT_THRESHOLDS, json.load(file))
+
+
+def get_thresholds() -> Dict[str, Any]:
+    """
+    Return the current threshold configuration, reloading the file if it changed.
+
+    A file that cannot be read or parsed keeps the previously loaded settings.
+
+    Returns:
+        Complete threshold configuration (treat as read-only)
+    """
+    global _cached, _cached_mtime
+
+    mtime = None
+    if THRESHOLDS_FILE:
+        try:
+            mtime = os.stat(THRESHOLDS_FILE).st_mtime
+        except OSError:
+            mtime = None
+
+    with _lock:
+        if _cached is not None and mtime == _cached_mtime:
+            return _cached
+        try:
+            _cached = load_thresholds(THRESHOLDS_FILE if mtime is not None else None)
+            _cached_mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.error("Error loading thresholds from %s: %s", THRESHOLDS_FILE, e)
+            if _cached is None:
+                _cached = copy.deepcopy(DEFAULT_THRESHOLDS)
+            # Do not retry until the file changes again
+            _cached_mtime = mtime
+        return _cached
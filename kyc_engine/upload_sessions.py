@@ -0,0 +1,379 @@
+"""
+Two-phase submissions: image first, form later.
+
+An ID image uploaded on its own gets an upload token, and the stages that
+only need the image (quality, duplicate lookup, metadata, JPEG, ELA,
+forensics, localization) start at once in the background, together with an
+extraction-only OCR request. When the form arrives with the token, the
+extracted fields are compared with it locally and the verification runs only
+what is left (the face lookup and the decision), so the user mostly waits for
+the final step instead of the whole pipeline.
+
+Uploads are registered in a small SQLite database shared by the server's
+worker processes, and the background results are published there, so the form
+may reach a different worker than the upload did. The image itself is read
+from the upload folder, so workers on separate hosts need a shared upload
+folder (or sticky routing); an unknown token returns 404 and the web form then
+sends the image again.
+
+The background work of an upload is admitted by the same controller as
+verifications (admission.py): it holds a slot until both the stages and the
+extraction have finished, an overloaded worker rejects the upload with 503,
+and the stages shed under load are skipped and run again with the form.
+"""
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Any, Optional, Tuple
+
+from kyc_engine.admission import Admission, Overloaded, get_controller
+from kyc_engine.decision_making import IMAGE_STEPS, iter_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Seconds an upload waits for its form before it is discarded
+UPLOAD_TTL = float(os.getenv("KYC_UPLOAD_TTL", "900"))
+
+# Uploads waiting for their form at once; further uploads are rejected
+MAX_UPLOADS = int(os.getenv("KYC_MAX_UPLOADS", "64"))
+
+# Threads running the image stages and extraction requests of uploads
+UPLOAD_WORKERS = int(os.getenv("KYC_UPLOAD_WORKERS", "4"))
+
+# Seconds a form submission waits for its upload's background stages to finish
+READY_TIMEOUT = float(os.getenv("KYC_UPLOAD_WAIT", "60"))
+
+# Seconds between two reads of an upload analysed by another worker
+POLL_INTERVAL = 0.1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    token TEXT PRIMARY KEY,
+    verification_id TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    taken INTEGER NOT NULL DEFAULT 0,
+    finished INTEGER NOT NULL DEFAULT 0,
+    analysis_complete INTEGER NOT NULL DEFAULT 0,
+    results TEXT NOT NULL DEFAULT '{}',
+    extraction TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_uploads_created_at ON uploads (created_at);
+"""
+
+
+class UnknownUpload(Exception):
+    """Raised for an upload token that was never issued, was already used or has expired."""
+
+
+class Upload:
+    """An uploaded image whose image-only stages run ahead of the form."""
+
+    def __init__(self, image_path: str, token: Optional[str] = None, verification_id: Optional[str] = None,
+                 created_at: Optional[float] = None):
+        self.token = token or secrets.token_urlsafe(24)
+        self.verification_id = verification_id or uuid.uuid4().hex
+        self.image_path = image_path
+        self.created_at = created_at or time.time()
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+        # Futures of the background work; None for an upload analysed by another worker
+        self.analysis: Optional[Future] = None
+        self.extraction: Optional[Future] = None
+        # Slot held by the background work (None once released) and the work it sheds
+        self.admission: Optional[Admission] = None
+        self.shed: Tuple[str, ...] = ()
+        self.finished = False
+        # Shared state of an upload analysed by another worker (see UploadSessions._read)
+        self.analysis_complete = False
+        self.extracted: Optional[Dict[str, Any]] = None
+
+    @property
+    def local(self) -> bool:
+        """Return whether this worker runs the upload's background work."""
+        return self.analysis is not None
+
+    def ready(self) -> bool:
+        """Return whether the background stages and the extraction have finished."""
+        if not self.local:
+            return self.finished
+        return all(future is not None and future.done() for future in (self.analysis, self.extraction))
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Report the progress of the background stages.
+
+        Returns:
+            Dictionary with the verification id, readiness, each finished stage's
+            status and the seconds left before the upload expires
+        """
+        return {
+            "verification_id": self.verification_id,
+            "ready": self.ready(),
+            "stages": {name: (result or {}).get("status") for name, result in list(self.results.items())},
+            "expires_in": max(0, round(self.created_at + UPLOAD_TTL - time.time()))
+        }
+
+
+class UploadSessions:
+    """
+    Registry of uploads waiting for their form.
+
+    The uploads this worker analyses are kept in memory; every upload is also
+    recorded in the shared database, which decides single use and carries the
+    results to whichever worker receives the form.
+    """
+
+    def __init__(self, max_uploads: int = MAX_UPLOADS, workers: int = UPLOAD_WORKERS,
+                 ttl: float = UPLOAD_TTL, path: Optional[str] = None):
+        if path is None:
+            from kyc_engine.shared import get_output_path
+            path = os.getenv("KYC_UPLOAD_DB") or get_output_path("uploads.db", "store")
+        self.path = path
+        self.max_uploads = max_uploads
+        self.ttl = ttl
+        self._uploads: Dict[str, Upload] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="kyc-upload")
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _publish(self, upload: Upload) -> None:
+        """Share an upload's results so far, and whether its background work has finished."""
+        finished = upload.ready()
+        analysis_complete = finished and upload.analysis.exception() is None
+        extraction = upload.extraction.result() if finished else None
+        try:
+            self._connection().execute(
+                "UPDATE uploads SET results = ?, finished = ?, analysis_complete = ?, extraction = ? WHERE token = ?",
+                (json.dumps(upload.results, default=str), int(finished), int(analysis_complete),
+                 json.dumps(extraction) if extraction is not None else None, upload.token)
+            )
+        except sqlite3.Error as e:
+            logger.error("Could not publish upload of verification %s: %s", upload.verification_id, e)
+
+    def _read(self, token: str, taken: bool = False) -> Optional[Upload]:
+        """Build an upload from its shared row, or None if unknown, expired or (unless taken) already used."""
+        row = self._connection().execute(
+            "SELECT verification_id, image_path, created_at, finished, analysis_complete, results, extraction "
+            "FROM uploads WHERE token = ? AND taken = ? AND created_at >= ?",
+            (token, int(taken), time.time() - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        verification_id, image_path, created_at, finished, analysis_complete, results, extraction = row
+        upload = Upload(image_path, token, verification_id, created_at)
+        upload.results = json.loads(results)
+        upload.finished = bool(finished)
+        upload.analysis_complete = bool(analysis_complete)
+        upload.extracted = json.loads(extraction) if extraction else None
+        return upload
+
+    def _expire(self) -> None:
+        """Discard uploads whose form never arrived (called with the lock held)."""
+        cutoff = time.time() - self.ttl
+        for token, upload in list(self._uploads.items()):
+            if upload.created_at < cutoff:
+                del self._uploads[token]
+                # Taken by another worker, whose verification now owns the image
+                if self._connection().execute("SELECT 1 FROM uploads WHERE token = ? AND taken = 1",
+                                              (token,)).fetchone():
+                    continue
+                logger.info("Upload for verification %s expired", upload.verification_id)
+                self._discard_when_done(upload)
+
+    def _discard_when_done(self, upload: Upload) -> None:
+        """Delete an upload's image once its background work no longer reads it."""
+        def remove(_=None):
+            if upload.ready() and os.path.exists(upload.image_path):
+                os.remove(upload.image_path)
+
+        for future in (upload.analysis, upload.extraction):
+            if future is not None:
+                future.add_done_callback(remove)
+
+    def start(self, image_path: str) -> Upload:
+        """
+        Register an uploaded image and start its image-only stages.
+
+        Args:
+            image_path: Path of the saved image; owned by the registry from now on
+
+        Returns:
+            The upload, carrying its token and verification id
+
+        Raises:
+            Overloaded: If MAX_UPLOADS uploads are already waiting for their form,
+                or the admission controller has no slot for the background work
+        """
+        upload = Upload(image_path)
+        admission = get_controller().admit()
+        with self._lock:
+            self._expire()
+            if len(self._uploads) >= self.max_uploads:
+                admission.release()
+                raise Overloaded(30, "Too many uploads are waiting for their form")
+            self._uploads[upload.token] = upload
+        upload.admission, upload.shed = admission, admission.shed
+
+        conn = self._connection()
+        try:
+            conn.execute("INSERT INTO uploads (token, verification_id, image_path, created_at) VALUES (?, ?, ?, ?)",
+                         (upload.token, upload.verification_id, upload.image_path, upload.created_at))
+        except sqlite3.Error:
+            with self._lock:
+                self._uploads.pop(upload.token, None)
+            admission.release()
+            raise
+        # Rows outlive the TTL so the uploading worker can tell a taken upload from an expired one
+        conn.execute("DELETE FROM uploads WHERE created_at < ?", (time.time() - 2 * self.ttl,))
+
+        upload.analysis = self._executor.submit(self._analyze, upload)
+        upload.extraction = self._executor.submit(self._extract, upload)
+        for future in (upload.analysis, upload.extraction):
+            future.add_done_callback(lambda _: self._finish(upload) if upload.ready() else None)
+        return upload
+
+    def _finish(self, upload: Upload) -> None:
+        """Share the finished results and free the upload's admission slot."""
+        self._publish(upload)
+        # Both futures' callbacks may get here; only one takes the slot to release
+        with self._lock:
+            admission, upload.admission = upload.admission, None
+        if admission is not None:
+            admission.release()
+
+    def _analyze(self, upload: Upload) -> None:
+        """Run the image-only pipeline steps of an upload, sharing each result as it completes."""
+        for name, result in iter_pipeline({}, upload.image_path, upload.verification_id, upload.timings,
+                                          shed=upload.shed, only=IMAGE_STEPS):
+            upload.results[name] = result
+            self._publish(upload)
+
+    @staticmethod
+    def _extract(upload: Upload) -> Optional[Dict[str, Any]]:
+        """Read the identity fields off the card while the form is being filled in."""
+        from kyc_engine.ocr_check import extract_fields
+        if "OCR" in upload.shed:
+            # Shed under load: the OCR step runs in full when the form arrives
+            return None
+        try:
+            return extract_fields(upload.image_path)
+        except Exception as e:
+            # The OCR step then runs the full check when the form arrives
+            logger.warning("Field extraction for verification %s failed: %s", upload.verification_id, e)
+            return None
+
+    def get(self, token: str) -> Upload:
+        """
+        Look up a pending upload, analysed by this or another worker.
+
+        Raises:
+            UnknownUpload: If the token is unknown, used or expired
+        """
+        shared = self._read(token)
+        if shared is None:
+            raise UnknownUpload(token)
+        with self._lock:
+            self._expire()
+            return self._uploads.get(token) or shared
+
+    def take(self, token: str) -> Upload:
+        """
+        Remove a pending upload so its form can be verified; a token is used once,
+        whichever worker receives it.
+
+        Raises:
+            UnknownUpload: If the token is unknown, used or expired
+        """
+        claimed = self._connection().execute(
+            "UPDATE uploads SET taken = 1 WHERE token = ? AND taken = 0 AND created_at >= ?",
+            (token, time.time() - self.ttl)
+        ).rowcount
+        if not claimed:
+            raise UnknownUpload(token)
+        with self._lock:
+            self._expire()
+            upload = self._uploads.pop(token, None)
+        return upload or self._read(token, taken=True)
+
+    def precomputed(self, upload: Upload, form_data: Dict[str, str],
+                    timeout: float = READY_TIMEOUT) -> Dict[str, Any]:
+        """
+        Collect the results an upload's verification does not need to compute again.
+
+        Waits up to timeout for the background work. Results of an unfinished
+        analysis are not used, since its steps depend on each other; the
+        verification then runs them itself, as it does the stages that were
+        shed in the background.
+
+        Args:
+            upload: Upload taken with take()
+            form_data: Dictionary containing user submitted identity information
+            timeout: Maximum seconds to wait
+
+        Returns:
+            Step results keyed by step name, including the locally compared OCR result
+        """
+        if upload.local:
+            wait([upload.analysis, upload.extraction], timeout=timeout)
+            analysis_complete = upload.analysis.done() and upload.analysis.exception() is None
+            extraction = upload.extraction.result() if upload.extraction.done() else None
+            analysed = upload
+        else:
+            # Analysed by another worker: wait for it to publish the finished results
+            deadline = time.monotonic() + timeout
+            analysed = self._read(upload.token, taken=True)
+            while analysed is not None and not analysed.finished and time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                analysed = self._read(upload.token, taken=True)
+            finished = analysed is not None and analysed.finished
+            analysis_complete = finished and analysed.analysis_complete
+            extraction = analysed.extracted if finished else None
+
+        results: Dict[str, Any] = {}
+        if analysis_complete:
+            # Stages shed under load get another chance with the form's admission
+            results.update({name: result for name, result in analysed.results.items()
+                            if not (result or {}).get("shed")})
+        else:
+            logger.warning("Image stages of verification %s not finished; running them now", upload.verification_id)
+
+        # A failed request comes back without the extracted fields; OCR then runs in full
+        if extraction and isinstance(extraction.get("extracted"), dict):
+            from kyc_engine.ocr_check import compare_fields
+            results["OCR"] = compare_fields(form_data, extraction)
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        """Report the number of uploads waiting for their form."""
+        with self._lock:
+            return {"pending": len(self._uploads), "max_uploads": self.max_uploads}
+
+
+_default_sessions: Optional[UploadSessions] = None
+_default_sessions_lock = threading.Lock()
+
+
+def get_upload_sessions() -> UploadSessions:
+    """Return the process-wide upload registry."""
+    global _default_sessions
+    with _default_sessions_lock:
+        if _default_sessions is None:
+            _default_sessions = UploadSessions()
+        return _default_sessions
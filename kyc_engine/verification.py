@@ -0,0 +1,256 @@
+"""
+End-to-end verification module.
+
+Runs the pipeline and the decision for one submission and keeps the
+cross-request indexes and the result store up to date with the outcome.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import unicodedata
+import uuid
+from typing import Dict, Any, Iterator, Optional, Sequence, Tuple
+
+from kyc_engine.decision_making import iter_pipeline, kyc_decision
+from kyc_engine.shared import parse_json
+
+logger = logging.getLogger(__name__)
+
+# Set to 0 to run every submission separately even if an identical one is in flight
+SINGLE_FLIGHT = os.getenv("KYC_SINGLE_FLIGHT", "1").lower() not in ("0", "false", "no")
+
+
+def hash_image(image_path: str) -> str:
+    """
+    Compute the SHA-256 of an image file.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_form(form_data: Dict[str, str]) -> Dict[str, str]:
+    """
+    Normalize form fields so trivially different submissions compare equal.
+
+    Args:
+        form_data: Dictionary containing user submitted identity information
+
+    Returns:
+        Dictionary with case-folded, whitespace-collapsed values; the ID number
+        keeps only its letters and digits
+    """
+    normalized = {}
+    for field, value in sorted(form_data.items()):
+        value = unicodedata.normalize("NFKC", value or "").casefold()
+        if field == "id_number":
+            value = "".join(c for c in value if c.isalnum())
+        normalized[field] = " ".join(value.split())
+    return normalized
+
+
+def submission_key(image_hash: str, form_data: Dict[str, str]) -> str:
+    """
+    Identify a submission by its image and normalized form data.
+
+    Args:
+        image_hash: SHA-256 of the image file
+        form_data: Dictionary containing user submitted identity information
+
+    Returns:
+        Hex digest used to coalesce identical concurrent submissions
+    """
+    form = json.dumps(normalize_form(form_data), sort_keys=True)
+    return hashlib.sha256(f"{image_hash}\n{form}".encode("utf-8")).hexdigest()
+
+
+def iter_verification(form_data: Dict[str, str], image_path: str,
+                      verification_id: Optional[str] = None,
+                      shed: Sequence[str] = (),
+                      profiler=None, cpu_executor=None,
+                      precomputed: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Verify a submission, yielding progress events as each step completes.
+
+    Events are ("stage", {"verification_id", "stage", "result"}) for every pipeline
+    step, followed by one ("decision", {"verification_id", "decision", "shed"})
+    event carrying the raw decision string and the work shed under load.
+
+    A submission identical to one still in flight (same image bytes and
+    normalized form data) does not run the pipeline again; it receives the
+    in-flight verification's events, including its verification_id. Profiled
+    submissions always run their own pipeline.
+
+    Args:
+        form_data: Dictionary containing user submitted identity information
+        image_path: Path to the uploaded ID card image
+        verification_id: Optional identifier, generated when omitted
+        shed: Work to drop under load, from the admission controller
+        profiler: Optional profiling.RequestProfiler, started in the thread
+            that runs the pipeline
+        cpu_executor: Optional executor for the CPU-bound pipeline steps
+            (see decision_making.iter_pipeline)
+        precomputed: Optional results of steps that already ran when the
+            image was uploaded ahead of the form (see upload_sessions.py)
+
+    Yields:
+        Tuples of (event type, event payload)
+    """
+    image_hash = hash_image(image_path)
+
+    def run():
+        return _run_verification(form_data, image_path, image_hash, verification_id, shed, profiler,
+                                 cpu_executor, precomputed)
+
+    if not SINGLE_FLIGHT or profiler is not None:
+        return run()
+
+    def run_detached():
+        # The flight may outlive the leader's request, whose upload is deleted when it ends,
+        # so it reads its own link to the image
+        root, extension = os.path.splitext(image_path)
+        flight_path = f"{root}.flight-{uuid.uuid4().hex}{extension}"
+        try:
+            os.link(image_path, flight_path)
+        except OSError:
+            shutil.copyfile(image_path, flight_path)
+
+        def events():
+            try:
+                yield from _run_verification(form_data, flight_path, image_hash, verification_id, shed, None,
+                                             cpu_executor, precomputed)
+            finally:
+                os.remove(flight_path)
+        return events()
+
+    from kyc_engine.single_flight import get_flights
+    return get_flights().run(submission_key(image_hash, form_data), run_detached)
+
+
+def _run_verification(form_data: Dict[str, str], image_path: str, image_hash: str,
+                      verification_id: Optional[str], shed: Sequence[str],
+                      profiler=None, cpu_executor=None,
+                      precomputed: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Run the pipeline and decision for iter_verification() and record the outcome."""
+    verification_id = verification_id or uuid.uuid4().hex
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    pipeline_results: Dict[str, Any] = {}
+
+    on_step = profiler.step if profiler is not None and profiler.start() else None
+    try:
+        for stage, result in iter_pipeline(form_data, image_path, verification_id, timings, shed, on_step,
+                                           cpu_executor, precomputed):
+            pipeline_results[stage] = result
+            yield "stage", {"verification_id": verification_id, "stage": stage, "result": result}
+
+        if on_step:
+            on_step("Decision")
+        decision_started = time.perf_counter()
+        decision = kyc_decision(pipeline_results)
+        timings["Decision"] = round((time.perf_counter() - decision_started) * 1000, 1)
+    finally:
+        if on_step:
+            profiler.finish(verification_id)
+
+    record_outcome(verification_id, pipeline_results, decision, image_hash=image_hash,
+                   timings=timings, duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                   form_data=form_data)
+
+    yield "decision", {"verification_id": verification_id, "decision": decision, "shed": list(shed)}
+
+
+def verify_identity(form_data: Dict[str, str], image_path: str,
+                    verification_id: Optional[str] = None,
+                    shed: Sequence[str] = (), profiler=None,
+                    precomputed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Verify a submission and record its outcome.
+
+    Args:
+        form_data: Dictionary containing user submitted identity information
+        image_path: Path to the uploaded ID card image
+        verification_id: Optional identifier, generated when omitted
+        shed: Work to drop under load, from the admission controller
+        profiler: Optional profiling.RequestProfiler for this verification
+        precomputed: Optional results of steps that already ran
+
+    Returns:
+        Dictionary with verification_id, pipeline_results, the raw decision
+        string and the work that was shed
+    """
+    verification = {"verification_id": verification_id, "pipeline_results": {}, "decision": None,
+                    "shed": list(shed)}
+    for event, payload in iter_verification(form_data, image_path, verification_id, shed, profiler,
+                                            precomputed=precomputed):
+        verification["verification_id"] = payload["verification_id"]
+        if event == "stage":
+            verification["pipeline_results"][payload["stage"]] = payload["result"]
+        else:
+            verification["decision"] = payload["decision"]
+            verification["shed"] = payload["shed"]
+    return verification
+
+
+def record_outcome(verification_id: str, pipeline_results: Dict[str, Any], decision: str,
+                   image_hash: Optional[str] = None, timings: Optional[Dict[str, float]] = None,
+                   duration_ms: Optional[float] = None, form_data: Optional[Dict[str, str]] = None) -> None:
+    """
+    Record a finished verification in the pHash and face indexes and the result store.
+
+    Args:
+        verification_id: Identifier of the verification
+        pipeline_results: Results from all verification steps
+        decision: Raw decision string returned by kyc_decision
+        image_hash: SHA-256 of the image file
+        timings: Per-step durations in milliseconds
+        duration_ms: Total verification duration in milliseconds
+        form_data: Submitted identity, kept in the pHash index only as a hash
+    """
+    phash = (pipeline_results.get("Duplicate") or {}).get("phash")
+    decision_obj = parse_json(decision) or {}
+
+    if phash and "decision" in decision_obj:
+        try:
+            from kyc_engine.phash_index import record_verification
+            record_verification(phash, verification_id, decision_obj["decision"], pipeline_results,
+                                image_hash=image_hash, form_data=form_data)
+        except Exception as e:
+            logger.error("Error recording verification in pHash index: %s", e)
+
+    if "decision" in decision_obj and (pipeline_results.get("Face") or {}).get("face_found"):
+        try:
+            from kyc_engine.face_index import record_face
+            record_face(verification_id, decision_obj["decision"])
+        except Exception as e:
+            logger.error("Error recording verification in face index: %s", e)
+
+    try:
+        from kyc_engine.rescoring import feature_vector
+        from kyc_engine.result_store import get_store
+        get_store().submit({
+            "verification_id": verification_id,
+            "created_at": time.time(),
+            "decision": decision_obj.get("decision"),
+            "image_hash": image_hash,
+            "phash": phash,
+            "duration_ms": duration_ms,
+            "stage_timings": timings or {},
+            "stage_results": pipeline_results,
+            "decision_result": decision_obj or decision,
+            "features": feature_vector(pipeline_results),
+            "provisional": decision_obj.get("provisional", False)
+        })
+    except Exception as e:
+        logger.error("Error queueing verification result: %s", e)
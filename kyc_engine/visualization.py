@@ -0,0 +1,354 @@
+"""
+On-demand visualization module for reviewer composites.
+
+Verification stages hand over their intermediate arrays once; composites are
+only rendered (and cached) when a reviewer actually asks for them. Rendered
+composites are also kept in the artifact store, so they outlive the in-memory
+caches and are visible to every worker.
+"""
+import textwrap
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from kyc_engine.artifact_store import get_artifact_store
+
+# Longest side of the arrays kept per verification
+PREVIEW_MAX_SIDE = 640
+
+# Size of a single tile in a rendered composite (width, height)
+TILE_SIZE = (480, 360)
+
+# Number of verifications whose intermediates are kept in memory
+MAX_CACHED_VERIFICATIONS = 256
+
+# Number of rendered composites kept in memory
+MAX_CACHED_RENDERS = 64
+
+COMPOSITE_KINDS = ("ela", "forensics", "localization")
+
+_lock = threading.Lock()
+_intermediates: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_renders: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+
+def _downscale(array: np.ndarray, max_side: int = PREVIEW_MAX_SIDE) -> np.ndarray:
+    """
+    Shrink an image array so its longest side is at most max_side.
+
+    Args:
+        array: Image array (grayscale or RGB)
+        max_side: Maximum length of the longest side
+
+    Returns:
+        Downscaled array (or the original array if already small enough)
+    """
+    h, w = array.shape[:2]
+    factor = max_side / float(max(h, w))
+    if factor >= 1.0:
+        return array
+    size = (max(1, int(w * factor)), max(1, int(h * factor)))
+    return cv2.resize(array, size, interpolation=cv2.INTER_AREA)
+
+
+def _put_lru(cache: OrderedDict, key: Any, value: Any, max_items: int) -> None:
+    """Insert a value into an LRU ordered dict and evict the oldest entries."""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_items:
+        cache.popitem(last=False)
+
+
+def reduce_intermediates(intermediates: Dict[str, Any], max_side: int = PREVIEW_MAX_SIDE) -> Dict[str, Any]:
+    """
+    Downscale the arrays of stage intermediates, e.g. before sending them to another process.
+
+    Each downscaled array gets a "<name>_scale" entry with its size relative to
+    the original array; reducing already reduced intermediates keeps that relative
+    to the first original.
+
+    Args:
+        intermediates: Mapping of stage name to its intermediate values
+        max_side: Maximum length of the longest side of each array
+
+    Returns:
+        Reduced copy of intermediates
+    """
+    reduced: Dict[str, Any] = {}
+    for stage, values in intermediates.items():
+        reduced_values = dict(values)
+        for name, value in values.items():
+            if isinstance(value, np.ndarray) and value.ndim >= 2:
+                reduced_values[name] = _downscale(value, max_side)
+                previous = values.get(f"{name}_scale", 1.0)
+                reduced_values[f"{name}_scale"] = previous * reduced_values[name].shape[1] / float(value.shape[1])
+        reduced[stage] = reduced_values
+    return reduced
+
+
+def cache_intermediates(verification_id: str, intermediates: Dict[str, Any]) -> None:
+    """
+    Keep reduced copies of stage intermediates for later rendering.
+
+    Args:
+        verification_id: Identifier of the verification the arrays belong to
+        intermediates: Mapping of stage name to its intermediate values
+    """
+    scaled = reduce_intermediates(intermediates)
+
+    with _lock:
+        _put_lru(_intermediates, verification_id, scaled, MAX_CACHED_VERIFICATIONS)
+        for kind in COMPOSITE_KINDS:
+            _renders.pop((verification_id, kind), None)
+
+
+def get_intermediates(verification_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch the cached intermediates of a verification.
+
+    Args:
+        verification_id: Identifier of the verification
+
+    Returns:
+        Cached intermediates or None if they were never stored or were evicted
+    """
+    with _lock:
+        data = _intermediates.get(verification_id)
+        if data is not None:
+            _intermediates.move_to_end(verification_id)
+        return data
+
+
+def _fit_tile(array: np.ndarray, size: Tuple[int, int] = TILE_SIZE) -> np.ndarray:
+    """
+    Letterbox an image array into an RGB tile of the given size.
+
+    Args:
+        array: Grayscale or RGB image array
+        size: Tile size as (width, height)
+
+    Returns:
+        RGB tile array
+    """
+    tile_w, tile_h = size
+    tile = np.full((tile_h, tile_w, 3), 255, dtype=np.uint8)
+    if array.ndim == 2:
+        array = cv2.cvtColor(array, cv2.COLOR_GRAY2RGB)
+    h, w = array.shape[:2]
+    factor = min(tile_w / float(w), tile_h / float(h))
+    new_w, new_h = max(1, int(w * factor)), max(1, int(h * factor))
+    resized = cv2.resize(array, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    y, x = (tile_h - new_h) // 2, (tile_w - new_w) // 2
+    tile[y:y + new_h, x:x + new_w] = resized
+    return tile
+
+
+def _text_tile(lines: List[str], size: Tuple[int, int] = TILE_SIZE) -> np.ndarray:
+    """
+    Render lines of text onto a blank RGB tile.
+
+    Args:
+        lines: Text lines to render
+        size: Tile size as (width, height)
+
+    Returns:
+        RGB tile array
+    """
+    tile_w, tile_h = size
+    tile = np.full((tile_h, tile_w, 3), 255, dtype=np.uint8)
+    wrapped: List[str] = []
+    for line in lines:
+        wrapped.extend(textwrap.wrap(line, width=40) or [""])
+    y = 30
+    for line in wrapped:
+        cv2.putText(tile, line, (12, y), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 0, 0), 1, cv2.LINE_AA)
+        y += 24
+    return tile
+
+
+def tile_images(tiles: List[Tuple[str, np.ndarray]], columns: int,
+                tile_size: Tuple[int, int] = TILE_SIZE) -> np.ndarray:
+    """
+    Arrange titled tiles into a single RGB grid image.
+
+    Args:
+        tiles: List of (title, image array) pairs
+        columns: Number of tiles per row
+        tile_size: Size of each tile as (width, height)
+
+    Returns:
+        Composite RGB array
+    """
+    title_h = 32
+    tile_w, tile_h = tile_size
+    rows = (len(tiles) + columns - 1) // columns
+    canvas = np.full((rows * (tile_h + title_h), columns * tile_w, 3), 255, dtype=np.uint8)
+
+    for index, (title, array) in enumerate(tiles):
+        row, col = divmod(index, columns)
+        y, x = row * (tile_h + title_h), col * tile_w
+        cv2.putText(canvas, title, (x + 12, y + 22), cv2.FONT_HERSHEY_SIMPLEX, 0.65,
+                    (0, 0, 0), 1, cv2.LINE_AA)
+        canvas[y + title_h:y + title_h + tile_h, x:x + tile_w] = _fit_tile(array, tile_size)
+    return canvas
+
+
+def build_ela_composite(ela: Dict[str, Any]) -> np.ndarray:
+    """
+    Build the ELA composite from ELA intermediates.
+
+    Args:
+        ela: ELA intermediates (original, recompressed, ela, report)
+
+    Returns:
+        Composite RGB array
+    """
+    report = ela["report"]
+    summary = [
+        f"Status: {report['status']}",
+        f"Error Level: {report['error_level']}",
+        f"Message: {report['message']}",
+    ]
+    return tile_images([
+        ("Original Image", ela["original"]),
+        ("Recompressed Image", ela["recompressed"]),
+        ("ELA Image", ela["ela"]),
+        ("Summary", _text_tile(summary)),
+    ], columns=2)
+
+
+def build_forensics_composite(forensics: Dict[str, Any]) -> np.ndarray:
+    """
+    Build the forensic composite from pixel-level intermediates.
+
+    Args:
+        forensics: Forensic intermediates (image, edges, noise, artifact, clone, report)
+
+    Returns:
+        Composite RGB array
+    """
+    analysis = forensics["report"]
+    clone_vis = forensics["image"].copy()
+    location = forensics.get("clone_location")
+    if location is not None:
+        scale = forensics.get("image_scale", 1.0)
+        block = forensics.get("clone_block_size", 50)
+        x, y = int(location[0] * scale), int(location[1] * scale)
+        size = max(2, int(block * scale))
+        cv2.rectangle(clone_vis, (x, y), (x + size, y + size), (255, 0, 0), 2)
+
+    details = analysis["details"]
+    summary = [
+        f"Status: {analysis['status']}",
+        f"Score: {analysis['score']}",
+        f"Edge: {details['edge_strength']}",
+        f"Noise: {details['noise_level']}",
+        f"Clone: {details['cloning_score']}",
+        f"Artifact: {details['artifact_score']}",
+        f"Msg: {analysis['message']}",
+    ]
+    return tile_images([
+        ("Original Image", forensics["image"]),
+        ("Edge Detection", forensics["edges"]),
+        ("Noise Difference", forensics["noise"]),
+        ("Cloning Detection", clone_vis),
+        ("JPEG Artifact Difference", forensics["artifact"]),
+        ("Summary", _text_tile(summary)),
+    ], columns=3)
+
+
+def build_localization_composite(localization: Dict[str, Any]) -> np.ndarray:
+    """
+    Build the tamper localization composite: the fused heatmap over the document.
+
+    Args:
+        localization: Localization intermediates (image, heatmap, report)
+
+    Returns:
+        Composite RGB array
+    """
+    report = localization["report"]
+    image = localization["image"]
+    h, w = image.shape[:2]
+
+    heat = np.clip(localization["heatmap"] / max(float(localization["heatmap"].max()), 1e-6), 0, 1)
+    heat = cv2.resize((heat * 255).astype(np.uint8), (w, h), interpolation=cv2.INTER_NEAREST)
+    overlay = cv2.addWeighted(image, 0.55, cv2.applyColorMap(heat, cv2.COLORMAP_JET)[:, :, ::-1], 0.45, 0)
+
+    boxes = image.copy()
+    for region in report.get("regions", []):
+        fx, fy, fw, fh = region["bbox_fraction"]
+        cv2.rectangle(boxes, (int(fx * w), int(fy * h)), (int((fx + fw) * w), int((fy + fh) * h)),
+                      (255, 0, 0), 2)
+
+    summary = [
+        f"Status: {report['status']}",
+        f"Peak score: {report.get('max_score')}",
+    ] + [f"{r['position']}: {r['score']}" for r in report.get("regions", [])] + [
+        f"Msg: {report['message']}",
+    ]
+    return tile_images([
+        ("Suspicious Regions", boxes),
+        ("Fused Tamper Heatmap", overlay),
+        ("Summary", _text_tile(summary)),
+    ], columns=3)
+
+
+def encode_png(composite: np.ndarray) -> bytes:
+    """
+    Encode an RGB composite array as PNG bytes.
+
+    Args:
+        composite: RGB image array
+
+    Returns:
+        PNG encoded bytes
+    """
+    ok, buffer = cv2.imencode(".png", cv2.cvtColor(composite, cv2.COLOR_RGB2BGR))
+    if not ok:
+        raise ValueError("Failed to encode composite image")
+    return buffer.tobytes()
+
+
+def render_composite(verification_id: str, kind: str) -> Optional[bytes]:
+    """
+    Render (or fetch from cache) a composite visualization for a verification.
+
+    Args:
+        verification_id: Identifier of the verification
+        kind: Composite kind, one of COMPOSITE_KINDS
+
+    Returns:
+        PNG bytes, or None if the composite was never rendered and no
+        intermediates are cached for the verification
+    """
+    if kind not in COMPOSITE_KINDS:
+        raise ValueError(f"Unknown composite kind: {kind}")
+
+    with _lock:
+        cached = _renders.get((verification_id, kind))
+        if cached is not None:
+            _renders.move_to_end((verification_id, kind))
+            return cached
+
+    store = get_artifact_store()
+    png = store.read(verification_id, f"{kind}_composite")
+    if png is None:
+        data = get_intermediates(verification_id)
+        if data is None or kind not in data:
+            return None
+
+        if kind == "ela":
+            png = encode_png(build_ela_composite(data["ela"]))
+        elif kind == "localization":
+            png = encode_png(build_localization_composite(data["localization"]))
+        else:
+            png = encode_png(build_forensics_composite(data["forensics"]))
+        store.put(png, f"{kind}_composite", verification_id, "png")
+
+    with _lock:
+        _put_lru(_renders, (verification_id, kind), png, MAX_CACHED_RENDERS)
+    return png
@@ -0,0 +1,129 @@
+"""
+Worker warm-up and startup-time budget module.
+
+Heavy dependencies are imported lazily by the stages that need them. This module
+preloads them on demand (e.g. right after a worker forks) and measures how long a
+cold import of the application takes against a startup budget.
+"""
+import argparse
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Modules preloaded by warm_up(), grouped by the stage that needs them
+STAGE_MODULES = {
+    "http": ("requests",),
+    "metadata": ("PIL.Image", "PIL.ExifTags"),
+    "quality": ("cv2", "kyc_engine.quality_gate"),
+    "jpeg": ("numpy", "kyc_engine.jpeg_structure"),
+    "ela": ("numpy", "PIL.ImageChops", "kyc_engine.ela_check"),
+    "forensics": ("cv2", "skimage.metrics", "skimage.util", "kyc_engine.image_forensics"),
+    "localization": ("cv2", "kyc_engine.tamper_fusion"),
+    "visualization": ("kyc_engine.visualization",),
+    "face": ("kyc_engine.face_index",),
+}
+
+# Model loaders run after a stage's modules are imported, as (module, function)
+STAGE_INITIALIZERS = {
+    "face": ("kyc_engine.face_index", "load_model"),
+}
+
+# Maximum seconds a cold `import app` may take
+STARTUP_BUDGET_SECONDS = float(os.getenv("KYC_STARTUP_BUDGET", "0.5"))
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def warm_up(stages: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """
+    Import the heavy dependencies of the given stages.
+
+    Args:
+        stages: Stage names from STAGE_MODULES, or None for all stages
+
+    Returns:
+        Dictionary mapping each module name to the seconds spent importing it
+    """
+    timings = {}
+    for stage in (stages or STAGE_MODULES.keys()):
+        for module in STAGE_MODULES.get(stage, ()):
+            start = time.perf_counter()
+            importlib.import_module(module)
+            timings[module] = round(time.perf_counter() - start, 4)
+
+        if stage in STAGE_INITIALIZERS:
+            module, function = STAGE_INITIALIZERS[stage]
+            start = time.perf_counter()
+            try:
+                getattr(importlib.import_module(module), function)()
+            except ImportError as e:
+                # Optional dependency (e.g. deepface) not installed
+                logger.info("Skipping warm-up of %s: %s", stage, e)
+                continue
+            timings[f"{module}.{function}"] = round(time.perf_counter() - start, 4)
+    return timings
+
+
+def warm_up_in_background(stages: Optional[Iterable[str]] = None) -> threading.Thread:
+    """
+    Start warm_up() in a daemon thread so the worker can accept traffic immediately.
+
+    Args:
+        stages: Stage names from STAGE_MODULES, or None for all stages
+
+    Returns:
+        The started thread
+    """
+    thread = threading.Thread(target=warm_up, args=(stages,), name="kyc-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def measure_startup(module: str = "app", budget: float = STARTUP_BUDGET_SECONDS) -> Dict[str, object]:
+    """
+    Measure a cold import of a module in a fresh interpreter.
+
+    Args:
+        module: Module to import (defaults to the Flask application)
+        budget: Maximum allowed import time in seconds
+
+    Returns:
+        Dictionary with the measured seconds, the budget and whether it was met
+    """
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    seconds = float(output.strip().splitlines()[-1])
+    return {
+        "module": module,
+        "seconds": round(seconds, 4),
+        "budget": budget,
+        "within_budget": seconds <= budget
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure worker startup time")
+    parser.add_argument("--module", help="Module to import", default="app")
+    parser.add_argument("--budget", help="Startup budget in seconds", type=float,
+                        default=STARTUP_BUDGET_SECONDS)
+    args = parser.parse_args()
+
+    report = measure_startup(args.module, args.budget)
+    print(report)
+    sys.exit(0 if report["within_budget"] else 1)